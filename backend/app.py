@@ -1,91 +1,158 @@
 import json
 import random, string
+import threading
 import time
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from web3 import Web3
-from eth_account.messages import encode_defunct
 import os
 from dotenv import load_dotenv
+from werkzeug.local import LocalProxy
+from backend.auth_verify import checksum_address, login_message, recover_address, recover_batch
+from backend.eligibility import Ineligible, VoteEligibility
+from backend.rate_limit import RateLimited, RateLimiter, client_ip, load_policies
+from backend import audit_export, bulk_register, chain, indexer, instrumentation, results_stream, tx_pipeline
+from backend.elections import DEFAULT_ELECTION, Election, ElectionRegistry, configured_elections
+from backend.results_snapshot import SnapshotEngine
+from backend.session_store import SESSION_TTL, create_backend
+from backend.view_cache import ViewCache
 
 load_dotenv()
 
-app = Flask(__name__)
+api = Blueprint('api', __name__)
 
-# Simple in-memory store for session data (use Redis in production)
-session_store = {}
+# Session store shared across gunicorn workers (see SESSION_BACKEND)
+session_store = create_backend()
+
+# Max logins per /api/verify-batch request
+AUTH_BATCH_MAX = int(os.environ.get('AUTH_BATCH_MAX', 256))
 
 # CORS configuration
-CORS(app,
-     origins=["http://localhost:5173", "http://127.0.0.1:5173", "https://blockchain-voting-frontend.vercel.app"],
-     supports_credentials=True,
-     allow_headers=["Content-Type", "Authorization"],
-     methods=["GET", "POST", "OPTIONS"],
-     expose_headers=["Content-Type"],
-     max_age=600)
-
-# Replace Ganache connection with Infura
-infura_project_id = os.environ.get('INFURA_PROJECT_ID')
-infura_url = f"https://sepolia.infura.io/v3/{infura_project_id}"
-web3 = Web3(Web3.HTTPProvider(infura_url))
-
-# Load smart contract
-contract_address = Web3.to_checksum_address("0x8912ED01D24cba70A535598Af18C38C48e44c585")
-
-
-# Actual contract ABI from your deployed contract
-
-contract_abi = [
-    {"inputs":[],"stateMutability":"nonpayable","type":"constructor"},
-    {"anonymous":False,"inputs":[{"indexed":False,"internalType":"uint256","name":"candidateId","type":"uint256"},{"indexed":False,"internalType":"string","name":"name","type":"string"}],"name":"CandidateAdded","type":"event"},
-    {"anonymous":False,"inputs":[{"indexed":False,"internalType":"address","name":"voter","type":"address"},{"indexed":False,"internalType":"uint256","name":"candidateId","type":"uint256"}],"name":"VoteCasted","type":"event"},
-    {"anonymous":False,"inputs":[],"name":"VotingEnded","type":"event"},
-    {"anonymous":False,"inputs":[],"name":"VotingStarted","type":"event"},
-    {"inputs":[{"internalType":"string","name":"_name","type":"string"}],"name":"addCandidate","outputs":[],"stateMutability":"nonpayable","type":"function"},
-    {"inputs":[],"name":"admin","outputs":[{"internalType":"address","name":"","type":"address"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"internalType":"uint256","name":"","type":"uint256"}],"name":"candidates","outputs":[{"internalType":"uint256","name":"id","type":"uint256"},{"internalType":"string","name":"name","type":"string"},{"internalType":"uint256","name":"voteCount","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[],"name":"candidatesCount","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[],"name":"endVoting","outputs":[],"stateMutability":"nonpayable","type":"function"},
-    {"inputs":[{"internalType":"uint256","name":"_candidateId","type":"uint256"}],"name":"getCandidate","outputs":[{"internalType":"uint256","name":"","type":"uint256"},{"internalType":"string","name":"","type":"string"},{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[{"internalType":"address","name":"_voter","type":"address"}],"name":"registerVoter","outputs":[],"stateMutability":"nonpayable","type":"function"},
-    {"inputs":[],"name":"startVoting","outputs":[],"stateMutability":"nonpayable","type":"function"},
-    {"inputs":[{"internalType":"uint256","name":"_candidateId","type":"uint256"}],"name":"vote","outputs":[],"stateMutability":"nonpayable","type":"function"},
-    {"inputs":[{"internalType":"address","name":"","type":"address"}],"name":"voters","outputs":[{"internalType":"bool","name":"hasVoted","type":"bool"},{"internalType":"uint256","name":"votedCandidateId","type":"uint256"}],"stateMutability":"view","type":"function"},
-    {"inputs":[],"name":"votingOpen","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"}
-]
-
-# Initialize contract with complete ABI
-try:
-    contract = web3.eth.contract(address=contract_address, abi=contract_abi)
-    print(f"Contract loaded successfully at {contract_address}")
-except Exception as e:
-    print(f"Error loading contract: {e}")
-    contract = None
-
-# Debug middleware
-@app.before_request
-def before_request():
-    print(f"→ {request.method} {request.path}")
-    print(f"→ Headers: {dict(request.headers)}")
-    print(f"→ Session store: {session_store}")
+CORS_ORIGINS = ["http://localhost:5173", "http://127.0.0.1:5173", "https://blockchain-voting-frontend.vercel.app"]
+
+# Provider, contract and signer are built on first use (see backend/chain.py)
+web3 = chain.web3
+contract = chain.contract
+
+# Local read model fed by contract events (enabled by INDEXER_START_BLOCK)
+index_store = indexer.get_store()
+
+# Per-block cache of contract view calls
+view_cache = ViewCache(web3)
+
+# Pre-flight checks that reject doomed votes before they are signed
+eligibility = VoteEligibility(view_cache, index_store)
+
+# Pre-encoded /results bodies, frozen once voting has ended for good
+results_snapshots = SnapshotEngine()
+
+# CONTRACT_ADDRESS, plus every other deployment served under /elections/<id>
+# (see backend/elections.py); they all share view_cache's block clock
+default_election = Election(DEFAULT_ELECTION, contract, view_cache, index_store=index_store,
+                            snapshots=results_snapshots, eligibility=eligibility)
+
+# RATE_LIMITS and ELECTIONS are parsed (and the elections table opened) on
+# first use, not at import; check_config() reports a bad value at startup
+_lock = threading.Lock()
+_rate_limiter = None
+_elections = None
+
+def check_config():
+    """Parse RATE_LIMITS and ELECTIONS; raises ValueError naming the bad one."""
+    load_policies()
+    configured_elections()
+
+def get_rate_limiter():
+    """Per-IP / per-wallet token buckets shared across gunicorn workers (see RATE_LIMITS)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+def get_elections():
+    global _elections
+    if _elections is None:
+        with _lock:
+            if _elections is None:
+                registry = ElectionRegistry(web3, clock=view_cache)
+                registry.set_default(default_election)
+                _elections = registry
+    return _elections
+
+rate_limiter = LocalProxy(get_rate_limiter)
+elections = LocalProxy(get_elections)
+
+def read_candidates_cached():
+    """Candidate table + votingOpen, read at most once per block."""
+    return default_election.read_candidates()
+
+def on_contract_event():
+    default_election.on_change()
+
+def current_results_snapshot():
+    """The /results snapshot, rebuilt only when it is stale and the data changed."""
+    return default_election.results_snapshot()
+
+def trace_details():
+    """Request data attached to sampled traces (redacted by instrumentation)."""
+    return {
+        "path": request.path,
+        "args": request.args.to_dict(),
+        "headers": dict(request.headers),
+        "body": request.get_json(silent=True),
+    }
 
-@app.after_request
+# Routes that act for the logged-in wallet: their wallet limits follow the
+# session, never a walletAddress the client can vary
+SESSION_WALLET_ROUTES = frozenset(['/vote', '/api/vote/eligibility', '/elections/<election_id>/vote'])
+
+def request_wallet(route):
+    """Wallet a request acts for: the session's on ``SESSION_WALLET_ROUTES``,
+    else ``walletAddress`` in the body (e.g. /api/nonce, /register-voter)."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None
+    if route not in SESSION_WALLET_ROUTES:
+        return data.get('walletAddress')
+    session_data = session_store.get(data['sessionToken']) if data.get('sessionToken') else None
+    return session_data.get('wallet_address') if session_data else None
+
+def rate_limit_request():
+    """429 response if the request is over one of its route's limits, else None."""
+    if request.method == 'OPTIONS' or request.url_rule is None:
+        return None
+    route = request.url_rule.rule
+    try:
+        rate_limiter.check(route, ip=client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')),
+                           wallet=lambda: request_wallet(route))
+    except RateLimited as e:
+        instrumentation.record_rate_limited(route, e.policy.key)
+        return jsonify(e.to_dict()), 429, e.headers()
+    return None
+
+# Metrics and sampled tracing (see backend/instrumentation.py)
+@api.before_app_request
+def before_request():
+    instrumentation.start_request()
+    limited = rate_limit_request()
+    if limited is not None:
+        return limited
+    indexer.ensure_started(web3, contract, on_change=on_contract_event)
+    tx_pipeline.ensure_tracker_started(web3, contract)
+    bulk_register.ensure_worker_started(web3, contract)
+    elections.ensure_started()
+
+@api.after_app_request
 def after_request(response):
-    print(f"← Status: {response.status}")
-    print(f"← Response Headers: {dict(response.headers)}")
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    instrumentation.finish_request(request.method, route, response.status_code, details=trace_details)
     return response
 
-# Clean expired sessions periodically
-def clean_expired_sessions():
-    current_time = time.time()
-    expired_keys = [k for k, v in session_store.items() if v.get("expires_at", 0) < current_time]
-    for key in expired_keys:
-        del session_store[key]
-
 # ================================================
 # 🔹 AUTHENTICATION ENDPOINTS
 # ================================================
-@app.route('/api/nonce', methods=['POST', 'OPTIONS'])
+@api.route('/api/nonce', methods=['POST', 'OPTIONS'])
 def get_nonce():
     if request.method == 'OPTIONS':
         return '', 200
@@ -97,26 +164,33 @@ def get_nonce():
 
     # Convert to checksum address
     try:
-        wallet_address = Web3.to_checksum_address(wallet_address)
+        wallet_address = checksum_address(wallet_address)
     except ValueError as e:
         return jsonify({"error": f"Invalid wallet address: {str(e)}"}), 400
 
     nonce = ''.join(random.choices(string.ascii_letters + string.digits, k=32))
     session_token = ''.join(random.choices(string.ascii_letters + string.digits, k=64))
 
-    # Increase session duration
-    session_store[session_token] = {
+    # Expired sessions are purged by the store itself
+    session_store.set(session_token, {
         "wallet_address": wallet_address,
         "nonce": nonce,
         "created_at": time.time(),
-        "expires_at": time.time() + 3600  # Increase to 1 hour
-    }
+        "expires_at": time.time() + SESSION_TTL
+    }, ttl=SESSION_TTL)
 
-    clean_expired_sessions()
-    
     return jsonify({"nonce": nonce, "sessionToken": session_token})
 
-@app.route('/api/verify', methods=['POST', 'OPTIONS'])
+def issue_auth_token(session_token, session_data):
+    auth_token = ''.join(random.choices(string.ascii_letters + string.digits, k=64))
+
+    session_data["authenticated"] = True
+    session_data["auth_token"] = auth_token
+    session_data["expires_at"] = time.time() + SESSION_TTL
+    session_store.set(session_token, session_data, ttl=SESSION_TTL)
+    return auth_token
+
+@api.route('/api/verify', methods=['POST', 'OPTIONS'])
 def verify_signature():
     if request.method == 'OPTIONS':
         return '', 200
@@ -131,7 +205,7 @@ def verify_signature():
 
     try:
         # Convert wallet address to checksum format
-        wallet_address = Web3.to_checksum_address(wallet_address)
+        wallet_address = checksum_address(wallet_address)
     except ValueError as e:
         return jsonify({"error": f"Invalid wallet address: {str(e)}"}), 400
 
@@ -143,23 +217,15 @@ def verify_signature():
     stored_nonce = session_data.get("nonce")
     stored_address = session_data.get("wallet_address")
 
-    # Convert stored address before comparing
-    if wallet_address.lower() != Web3.to_checksum_address(stored_address).lower():
+    # Stored addresses are already checksummed
+    if wallet_address != stored_address:
         return jsonify({"error": "Wallet address mismatch"}), 400
 
-    message = f"Sign this message to authenticate: {stored_nonce}"
-    message_encoded = encode_defunct(text=message)
-
     try:
-        recovered_address = web3.eth.account.recover_message(message_encoded, signature=signature)
+        recovered_address = recover_address(login_message(stored_nonce), signature)
         
-        if recovered_address.lower() == wallet_address.lower():
-            auth_token = ''.join(random.choices(string.ascii_letters + string.digits, k=64))
-
-            session_data["authenticated"] = True
-            session_data["auth_token"] = auth_token
-            session_data["expires_at"] = time.time() + 3600  # 1 hour
-
+        if recovered_address == wallet_address:
+            auth_token = issue_auth_token(session_token, session_data)
             return jsonify({"success": True, "token": auth_token, "address": wallet_address})
         else:
             return jsonify({"error": "Signature verification failed"}), 400
@@ -167,60 +233,122 @@ def verify_signature():
     except Exception as e:
         return jsonify({"error": f"Error during signature recovery: {str(e)}"}), 400
 
+@api.route('/api/verify-batch', methods=['POST', 'OPTIONS'])
+def verify_signature_batch():
+    """Verify many logins at once (kiosks, relays); recovery runs on a process pool."""
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    items = (request.get_json() or {}).get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > AUTH_BATCH_MAX:
+        return jsonify({"error": f"At most {AUTH_BATCH_MAX} items per batch"}), 400
+
+    results = [None] * len(items)
+    pending = []  # (index, session_data, message, signature)
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        session_token = item.get('sessionToken')
+        result = results[i] = {"sessionToken": session_token, "success": False}
+
+        if not item.get('walletAddress') or not item.get('signature') or not session_token:
+            result["error"] = "Missing required parameters"
+            continue
+        try:
+            wallet_address = checksum_address(item['walletAddress'])
+        except ValueError as e:
+            result["error"] = f"Invalid wallet address: {str(e)}"
+            continue
+
+        session_data = session_store.get(session_token)
+        if not session_data:
+            result.update({"error": "Session expired or invalid.", "sessionLost": True})
+            continue
+        if wallet_address != session_data.get("wallet_address"):
+            result["error"] = "Wallet address mismatch"
+            continue
+        pending.append((i, session_data, login_message(session_data.get("nonce")), item['signature']))
+
+    recovered = recover_batch([(message, signature) for _, _, message, signature in pending])
+    for (i, session_data, _, _), (address, error) in zip(pending, recovered):
+        result = results[i]
+        if error:
+            result["error"] = f"Error during signature recovery: {error}"
+        elif address != session_data["wallet_address"]:
+            result["error"] = "Signature verification failed"
+        else:
+            result.update({
+                "success": True,
+                "token": issue_auth_token(result["sessionToken"], session_data),
+                "address": address
+            })
+
+    return jsonify({"results": results})
+
     
-@app.route('/api/check-auth', methods=['POST', 'OPTIONS'])
+@api.route('/api/check-auth', methods=['POST', 'OPTIONS'])
 def check_auth():
     if request.method == 'OPTIONS':
         return '', 200
         
     data = request.get_json()
     session_token = data.get('sessionToken')
-    
-    # Debug info
-    print(f"Checking auth for token: {session_token}")
-    print(f"Session store keys: {list(session_store.keys())}")
-    
-    if not session_token or session_token not in session_store:
-        print("Session token not found")
+    session_data = session_store.get(session_token) if session_token else None
+
+    if not session_data:
         return jsonify({"authenticated": False}), 200
-        
-    session_data = session_store.get(session_token)
     
     if not session_data.get("authenticated", False):
-        print("Session not authenticated")
         return jsonify({"authenticated": False}), 200
         
     wallet_address = session_data.get("wallet_address")
-    print(f"User authenticated with wallet: {wallet_address}")
     
     return jsonify({
         "authenticated": True,
         "walletAddress": wallet_address
     })
 
+# ================================================
+# 🔹 TRANSACTIONS
+# ================================================
+def wants_receipt(data):
+    """Clients can still opt into the old blocking behaviour with ``wait``."""
+    return bool((data or {}).get('wait')) or request.args.get('wait') in ('1', 'true')
+
+def tx_response(tx, message, data):
+    if not wants_receipt(data):
+        # Broadcast only; poll /api/tx/<txId> for the outcome
+        return jsonify({"message": message, **tx}), 202
+
+    tx = tx_pipeline.get_pipeline(web3, contract).wait(tx['txId'])
+    if tx['status'] != 'confirmed':
+        return jsonify({"error": tx['error'] or f"Transaction {tx['status']}", **tx}), 400
+    return jsonify({"message": message, **tx})
+
+@api.route('/api/tx/<tx_id>', methods=['GET'])
+def get_transaction(tx_id):
+    tx = tx_pipeline.get_pipeline(web3, contract).get(tx_id)
+    if tx is None:
+        return jsonify({"error": "Unknown transaction"}), 404
+    return jsonify(tx)
+
 # ================================================
 # 🔹 ADMIN ENDPOINTS
 # ================================================
-@app.route('/admin/add_candidate', methods=['POST'])
+@api.route('/admin/add_candidate', methods=['POST'])
 def add_candidate():
     try:
         data = request.get_json()
         candidate_name = data['name']
-        private_key = os.getenv('PRIVATE_KEY')
-        account = web3.eth.account.from_key(private_key).address
-        
-        nonce = web3.eth.get_transaction_count(account)
-        
-        tx = contract.functions.addCandidate(candidate_name).build_transaction({
-            'chainId': 11155111,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('10', 'gwei'),
-            'nonce': nonce
-        })
-        
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction.hex())
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        tx = tx_pipeline.get_pipeline(web3, contract).submit('addCandidate', candidate_name)
+
+        if not wants_receipt(data):
+            return jsonify({"message": f"Candidate {candidate_name} submitted", **tx}), 202
+
+        tx = tx_pipeline.get_pipeline(web3, contract).wait(tx['txId'])
+        if tx['status'] != 'confirmed':
+            return jsonify({"error": f"Failed to add candidate: {tx['error'] or tx['status']}", **tx}), 500
 
         # Get the ID of the newly added candidate (last entry)
         candidate_count = contract.functions.candidatesCount().call()
@@ -235,54 +363,26 @@ def add_candidate():
     except Exception as e:
         return jsonify({"error": f"Failed to add candidate: {str(e)}"}), 500
 
-@app.route('/admin/start_voting', methods=['POST'])
+@api.route('/admin/start_voting', methods=['POST'])
 def start_voting():
     try:
-        private_key = os.getenv('PRIVATE_KEY')
-        account = web3.eth.account.from_key(private_key)
-        nonce = web3.eth.get_transaction_count(account.address)
-        
-        tx = contract.functions.startVoting().build_transaction({
-            'chainId': 11155111,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('10', 'gwei'),
-            'nonce': nonce
-        })
-        
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction.hex())
-        web3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        return jsonify({"message": "Voting has started!"})
+        tx = tx_pipeline.get_pipeline(web3, contract).submit('startVoting')
+        return tx_response(tx, "Voting has started!", request.get_json(silent=True))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-@app.route('/admin/end_voting', methods=['POST'])
+@api.route('/admin/end_voting', methods=['POST'])
 def end_voting():
     try:
-        private_key = os.getenv('PRIVATE_KEY')
-        account = web3.eth.account.from_key(private_key)
-        nonce = web3.eth.get_transaction_count(account.address)
-        
-        tx = contract.functions.endVoting().build_transaction({
-            'chainId': 11155111,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('10', 'gwei'),
-            'nonce': nonce
-        })
-        
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction.hex())
-        web3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        return jsonify({"message": "Voting has ended!"})
+        tx = tx_pipeline.get_pipeline(web3, contract).submit('endVoting')
+        return tx_response(tx, "Voting has ended!", request.get_json(silent=True))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 # ================================================
 # 🔹 VOTING ENDPOINTS
 # ================================================
-@app.route('/candidates', methods=['GET', 'OPTIONS'])
+@api.route('/candidates', methods=['GET', 'OPTIONS'])
 def get_candidates():
     if request.method == 'OPTIONS':
         return '', 200
@@ -296,21 +396,10 @@ def get_candidates():
         }), 200
         
     try:
-        candidates_count = contract.functions.candidatesCount().call()
-        print(f"Found {candidates_count} candidates")
-        candidates = []
-        
-        for i in range(1, candidates_count + 1):
-            try:
-                candidate = contract.functions.candidates(i).call()
-                candidates.append({
-                    'id': candidate[0],
-                    'name': candidate[1],
-                    'voteCount': candidate[2]
-                })
-            except Exception as e:
-                print(f"Error getting candidate {i}: {str(e)}")
-                
+        if index_store.is_ready():
+            candidates = index_store.candidates()
+        else:
+            candidates, _ = read_candidates_cached()
         return jsonify(candidates)
     except Exception as e:
         print(f"Error in get_candidates: {str(e)}")
@@ -319,44 +408,70 @@ def get_candidates():
             "candidates": []
         }), 200
 
-@app.route('/vote', methods=['POST'])
+def submit_to(election, fn_name, *args):
+    """Queue an admin-signed ``fn_name(*args)`` on ``election``'s contract."""
+    to = None if election is default_election else election.address
+    return tx_pipeline.get_pipeline(web3, contract).submit(fn_name, *args, to=to)
+
+@api.route('/vote', methods=['POST'])
 def cast_vote():
-    data = request.get_json()
+    return vote_in(default_election, request.get_json())
+
+def vote_in(election, data):
     session_token = data.get('sessionToken')
     candidate_id = data.get('candidateId')
 
-    if not session_token or session_token not in session_store:
+    session_data = session_store.get(session_token) if session_token else None
+    if not session_data:
         return jsonify({"error": "Authentication required"}), 401
 
-    voter_address = session_store[session_token]["wallet_address"]
+    voter_address = session_data["wallet_address"]
 
     try:
         # Ensure the voter's address is in checksum format
-        voter_address = Web3.to_checksum_address(voter_address)
+        voter_address = checksum_address(voter_address)
 
         # Use private key to send transaction (since we're using Infura)
-        private_key = os.getenv('PRIVATE_KEY')
-        account = web3.eth.account.from_key(private_key)
-        nonce = web3.eth.get_transaction_count(account.address)
-        
-        tx = contract.functions.vote(candidate_id).build_transaction({
-            'chainId': 11155111,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('10', 'gwei'),
-            'nonce': nonce
-        })
-        
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction.hex())
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-
-        return jsonify({"message": "Vote cast successfully!", "txHash": tx_hash.hex()})
+        pipeline = tx_pipeline.get_pipeline(web3, contract)
+        candidate_id = election.eligibility.check(election.contract, voter_address, pipeline.account, candidate_id)
+        election.eligibility.claim(voter_address)
+        try:
+            tx = submit_to(election, 'vote', candidate_id)
+        except Exception:
+            election.eligibility.release(voter_address)
+            raise
+        election.eligibility.submitted(voter_address, tx['txId'])
+        return tx_response(tx, "Vote cast successfully!", data)
+    except Ineligible as e:
+        instrumentation.record_vote_rejected(e.code)
+        return jsonify(e.to_dict()), e.status
     except ValueError as e:
         return jsonify({"error": f"Invalid wallet address: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-@app.route('/results', methods=['GET', 'OPTIONS'])
+@api.route('/api/vote/eligibility', methods=['POST'])
+def vote_eligibility():
+    """Dry run of /vote's pre-flight checks; nothing is signed or reserved."""
+    data = request.get_json()
+    session_token = data.get('sessionToken')
+
+    session_data = session_store.get(session_token) if session_token else None
+    if not session_data:
+        return jsonify({"error": "Authentication required"}), 401
+
+    try:
+        voter_address = checksum_address(session_data["wallet_address"])
+        pipeline = tx_pipeline.get_pipeline(web3, contract)
+        candidate_id = eligibility.check(contract, voter_address, pipeline.account, data.get('candidateId'),
+                                         dry_run=True)
+        return jsonify({"eligible": True, "candidateId": candidate_id})
+    except Ineligible as e:
+        return jsonify({"eligible": False, **e.to_dict()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@api.route('/results', methods=['GET', 'OPTIONS'])
 def get_results():
     if request.method == 'OPTIONS':
         return '', 200
@@ -365,30 +480,65 @@ def get_results():
         return jsonify({"error": "Contract not loaded"}), 500
 
     try:
-        # Check if voting is open (since there's no votingEnded function)
-        voting_open = contract.functions.votingOpen().call()
-        
-        # Get candidates
-        candidates_count = contract.functions.candidatesCount().call()
-        candidates = []
-        for i in range(1, candidates_count + 1):
-            candidate = contract.functions.candidates(i).call()
-            candidates.append({
-                'id': candidate[0],
-                'name': candidate[1],
-                'voteCount': candidate[2]
-            })
-            
-        return jsonify({
-            "votingOpen": voting_open,
-            "votingEnded": not voting_open,  # Derive ended from open status
-            "candidates": candidates
-        })
+        snapshot = current_results_snapshot()
+        status, body, headers = snapshot.respond(request.headers.get('Accept-Encoding'),
+                                                 request.headers.get('If-None-Match'))
+        return Response(body, status=status, headers=headers, mimetype='application/json')
     except Exception as e:
         print(f"Error in get_results: {str(e)}")
         return jsonify({"error": f"Error fetching results: {str(e)}"}), 500
 
-@app.route('/register-voter', methods=['POST'])
+@api.route('/results/stream', methods=['GET'])
+def stream_results():
+    """Server-Sent Events: a snapshot, then a delta per VoteCasted."""
+    if not contract:
+        return jsonify({"error": "Contract not loaded"}), 500
+
+    try:
+        broadcaster = results_stream.get_broadcaster(web3, contract, index_store=index_store,
+                                                     on_change=on_contract_event)
+        subscription = broadcaster.subscribe()
+    except Exception as e:
+        print(f"Error in stream_results: {str(e)}")
+        return jsonify({"error": f"Error fetching results: {str(e)}"}), 500
+
+    return Response(stream_with_context(broadcaster.events(subscription)),
+                    mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api.route('/audit/votes', methods=['GET'])
+def audit_votes():
+    """Every VoteCasted as CSV / JSONL / columnar, streamed from eth_getLogs (resumable by cursor)."""
+    if not contract:
+        return jsonify({"error": "Contract not loaded"}), 500
+    return audit_export_response(contract.address)
+
+def audit_export_response(address, prefix='votes'):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in audit_export.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(audit_export.FORMATS)}"}), 400
+    try:
+        from_block, to_block, after = audit_export.resolve_range(
+            web3.eth.block_number, request.args.get('fromBlock'), request.args.get('toBlock'),
+            request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid block range or cursor: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Error fetching block number: {str(e)}"}), 500
+
+    reader = audit_export.VoteLogReader(web3, address)
+    mimetype, extension = audit_export.FORMATS[fmt]
+    return Response(stream_with_context(audit_export.export_votes(reader, fmt, from_block, to_block, after)),
+                    mimetype=mimetype,
+                    headers={
+                        "Content-Disposition": f'attachment; filename="{prefix}-{audit_export.range_label(from_block, to_block)}.{extension}"',
+                        "X-Audit-From-Block": str(from_block),
+                        "X-Audit-To-Block": str(to_block),
+                        "Cache-Control": "no-cache",
+                        "X-Accel-Buffering": "no",
+                    })
+
+@api.route('/register-voter', methods=['POST'])
 def register_voter():
     data = request.get_json()
     voter_address = data.get('walletAddress')
@@ -398,32 +548,159 @@ def register_voter():
 
     try:
         # Convert voter address to checksum format
-        voter_address = Web3.to_checksum_address(voter_address)
+        voter_address = checksum_address(voter_address)
 
         # Admin registers the voter using private key
-        private_key = os.getenv('PRIVATE_KEY')
-        account = web3.eth.account.from_key(private_key)
-        nonce = web3.eth.get_transaction_count(account.address)
-        
-        tx = contract.functions.registerVoter(voter_address).build_transaction({
-            'chainId': 11155111,
-            'gas': 300000,
-            'gasPrice': web3.to_wei('10', 'gwei'),
-            'nonce': nonce
-        })
-        
-        signed_tx = web3.eth.account.sign_transaction(tx, private_key=private_key)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.rawTransaction.hex())
-        web3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        return jsonify({"message": f"Voter {voter_address} registered successfully!"})
+        tx = tx_pipeline.get_pipeline(web3, contract).submit('registerVoter', voter_address)
+        return tx_response(tx, f"Voter {voter_address} registered successfully!", data)
     except ValueError as e:
         return jsonify({"error": f"Invalid wallet address: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@api.route('/admin/register-voters/bulk', methods=['POST'])
+def register_voters_bulk():
+    """Queue a CSV/JSONL list of voter addresses for registration."""
+    try:
+        upload = request.files.get('file')
+        if upload:
+            fmt = bulk_register.detect_format(upload.mimetype, upload.filename)
+            job = bulk_register.create_job(upload.stream, fmt)
+        else:
+            fmt = bulk_register.detect_format(request.content_type)
+            job = bulk_register.create_job(request.stream, fmt)
+        return jsonify(job), 202
+    except bulk_register.BulkRegistrationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to create bulk registration: {str(e)}"}), 500
+
+@api.route('/admin/register-voters/bulk/<job_id>', methods=['GET'])
+def register_voters_bulk_status(job_id):
+    job = bulk_register.get_job(job_id, with_chunks=True)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+# ================================================
+# 🔹 ELECTIONS (other Voting deployments, see backend/elections.py)
+# ================================================
+def election_or_404(election_id):
+    election = elections.get(election_id)
+    if election is None:
+        return None, (jsonify({"error": f"Unknown election {election_id}"}), 404)
+    return election, None
+
+@api.route('/elections', methods=['GET'])
+def list_elections():
+    return jsonify({
+        "default": DEFAULT_ELECTION,
+        "elections": [{"id": election.id, "address": election.address} for election in elections.all()],
+    })
+
+@api.route('/admin/elections', methods=['POST'])
+def register_election():
+    data = request.get_json(silent=True) or {}
+    try:
+        election = elections.register(data.get('electionId'), data.get('contractAddress'))
+        return jsonify({"id": election.id, "address": election.address}), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to register election: {str(e)}"}), 500
+
+@api.route('/elections/<election_id>/candidates', methods=['GET'])
+def election_candidates(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    try:
+        return jsonify(election.candidates())
+    except Exception as e:
+        print(f"Error in election_candidates({election_id}): {str(e)}")
+        return jsonify({"error": str(e), "candidates": []}), 200
+
+@api.route('/elections/<election_id>/results', methods=['GET'])
+def election_results(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    try:
+        snapshot = election.results_snapshot()
+        status, body, headers = snapshot.respond(request.headers.get('Accept-Encoding'),
+                                                 request.headers.get('If-None-Match'))
+        return Response(body, status=status, headers=headers, mimetype='application/json')
+    except Exception as e:
+        print(f"Error in election_results({election_id}): {str(e)}")
+        return jsonify({"error": f"Error fetching results: {str(e)}"}), 500
+
+@api.route('/elections/<election_id>/vote', methods=['POST'])
+def election_vote(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    return vote_in(election, request.get_json())
+
+@api.route('/elections/<election_id>/register-voter', methods=['POST'])
+def election_register_voter(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    data = request.get_json()
+    if not data.get('walletAddress'):
+        return jsonify({"error": "Voter address is required"}), 400
+    try:
+        voter_address = checksum_address(data['walletAddress'])
+        tx = submit_to(election, 'registerVoter', voter_address)
+        return tx_response(tx, f"Voter {voter_address} registered successfully!", data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid wallet address: {str(e)}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@api.route('/elections/<election_id>/admin/add_candidate', methods=['POST'])
+def election_add_candidate(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    data = request.get_json()
+    try:
+        tx = submit_to(election, 'addCandidate', data['name'])
+        return tx_response(tx, f"Candidate {data['name']} submitted", data)
+    except Exception as e:
+        return jsonify({"error": f"Failed to add candidate: {str(e)}"}), 400
+
+@api.route('/elections/<election_id>/admin/start_voting', methods=['POST'])
+def election_start_voting(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    try:
+        tx = submit_to(election, 'startVoting')
+        return tx_response(tx, "Voting has started!", request.get_json(silent=True))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@api.route('/elections/<election_id>/admin/end_voting', methods=['POST'])
+def election_end_voting(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    try:
+        tx = submit_to(election, 'endVoting')
+        return tx_response(tx, "Voting has ended!", request.get_json(silent=True))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@api.route('/elections/<election_id>/audit/votes', methods=['GET'])
+def election_audit_votes(election_id):
+    election, error = election_or_404(election_id)
+    if error:
+        return error
+    return audit_export_response(election.address, prefix=f"{election.id}-votes")
+
 # Add this to your Flask app
-@app.route('/api/check-connection', methods=['GET'])
+@api.route('/api/check-connection', methods=['GET'])
 def check_connection():
     try:
         connected = web3.is_connected()
@@ -437,7 +714,7 @@ def check_connection():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/check-contract', methods=['GET'])
+@api.route('/api/check-contract', methods=['GET'])
 def check_contract():
     try:
         if not contract:
@@ -445,12 +722,16 @@ def check_contract():
             
         # Test contract by calling a simple view function
         try:
-            candidates_count = contract.functions.candidatesCount().call()
-            admin_address = contract.functions.admin().call()
-            voting_open = contract.functions.votingOpen().call()
+            if index_store.is_ready():
+                candidates_count = index_store.candidates_count()
+                voting_open = index_store.voting_open()
+            else:
+                candidates_count = view_cache.call(contract, 'candidatesCount')
+                voting_open = view_cache.call(contract, 'votingOpen')
+            admin_address = view_cache.call(contract, 'admin')
             
             return jsonify({
-                "contract_address": contract_address,
+                "contract_address": contract.address,
                 "candidatesCount": candidates_count,
                 "admin": admin_address,
                 "votingOpen": voting_open,
@@ -458,22 +739,84 @@ def check_contract():
             })
         except Exception as contract_error:
             return jsonify({
-                "contract_address": contract_address,
+                "contract_address": contract.address,
                 "error": f"Contract call failed: {str(contract_error)}"
             }), 500
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/health')
-@app.route('/')
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint, merged across gunicorn workers."""
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/rpc-stats', methods=['GET'])
+def rpc_stats():
+    return jsonify(web3.provider.stats())
+
+@api.route('/api/eligibility-stats', methods=['GET'])
+def eligibility_stats():
+    return jsonify(eligibility.stats())
+
+@api.route('/api/rate-limit-stats', methods=['GET'])
+def rate_limit_stats():
+    return jsonify(rate_limiter.stats())
+
+@api.route('/api/election-stats', methods=['GET'])
+def election_stats():
+    return jsonify(elections.stats())
+
+@api.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({**view_cache.stats(), "resultsSnapshot": results_snapshots.stats()})
+
+@api.route('/api/health')
+@api.route('/')
 def root():
     return jsonify({
         "status": "ready",
         "service": "Blockchain Voting API"
     }), 200
 
+@api.route('/api/health/live', methods=['GET'])
+def health_live():
+    """The process is up and serving; touches neither the chain nor the stores."""
+    return jsonify({"status": "live"}), 200
+
+@api.route('/api/health/ready', methods=['GET'])
+def health_ready():
+    """Contract loaded and the RPC provider answering (block number, cached ~1s)."""
+    if not contract:
+        return jsonify({"status": "not ready", **chain.status()}), 503
+    try:
+        latest_block = view_cache.current_block()
+    except Exception as e:
+        return jsonify({"status": "not ready", "error": f"RPC unavailable: {str(e)}", **chain.status()}), 503
+    return jsonify({
+        "status": "ready",
+        "latestBlock": latest_block,
+        "indexReady": index_store.is_ready(),
+        **chain.status()
+    }), 200
+
+def create_app():
+    """Flask app with the API routes; chain clients are created on first use."""
+    app = Flask(__name__)
+    CORS(app,
+         origins=CORS_ORIGINS,
+         supports_credentials=True,
+         allow_headers=["Content-Type", "Authorization"],
+         methods=["GET", "POST", "OPTIONS"],
+         expose_headers=["Content-Type"],
+         max_age=600)
+    app.register_blueprint(api)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
-    print("Starting Flask app with in-memory session store...")
+    check_config()
+    print(f"Starting Flask app with {type(session_store).__name__}...")
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,627 @@
+"""Async mode of the API (aiohttp + ``AsyncWeb3``).
+
+    API_MODE=async gunicorn --config gunicorn.conf.py
+    python -m backend.async_app
+
+The hot, I/O-bound paths - ``/candidates``, ``/results``, ``/api/nonce``,
+``/api/verify``, ``/api/check-auth``, the health and connection checks - run
+natively on the event loop, so one worker keeps hundreds of chain reads in
+flight instead of one per thread. Chain reads go through ``AsyncWeb3`` on an
+``AsyncMultiEndpointProvider`` that shares endpoints, health scores and
+histograms with the sync provider, and concurrent reads of the same block
+are coalesced into one upstream batch.
+
+``/results/stream`` is native too: each client awaits frames from the
+process's results poller on the loop, so idle SSE connections hold no
+thread. Every other route (transactions, admin, bulk registration, stats)
+is forwarded to the Flask app in ``backend.app`` on a thread pool,
+so routes and response shapes are identical in both modes and the Flask app
+(``API_MODE=sync``, the default) stays the fallback.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from backend import app as sync_api
+from backend import bulk_register, chain, indexer, instrumentation, results_stream, tx_pipeline
+from backend.auth_verify import checksum_address, login_message, recover_address
+from backend.batch_reads import read_candidates_async
+from backend.rate_limit import RateLimited, client_ip
+from backend.results_snapshot import results_payload, voting_ended_final
+from backend.view_cache import BLOCK_POLL_INTERVAL, IMMUTABLE_FUNCTIONS
+
+# Threads for routes forwarded to Flask
+WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 64))
+# Request bodies up to this size are buffered in memory, larger ones spooled to disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+HOP_BY_HOP_HEADERS = frozenset(['connection', 'keep-alive', 'transfer-encoding', 'content-length'])
+
+session_store = sync_api.session_store
+index_store = sync_api.index_store
+results_snapshots = sync_api.results_snapshots
+
+# Built on first use, sharing the sync provider's endpoints (see backend/chain.py)
+async_web3 = chain.async_web3
+contract = chain.async_contract
+
+
+def json_response(data, status=200):
+    """Byte-for-byte what ``flask.jsonify`` produces (sorted keys, trailing newline)."""
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')) + "\n"
+    return web.Response(text=body, status=status, content_type='application/json')
+
+
+async def read_json(request):
+    try:
+        request['json'] = await request.json()
+    except Exception:
+        request['json'] = None
+    return request['json']
+
+
+class AsyncViewCache:
+    """Event-loop counterpart of ``ViewCache``: entries are futures, keyed by block.
+
+    The first caller for a key starts the load and every concurrent caller
+    awaits the same future, so a burst of requests costs one upstream read.
+    """
+
+    def __init__(self, web3, block_poll_interval=BLOCK_POLL_INTERVAL):
+        self.web3 = web3
+        self.block_poll_interval = block_poll_interval
+        self._block = None
+        self._block_checked_at = 0.0
+        self._block_future = None
+        self._entries = {}
+        self._permanent = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def current_block(self):
+        if self._block is not None and time.time() - self._block_checked_at < self.block_poll_interval:
+            return self._block
+        if self._block_future is None:
+            self._block_future = asyncio.ensure_future(self.web3.eth.block_number)
+        future = self._block_future
+        try:
+            block = await future
+        finally:
+            if self._block_future is future:
+                self._block_future = None
+        self._block_checked_at = time.time()
+        if block != self._block:
+            self._block = block
+            self._entries = {k: v for k, v in self._entries.items() if k[0] >= block}
+        return block
+
+    async def get_or_load(self, key, loader, permanent=False):
+        if permanent:
+            store, cache_key, block = self._permanent, key, 'latest'
+        else:
+            block = await self.current_block()
+            store, cache_key = self._entries, (block, key)
+
+        future = store.get(cache_key)
+        if future is None:
+            self.misses += 1
+            future = store[cache_key] = asyncio.ensure_future(loader(block))
+        else:
+            self.hits += 1
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Do not cache failures
+            if store.get(cache_key) is future:
+                del store[cache_key]
+            raise
+
+    async def call(self, fn_name, *args):
+        async def load(block):
+            return await getattr(contract.functions, fn_name)(*args).call(block_identifier=block)
+        return await self.get_or_load((fn_name, args), load, permanent=fn_name in IMMUTABLE_FUNCTIONS)
+
+    def invalidate(self):
+        # Called from the indexer thread; only rebinds plain attributes
+        self._entries = {}
+        self._block_checked_at = 0.0
+        self.invalidations += 1
+
+
+view_cache = AsyncViewCache(async_web3)
+
+
+async def read_candidates_cached():
+    return await view_cache.get_or_load(('read_candidates',),
+                                        lambda block: read_candidates_async(async_web3, contract, block=block))
+
+
+def _indexed_candidates():
+    """Candidates from the event index, or None while it is not ready."""
+    return index_store.candidates() if index_store.is_ready() else None
+
+
+def _indexed_contract_state():
+    """(candidatesCount, votingOpen) from the event index, or None while it is not ready."""
+    return (index_store.candidates_count(), index_store.voting_open()) if index_store.is_ready() else None
+
+
+def _invalidate_caches():
+    sync_api.on_contract_event()
+    view_cache.invalidate()
+
+
+def _start_background_loops():
+    indexer.ensure_started(sync_api.web3, sync_api.contract, on_change=_invalidate_caches)
+    tx_pipeline.ensure_tracker_started(sync_api.web3, sync_api.contract)
+    bulk_register.ensure_worker_started(sync_api.web3, sync_api.contract)
+
+
+# ================================================
+# 🔹 AUTHENTICATION ENDPOINTS
+# ================================================
+async def get_nonce(request):
+    if request.method == 'OPTIONS':
+        return web.Response(status=200)
+
+    data = await read_json(request) or {}
+    wallet_address = data.get('walletAddress')
+    if not wallet_address:
+        return json_response({"error": "walletAddress required"}, 400)
+
+    try:
+        wallet_address = checksum_address(wallet_address)
+    except ValueError as e:
+        return json_response({"error": f"Invalid wallet address: {str(e)}"}, 400)
+
+    nonce = ''.join(random.choices(string.ascii_letters + string.digits, k=32))
+    session_token = ''.join(random.choices(string.ascii_letters + string.digits, k=64))
+    # The session stores are blocking (SQLite): keep them off the event loop
+    await asyncio.to_thread(session_store.set, session_token, {
+        "wallet_address": wallet_address,
+        "nonce": nonce,
+        "created_at": time.time(),
+        "expires_at": time.time() + sync_api.SESSION_TTL
+    }, ttl=sync_api.SESSION_TTL)
+
+    return json_response({"nonce": nonce, "sessionToken": session_token})
+
+
+async def verify_signature(request):
+    if request.method == 'OPTIONS':
+        return web.Response(status=200)
+
+    data = await read_json(request) or {}
+    wallet_address = data.get('walletAddress')
+    signature = data.get('signature')
+    session_token = data.get('sessionToken')
+
+    if not wallet_address or not signature or not session_token:
+        return json_response({"error": "Missing required parameters"}, 400)
+
+    try:
+        wallet_address = checksum_address(wallet_address)
+    except ValueError as e:
+        return json_response({"error": f"Invalid wallet address: {str(e)}"}, 400)
+
+    session_data = await asyncio.to_thread(session_store.get, session_token)
+    if not session_data:
+        return json_response({"error": "Session expired or invalid.", "sessionLost": True}, 400)
+
+    if wallet_address != session_data.get("wallet_address"):
+        return json_response({"error": "Wallet address mismatch"}, 400)
+
+    try:
+        # ECDSA recovery takes milliseconds of CPU; run it on a thread too
+        recovered_address = await asyncio.to_thread(
+            recover_address, login_message(session_data.get("nonce")), signature)
+        if recovered_address == wallet_address:
+            auth_token = await asyncio.to_thread(sync_api.issue_auth_token, session_token, session_data)
+            return json_response({"success": True, "token": auth_token, "address": wallet_address})
+        return json_response({"error": "Signature verification failed"}, 400)
+    except Exception as e:
+        return json_response({"error": f"Error during signature recovery: {str(e)}"}, 400)
+
+
+async def check_auth(request):
+    if request.method == 'OPTIONS':
+        return web.Response(status=200)
+
+    data = await read_json(request) or {}
+    session_token = data.get('sessionToken')
+    session_data = await asyncio.to_thread(session_store.get, session_token) if session_token else None
+
+    if not session_data or not session_data.get("authenticated", False):
+        return json_response({"authenticated": False})
+
+    return json_response({
+        "authenticated": True,
+        "walletAddress": session_data.get("wallet_address")
+    })
+
+
+# ================================================
+# 🔹 VOTING ENDPOINTS
+# ================================================
+async def get_candidates(request):
+    if request.method == 'OPTIONS':
+        return web.Response(status=200)
+
+    if not sync_api.contract:
+        return json_response({"error": "Contract not loaded", "candidates": []})
+
+    try:
+        # The index is SQLite: read it on a thread
+        candidates = await asyncio.to_thread(_indexed_candidates)
+        if candidates is None:
+            candidates, _ = await read_candidates_cached()
+        return json_response(candidates)
+    except Exception as e:
+        print(f"Error in get_candidates: {str(e)}")
+        return json_response({"error": str(e), "candidates": []})
+
+
+async def current_results_snapshot(request):
+    """Same as ``backend.app.current_results_snapshot``, reading the chain asynchronously."""
+    snapshot = results_snapshots.current()
+    if snapshot is not None:
+        return snapshot
+
+    if await asyncio.to_thread(index_store.is_ready):
+        return await asyncio.to_thread(sync_api.current_results_snapshot)
+
+    candidates, voting_open = await read_candidates_cached()
+    final = False
+    if not voting_open and results_snapshots.should_check_final():
+        try:
+            # Rare (at most every RESULTS_FREEZE_CHECK_INTERVAL): the sync provider on the pool is fine
+            final = await asyncio.get_running_loop().run_in_executor(
+                request.app['wsgi_pool'], voting_ended_final, sync_api.web3, sync_api.contract)
+        except Exception as e:
+            print(f"VotingEnded lookup failed: {str(e)}")
+    return results_snapshots.publish(results_payload(candidates, voting_open), final=final)
+
+
+async def get_results(request):
+    if request.method == 'OPTIONS':
+        return web.Response(status=200)
+
+    if not sync_api.contract:
+        return json_response({"error": "Contract not loaded"}, 500)
+
+    try:
+        snapshot = await current_results_snapshot(request)
+        status, body, headers = snapshot.respond(request.headers.get('Accept-Encoding'),
+                                                 request.headers.get('If-None-Match'))
+        return web.Response(body=body, status=status, headers=headers, content_type='application/json')
+    except Exception as e:
+        print(f"Error in get_results: {str(e)}")
+        return json_response({"error": f"Error fetching results: {str(e)}"}, 500)
+
+
+async def stream_results(request):
+    """Server-Sent Events: a snapshot, then a delta per VoteCasted (see backend/results_stream.py)."""
+    if not sync_api.contract:
+        return json_response({"error": "Contract not loaded"}, 500)
+
+    try:
+        broadcaster = results_stream.get_broadcaster(sync_api.web3, sync_api.contract, index_store=index_store,
+                                                     on_change=_invalidate_caches)
+        subscription = broadcaster.subscribe(results_stream.AsyncSubscription(asyncio.get_running_loop()))
+    except Exception as e:
+        print(f"Error in stream_results: {str(e)}")
+        return json_response({"error": f"Error fetching results: {str(e)}"}, 500)
+
+    response = web.StreamResponse(headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.content_type = 'text/event-stream'
+    # Headers go out with prepare(), before cors_middleware sees the response
+    add_cors_headers(request, response)
+    try:
+        await response.prepare(request)
+        while True:
+            try:
+                frame = await subscription.get(results_stream.KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                frame = results_stream.KEEPALIVE
+            await response.write(frame)
+    except ConnectionResetError:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscription)
+    return response
+
+
+async def check_connection(request):
+    try:
+        connected, chain_id, latest_block = await asyncio.gather(
+            async_web3.is_connected(), async_web3.eth.chain_id, async_web3.eth.block_number)
+        return json_response({
+            "connected": connected,
+            "chainId": chain_id,
+            "latestBlock": latest_block
+        })
+    except Exception as e:
+        return json_response({"error": str(e)}, 500)
+
+
+async def check_contract(request):
+    if not sync_api.contract:
+        return json_response({"error": "Contract not loaded"}, 500)
+
+    try:
+        indexed = await asyncio.to_thread(_indexed_contract_state)
+        if indexed is not None:
+            candidates_count, voting_open = indexed
+            admin_address = await view_cache.call('admin')
+        else:
+            candidates_count, voting_open, admin_address = await asyncio.gather(
+                view_cache.call('candidatesCount'), view_cache.call('votingOpen'), view_cache.call('admin'))
+        return json_response({
+            "contract_address": sync_api.contract.address,
+            "candidatesCount": candidates_count,
+            "admin": admin_address,
+            "votingOpen": voting_open,
+            "status": "Contract is working properly"
+        })
+    except Exception as e:
+        return json_response({
+            "contract_address": sync_api.contract.address,
+            "error": f"Contract call failed: {str(e)}"
+        }, 500)
+
+
+async def rpc_stats(request):
+    stats = sync_api.web3.provider.stats()
+    provider = async_web3.provider
+    stats["hedged"] += provider.hedged
+    stats["hedgeWins"] += provider.hedge_wins
+    stats["failovers"] += provider.failovers
+    return json_response(stats)
+
+
+async def root(request):
+    return json_response({
+        "status": "ready",
+        "service": "Blockchain Voting API"
+    })
+
+
+# ================================================
+# 🔹 FLASK FALLBACK
+# ================================================
+def _wsgi_environ(request, body):
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': request.path,
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': request.url.host or 'localhost',
+        'SERVER_PORT': str(request.url.port or 80),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = name.upper().replace('-', '_')
+        if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[key] = value
+        else:
+            environ[f'HTTP_{key}'] = value
+    return environ
+
+
+def _call_flask(environ):
+    """Run the Flask app; non-streamed bodies are read here, on the worker thread."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    result = sync_api.app(environ, start_response)
+    streamed = not any(name.lower() == 'content-length' for name, _ in started['headers'])
+    if streamed:
+        return started, result, None
+    try:
+        return started, None, b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+def _close(result):
+    if hasattr(result, 'close'):
+        result.close()
+
+
+async def forward_to_flask(request):
+    loop = asyncio.get_running_loop()
+    pool = request.app['wsgi_pool']
+    # Flask keeps request state in context variables: run every step of one
+    # request (call, each chunk, close) in the same context, whichever thread
+    context = contextvars.copy_context()
+
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    async for chunk in request.content.iter_chunked(64 * 1024):
+        body.write(chunk)
+    body.seek(0)
+
+    try:
+        started, result, content = await loop.run_in_executor(
+            pool, context.run, _call_flask, _wsgi_environ(request, body))
+    finally:
+        body.close()
+
+    headers = [(name, value) for name, value in started['headers'] if name.lower() not in HOP_BY_HOP_HEADERS]
+    if result is None:
+        response = web.Response(status=started['status'], body=content)
+        for name, value in headers:
+            response.headers.add(name, value)
+        return response
+
+    # Streamed (SSE): pull each chunk on the pool, write it from the loop
+    response = web.StreamResponse(status=started['status'])
+    for name, value in headers:
+        response.headers.add(name, value)
+    iterator = iter(result)
+    pending = None
+
+    def close(_=None):
+        try:
+            pool.submit(context.run, _close, result)
+        except RuntimeError:
+            # Pool already shut down (server stopping)
+            context.run(_close, result)
+
+    try:
+        await response.prepare(request)
+        while True:
+            pending = pool.submit(context.run, next, iterator, None)
+            chunk = await asyncio.wrap_future(pending)
+            if chunk is None:
+                break
+            await response.write(chunk)
+    finally:
+        # The generator may still be running on the pool if the client left mid-wait
+        if pending is not None and not pending.done():
+            pending.add_done_callback(close)
+        else:
+            close()
+    return response
+
+
+# ================================================
+# 🔹 APPLICATION
+# ================================================
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Same per-route metrics and sampled traces as the Flask hooks."""
+    if request.match_info.handler is forward_to_flask:
+        # Flask records forwarded requests itself
+        return await handler(request)
+
+    instrumentation.start_request()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    finally:
+        instrumentation.finish_request(request.method, request.match_info.route.resource.canonical, status,
+                                       details=lambda: {
+                                           "path": request.path,
+                                           "args": dict(request.query),
+                                           "headers": dict(request.headers),
+                                           "body": request.get('json'),
+                                       })
+
+
+@web.middleware
+async def rate_limit_middleware(request, handler):
+    """The Flask app's rate limits for the native routes (forwarded ones are limited by Flask)."""
+    route = request.match_info.route.resource.canonical
+    if request.method == 'OPTIONS' or request.match_info.handler is forward_to_flask \
+            or not sync_api.rate_limiter.limits(route):
+        return await handler(request)
+
+    data = await read_json(request)
+    # None of the native routes is in SESSION_WALLET_ROUTES (those are forwarded)
+    wallet = data.get('walletAddress') if isinstance(data, dict) else None
+    try:
+        sync_api.rate_limiter.check(route, ip=client_ip(request.remote, request.headers.get('X-Forwarded-For')),
+                                    wallet=wallet)
+    except RateLimited as e:
+        instrumentation.record_rate_limited(route, e.policy.key)
+        response = json_response(e.to_dict(), 429)
+        response.headers.update(e.headers())
+        return response
+    return await handler(request)
+
+
+def add_cors_headers(request, response):
+    """Flask-CORS equivalent for a native route's response."""
+    origin = request.headers.get('Origin')
+    if origin not in sync_api.CORS_ORIGINS or 'Access-Control-Allow-Origin' in response.headers:
+        return
+
+    response.headers['Access-Control-Allow-Origin'] = origin
+    response.headers['Access-Control-Allow-Credentials'] = 'true'
+    response.headers.add('Vary', 'Origin')
+    if request.method == 'OPTIONS' and 'Access-Control-Request-Method' in request.headers:
+        response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS, POST'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+        response.headers['Access-Control-Max-Age'] = '600'
+    else:
+        response.headers['Access-Control-Expose-Headers'] = 'Content-Type'
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Flask-CORS for the native routes (forwarded ones already carry it)."""
+    response = await handler(request)
+    if not response.prepared:
+        add_cors_headers(request, response)
+    return response
+
+
+async def on_startup(app):
+    app['wsgi_pool'] = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='flask')
+    await asyncio.get_running_loop().run_in_executor(None, _start_background_loops)
+    print(f"Async API started in process {os.getpid()}")
+
+
+async def on_cleanup(app):
+    await async_web3.provider.close()
+    app['wsgi_pool'].shutdown(wait=False)
+
+
+def create_app():
+    app = web.Application(middlewares=[metrics_middleware, cors_middleware, rate_limit_middleware])
+    # (method, path, handler, handler answers OPTIONS itself like its Flask twin)
+    routes = [
+        ('POST', '/api/nonce', get_nonce, True),
+        ('POST', '/api/verify', verify_signature, True),
+        ('POST', '/api/check-auth', check_auth, True),
+        ('GET', '/candidates', get_candidates, True),
+        ('GET', '/results', get_results, True),
+        ('GET', '/results/stream', stream_results, False),
+        ('GET', '/api/check-connection', check_connection, False),
+        ('GET', '/api/check-contract', check_contract, False),
+        ('GET', '/api/rpc-stats', rpc_stats, False),
+        ('GET', '/api/health', root, False),
+        ('GET', '/', root, False),
+    ]
+    for method, path, handler, handles_options in routes:
+        app.router.add_route(method, path, handler)
+        if handles_options:
+            app.router.add_route('OPTIONS', path, handler)
+    # Everything else keeps its Flask implementation
+    app.router.add_route('*', '/{tail:.*}', forward_to_flask)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+app = create_app()
+
+if __name__ == '__main__':
+    sync_api.check_config()
+    port = int(os.environ.get('PORT', 5000))
+    print(f"Starting async API with {type(session_store).__name__}...")
+    web.run_app(app, host='0.0.0.0', port=port)
@@ -0,0 +1,266 @@
+"""Per-vote audit export streamed from ``VoteCasted`` logs.
+
+``/results`` only has totals. ``/audit/votes`` streams one record per
+``VoteCasted`` event (block, log index, transaction hash, voter, candidate)
+straight from ``eth_getLogs``, in one of ``FORMATS``:
+
+* ``csv`` - header line, then one row per vote;
+* ``jsonl`` - one JSON object per vote;
+* ``columnar`` - one JSON line per fetched block range, holding a column
+  array per field (like a Parquet row group), plus that group's cursor.
+
+``VoteLogReader`` fetches the block range in chunks, ``AUDIT_PARALLELISM``
+at a time, and hands them back in block order. A chunk that the provider
+refuses as too large ("query returned more than 10000 results", "block
+range too wide"...) is split in two and retried, and the target below
+is halved for the rest of the export. The next chunk size is
+set from the log density of the last chunk, aiming at ``AUDIT_TARGET_LOGS``
+logs per chunk (between half and twice that chunk's size, at most
+``AUDIT_MAX_SPAN`` blocks). At most
+``AUDIT_PARALLELISM + 1`` chunks are held at once and each is written out
+as soon as it is next in order, so memory does not grow with the election.
+
+Records are ordered by ``(blockNumber, logIndex)``. Pass the last record
+received as ``cursor=<blockNumber>:<logIndex>`` to resume strictly after it.
+The range is fixed before the first byte is sent (``X-Audit-From-Block`` /
+``X-Audit-To-Block``), and by default stops ``INDEXER_FINALITY_DEPTH``
+blocks below the head, so a resumed export sees the same chain (on a young
+chain that can leave nothing final yet: the export is then empty, with
+``X-Audit-To-Block`` one below ``X-Audit-From-Block``). If a fetch
+fails for good, the stream is aborted rather than ended, so a cut-off
+export never looks complete.
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_utils import keccak
+
+from backend.indexer import FINALITY_DEPTH, INDEXER_START_BLOCK
+
+AUDIT_PARALLELISM = int(os.environ.get('AUDIT_PARALLELISM', 4))
+AUDIT_INITIAL_SPAN = int(os.environ.get('AUDIT_INITIAL_SPAN', 2000))
+AUDIT_MAX_SPAN = int(os.environ.get('AUDIT_MAX_SPAN', 100000))
+# Aim for chunks of about this many logs
+AUDIT_TARGET_LOGS = int(os.environ.get('AUDIT_TARGET_LOGS', 2000))
+# Attempts per chunk for errors other than "range too large"
+AUDIT_RETRIES = int(os.environ.get('AUDIT_RETRIES', 3))
+# First block scanned when the request gives none (else the indexer's start)
+AUDIT_START_BLOCK = int(os.environ.get('AUDIT_START_BLOCK') or INDEXER_START_BLOCK or 0)
+
+VOTE_CASTED_TOPIC = '0x' + keccak(text='VoteCasted(address,uint256)').hex()
+
+# Addresses and hashes are lowercase hex, as in the index store (checksumming
+# costs a keccak per vote)
+FIELDS = ('blockNumber', 'logIndex', 'transactionHash', 'voter', 'candidateId')
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'columnar': ('application/x-ndjson', 'columnar.jsonl'),
+}
+
+
+class LogRangeTooLarge(Exception):
+    pass
+
+
+def parse_cursor(value):
+    """``"<block>:<logIndex>"`` -> ``(block, logIndex)``; None for no cursor."""
+    if not value:
+        return None
+    block, _, log_index = value.partition(':')
+    return int(block), int(log_index or -1)
+
+
+def format_cursor(record):
+    return f"{record[0]}:{record[1]}"
+
+
+def resolve_range(head, from_block=None, to_block=None, cursor=None):
+    """``(from_block, to_block, after)`` for a request; raises ValueError.
+
+    When nothing at or above ``from_block`` is final (or mined) yet, the
+    range comes back empty as ``to_block == from_block - 1``."""
+    after = parse_cursor(cursor)
+    start = int(from_block) if from_block not in (None, '') else AUDIT_START_BLOCK
+    if start < 0:
+        raise ValueError("fromBlock must not be negative")
+    if to_block in (None, ''):
+        end = head - FINALITY_DEPTH
+    elif to_block == 'latest':
+        end = head
+    else:
+        end = int(to_block)
+        if end < 0:
+            raise ValueError("toBlock must not be negative")
+        if end < start:
+            raise ValueError(f"toBlock {end} is below fromBlock {start}")
+        end = min(end, head)
+    if after is not None:
+        start = max(start, after[0])
+    return start, max(start - 1, end), after
+
+
+def range_label(from_block, to_block):
+    """``"<from>-<to>"`` for filenames and logs; ``"<from>-empty"`` for an empty range."""
+    return f"{from_block}-{to_block}" if to_block >= from_block else f"{from_block}-empty"
+
+
+def _to_int(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def decode_votes(logs, after=None):
+    """Raw ``VoteCasted`` logs -> sorted ``FIELDS`` tuples, skipping up to ``after``."""
+    records = []
+    for log in logs:
+        if log.get('removed'):
+            continue
+        data = log['data'][2:] if log['data'].startswith('0x') else log['data']
+        record = (_to_int(log['blockNumber']), _to_int(log['logIndex']), log['transactionHash'],
+                  '0x' + data[24:64], int(data[64:128], 16))
+        if after is None or record[:2] > after:
+            records.append(record)
+    records.sort(key=lambda r: (r[0], r[1]))
+    return records
+
+
+class VoteLogReader:
+    """Adaptive, parallel ``eth_getLogs`` over a block range, in block order."""
+
+    def __init__(self, web3, address, parallelism=AUDIT_PARALLELISM, initial_span=AUDIT_INITIAL_SPAN,
+                 max_span=AUDIT_MAX_SPAN, target_logs=AUDIT_TARGET_LOGS, retries=AUDIT_RETRIES):
+        self.web3 = web3
+        self.address = address
+        self.parallelism = max(1, parallelism)
+        self.span = max(1, initial_span)
+        self.max_span = max(1, max_span)
+        self.target_logs = max(1, target_logs)
+        self.retries = max(1, retries)
+        self.calls = 0
+        self.splits = 0
+        self.errors = 0
+
+    def fetch(self, from_block, to_block):
+        """Raw logs of one chunk; raises ``LogRangeTooLarge`` if refused as too big."""
+        # Imported here: rpc_provider pulls in web3, which import backend.app must not load
+        from backend.rpc_provider import is_log_range_error
+        params = [{'address': self.address, 'topics': [VOTE_CASTED_TOPIC],
+                   'fromBlock': hex(from_block), 'toBlock': hex(to_block)}]
+        for attempt in range(self.retries):
+            self.calls += 1
+            try:
+                response = self.web3.provider.make_request('eth_getLogs', params)
+            except Exception as e:
+                if is_log_range_error(e):
+                    raise LogRangeTooLarge(str(e))
+                error = e
+            else:
+                if 'error' not in response:
+                    return response['result']
+                if is_log_range_error(response['error'].get('message')):
+                    raise LogRangeTooLarge(response['error'].get('message'))
+                error = ValueError(f"eth_getLogs failed: {response['error']}")
+            self.errors += 1
+            if attempt + 1 < self.retries:
+                time.sleep(0.5 * 2 ** attempt)
+        raise error
+
+    def _resize(self, blocks, log_count):
+        # From the returned chunk's own density, not the current span: chunks
+        # still in flight were sized before this answer, and must not compound
+        span = blocks * self.target_logs // max(1, log_count)
+        self.span = max(1, min(self.max_span, blocks * 2, max(blocks // 2, span)))
+
+    def chunks(self, from_block, to_block):
+        """Yield ``(from, to, raw logs)`` covering the range in block order."""
+        executor = ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='audit-logs')
+        pending = deque()  # (from, to, target_logs when sized, future), in block order
+        next_block = from_block
+
+        def submit(start, end, target, front=False):
+            entry = (start, end, target, executor.submit(self.fetch, start, end))
+            pending.appendleft(entry) if front else pending.append(entry)
+
+        try:
+            while pending or next_block <= to_block:
+                while len(pending) < self.parallelism and next_block <= to_block:
+                    end = min(to_block, next_block + self.span - 1)
+                    submit(next_block, end, self.target_logs)
+                    next_block = end + 1
+
+                start, end, target, future = pending.popleft()
+                try:
+                    logs = future.result()
+                except LogRangeTooLarge:
+                    if start == end:
+                        raise
+                    # The provider caps results below our target: aim lower for the
+                    # rest of the export, once per target (chunks sized for an older
+                    # target, and their halves, are refused too)
+                    if target == self.target_logs:
+                        self.target_logs = max(1, self.target_logs // 2)
+                    self.splits += 1
+                    middle = (start + end) // 2
+                    self.span = max(1, min(self.span, middle - start + 1))
+                    # Retry as two halves, ahead of everything already queued
+                    submit(middle + 1, end, target, front=True)
+                    submit(start, middle, target, front=True)
+                    continue
+                self._resize(end - start + 1, len(logs))
+                yield start, end, logs
+        finally:
+            for _, _, _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def stats(self):
+        return {"calls": self.calls, "splits": self.splits, "errors": self.errors, "span": self.span,
+                "targetLogs": self.target_logs}
+
+
+def _csv_rows(records):
+    return ''.join(f"{b},{i},{tx},{voter},{candidate}\n" for b, i, tx, voter, candidate in records)
+
+
+def _jsonl_rows(records):
+    return ''.join(json.dumps(dict(zip(FIELDS, record)), separators=(',', ':')) + "\n" for record in records)
+
+
+def _columnar_group(start, end, records):
+    return json.dumps({
+        "fromBlock": start,
+        "toBlock": end,
+        "rows": len(records),
+        "cursor": format_cursor(records[-1]),
+        "columns": {field: [record[i] for record in records] for i, field in enumerate(FIELDS)},
+    }, separators=(',', ':')) + "\n"
+
+
+def export_votes(reader, fmt, from_block, to_block, after=None):
+    """Generator of encoded chunks of the export (see ``FORMATS``)."""
+    started = time.perf_counter()
+    rows = 0
+    if fmt == 'csv':
+        yield (','.join(FIELDS) + "\n").encode()
+    try:
+        for start, end, logs in reader.chunks(from_block, to_block):
+            records = decode_votes(logs, after)
+            if not records:
+                continue
+            rows += len(records)
+            if fmt == 'csv':
+                yield _csv_rows(records).encode()
+            elif fmt == 'jsonl':
+                yield _jsonl_rows(records).encode()
+            else:
+                yield _columnar_group(start, end, records).encode()
+    except Exception as e:
+        print(f"Audit export {range_label(from_block, to_block)} aborted after {rows} votes: {str(e)}")
+        raise
+    print(f"Audit export {range_label(from_block, to_block)}: {rows} votes in {time.perf_counter() - started:.1f}s, "
+          f"{reader.calls} eth_getLogs calls, {reader.splits} splits")
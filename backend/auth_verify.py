@@ -0,0 +1,128 @@
+"""Login signature verification.
+
+Recovers the signer of an EIP-191 ``personal_sign`` message directly on
+top of ``coincurve`` (libsecp256k1) when it is installed, skipping the
+``encode_defunct``/``Account.recover_message`` object layers; without it,
+``eth_keys``' pure-Python backend is used. Checksum conversions are cached,
+and ``recover_batch`` spreads ECDSA recovery over a process pool so kiosks
+and relays submitting many logins at once use every core.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from eth_keys import keys
+from eth_utils import keccak, to_checksum_address
+
+try:
+    import coincurve
+except ImportError:
+    coincurve = None
+
+VERIFY_WORKERS = int(os.environ.get('AUTH_VERIFY_WORKERS', os.cpu_count() or 1))
+# Below this many signatures the process-pool round-trip costs more than it saves
+BATCH_INLINE_THRESHOLD = int(os.environ.get('AUTH_BATCH_INLINE_THRESHOLD', 16))
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+LOGIN_MESSAGE = "Sign this message to authenticate: {nonce}"
+
+
+class SignatureError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=65536)
+def checksum_address(address):
+    """Cached ``to_checksum_address``; raises ValueError for invalid input."""
+    return to_checksum_address(address)
+
+
+def login_message(nonce):
+    return LOGIN_MESSAGE.format(nonce=nonce)
+
+
+def personal_message_hash(text):
+    """EIP-191 version 0x45 hash, as signed by ``personal_sign``."""
+    message = text.encode('utf-8')
+    return keccak(b"\x19Ethereum Signed Message:\n" + str(len(message)).encode() + message)
+
+
+def _parse_signature(signature):
+    if isinstance(signature, str):
+        signature = signature[2:] if signature.startswith(('0x', '0X')) else signature
+        try:
+            signature = bytes.fromhex(signature)
+        except ValueError:
+            raise SignatureError("Signature is not valid hex")
+    if len(signature) != 65:
+        raise SignatureError("Signature must be 65 bytes")
+    v = signature[64]
+    if v >= 27:
+        v -= 27
+    if v not in (0, 1):
+        raise SignatureError("Invalid signature recovery id")
+    r = int.from_bytes(signature[:32], 'big')
+    s = int.from_bytes(signature[32:64], 'big')
+    if not (0 < r < SECP256K1_N and 0 < s < SECP256K1_N):
+        raise SignatureError("Signature values out of range")
+    return signature[:64], v, r, s
+
+
+def recover_address(text, signature):
+    """Checksummed address that produced ``signature`` over ``text``."""
+    msg_hash = personal_message_hash(text)
+    rs, v, r, s = _parse_signature(signature)
+
+    if coincurve is not None:
+        try:
+            public_key = coincurve.PublicKey.from_signature_and_message(rs + bytes([v]), msg_hash, hasher=None)
+        except Exception as e:
+            raise SignatureError(f"Could not recover public key: {str(e)}")
+        return checksum_address('0x' + keccak(public_key.format(compressed=False)[1:])[-20:].hex())
+
+    try:
+        public_key = keys.Signature(vrs=(v, r, s)).recover_public_key_from_msg_hash(msg_hash)
+    except Exception as e:
+        raise SignatureError(f"Could not recover public key: {str(e)}")
+    return public_key.to_checksum_address()
+
+
+def _recover_or_error(item):
+    text, signature = item
+    try:
+        return recover_address(text, signature), None
+    except Exception as e:
+        return None, str(e)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                # Not fork: the worker already runs threads (indexer, tracker,
+                # executors) whose locks a forked child would inherit held
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                _pool = ProcessPoolExecutor(max_workers=VERIFY_WORKERS, mp_context=multiprocessing.get_context(method))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def recover_batch(items):
+    """Recover signers for many ``(text, signature)`` pairs.
+
+    Returns ``(address, error)`` tuples in input order. Large batches are
+    split across the process pool.
+    """
+    items = list(items)
+    if len(items) < BATCH_INLINE_THRESHOLD or VERIFY_WORKERS <= 1:
+        return [_recover_or_error(item) for item in items]
+    chunksize = max(1, len(items) // (VERIFY_WORKERS * 4))
+    return list(_get_pool().map(_recover_or_error, items, chunksize=chunksize))
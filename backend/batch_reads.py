@@ -0,0 +1,272 @@
+import asyncio
+import os
+import itertools
+
+import requests
+from eth_utils import to_bytes, to_checksum_address
+
+# Max number of calls packed into one JSON-RPC batch / multicall
+BATCH_SIZE = int(os.environ.get('RPC_BATCH_SIZE', 100))
+
+# Optional Multicall3 deployment (0xcA11bde05977b3631167028862bE2a173976CA11 on
+# Sepolia and most public chains). When set, a whole chunk of view calls is
+# folded into a single eth_call instead of a JSON-RPC batch.
+MULTICALL_ADDRESS = os.environ.get('MULTICALL_ADDRESS')
+
+# aggregate3((address,bool,bytes)[]) -> (bool,bytes)[]
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')
+
+_session = requests.Session()
+_ids = itertools.count(1)
+
+
+class BatchReadError(Exception):
+    pass
+
+
+def _output_types(contract, fn_name):
+    fn_abi = next(item for item in contract.abi
+                  if item.get('type') == 'function' and item.get('name') == fn_name)
+    return [o['type'] for o in fn_abi['outputs']]
+
+
+def _endpoint(web3):
+    return getattr(web3.provider, 'endpoint_uri', None)
+
+
+def _post_batch(web3, payload, session=None):
+    """POST a JSON-RPC batch and return the responses ordered like ``payload``."""
+    if session is None and hasattr(web3.provider, 'make_batch_request'):
+        # Pooled multi-endpoint provider: reuse its connections and failover
+        body = web3.provider.make_batch_request(payload)
+    else:
+        endpoint = _endpoint(web3)
+        if not endpoint:
+            raise BatchReadError("Provider does not expose an HTTP endpoint")
+
+        response = (session or _session).post(endpoint, json=payload, timeout=30)
+        response.raise_for_status()
+        body = response.json()
+    if not isinstance(body, list):
+        # Some providers answer a rejected batch with a single error object
+        raise BatchReadError(f"Batch request rejected: {body}")
+
+    by_id = {item.get('id'): item for item in body}
+    return [by_id.get(req['id']) for req in payload]
+
+
+def rpc_batch(web3, calls, session=None):
+    """Send ``(method, params)`` pairs as one JSON-RPC batch.
+
+    Returns the raw response objects in order (``None`` for missing ones);
+    callers check each for ``result``/``error``.
+    """
+    payload = [{
+        "jsonrpc": "2.0",
+        "id": next(_ids),
+        "method": method,
+        "params": params,
+    } for method, params in calls]
+    return _post_batch(web3, payload, session=session)
+
+
+def _eth_call_batch(web3, to, calldatas, session=None, block='latest'):
+    """Run ``eth_call`` for every calldata in one round-trip.
+
+    Returns a list of raw return bytes, ``None`` for calls that failed.
+    """
+    if isinstance(block, int):
+        block = hex(block)
+    responses = rpc_batch(web3, [("eth_call", [{"to": to, "data": data}, block]) for data in calldatas],
+                          session=session)
+    return _call_results(responses)
+
+
+def _call_results(responses):
+    results = []
+    for item in responses:
+        if not item or 'error' in item or item.get('result') is None:
+            results.append(None)
+        else:
+            results.append(bytes(to_bytes(hexstr=item['result'])))
+    return results
+
+
+def _aggregate3_call(to, calldatas):
+    target = to_checksum_address(to)
+    calls = [(target, True, to_bytes(hexstr=data)) for data in calldatas]
+    from eth_abi import encode  # loaded with web3 anyway; kept off backend.app's import path
+    data = AGGREGATE3_SELECTOR + encode(['(address,bool,bytes)[]'], [calls])
+    return {"to": to_checksum_address(MULTICALL_ADDRESS), "data": data}
+
+
+def _aggregate3_results(raw):
+    from eth_abi import decode
+    (returned,) = decode(['(bool,bytes)[]'], bytes(raw))
+    return [bytes(ret) if ok else None for ok, ret in returned]
+
+
+def _multicall(web3, to, calldatas, block='latest'):
+    """Fold every calldata into a single Multicall3 ``aggregate3`` eth_call."""
+    return _aggregate3_results(web3.eth.call(_aggregate3_call(to, calldatas), block))
+
+
+def _sequential(web3, to, calldatas, block='latest'):
+    results = []
+    for data in calldatas:
+        try:
+            results.append(bytes(web3.eth.call({"to": to, "data": data}, block)))
+        except Exception as e:
+            print(f"Error in eth_call: {str(e)}")
+            results.append(None)
+    return results
+
+
+def call_many(web3, contract, calls, session=None, block='latest'):
+    """Run many view calls against ``contract`` using as few round-trips as possible.
+
+    ``calls`` is a list of ``(fn_name, args)`` tuples. Returns the decoded
+    outputs in the same order (a tuple per call, ``None`` if the call failed).
+    Uses Multicall3 when ``MULTICALL_ADDRESS`` is set, a JSON-RPC batch
+    otherwise, and falls back to one request per call if the provider
+    rejects batches. ``block`` pins every call to the same block.
+    """
+    to = contract.address
+    decoded = []
+
+    for start in range(0, len(calls), BATCH_SIZE):
+        chunk = calls[start:start + BATCH_SIZE]
+        calldatas = [contract.encodeABI(fn_name=name, args=list(args)) for name, args in chunk]
+
+        try:
+            if MULTICALL_ADDRESS:
+                raw = _multicall(web3, to, calldatas, block=block)
+            else:
+                raw = _eth_call_batch(web3, to, calldatas, session=session, block=block)
+        except Exception as e:
+            print(f"Batched read failed, falling back to sequential calls: {str(e)}")
+            raw = _sequential(web3, to, calldatas, block=block)
+
+        decoded.extend(_decode_outputs(contract, chunk, raw))
+
+    return decoded
+
+
+def _decode_outputs(contract, chunk, raw):
+    from eth_abi import decode
+    decoded = []
+    for (name, _), data in zip(chunk, raw):
+        if data is None:
+            decoded.append(None)
+            continue
+        try:
+            decoded.append(tuple(decode(_output_types(contract, name), data)))
+        except Exception as e:
+            print(f"Error decoding {name}: {str(e)}")
+            decoded.append(None)
+    return decoded
+
+
+def read_candidates(web3, contract, session=None, block='latest'):
+    """Read the whole candidate table plus ``votingOpen``.
+
+    Costs two round-trips for up to ``BATCH_SIZE`` candidates: one for
+    ``candidatesCount``/``votingOpen`` and one for every ``candidates(i)``.
+    Returns ``(candidates, voting_open)``; candidates that fail to load are
+    skipped.
+    """
+    header = call_many(web3, contract, [('candidatesCount', ()), ('votingOpen', ())], session=session, block=block)
+    if header[0] is None or header[1] is None:
+        raise BatchReadError("Failed to read candidatesCount/votingOpen")
+
+    candidates_count = header[0][0]
+    voting_open = header[1][0]
+
+    rows = call_many(web3, contract,
+                     [('candidates', (i,)) for i in range(1, candidates_count + 1)],
+                     session=session, block=block)
+    return _candidate_rows(rows), voting_open
+
+
+def _candidate_rows(rows):
+    candidates = []
+    for i, row in enumerate(rows, start=1):
+        if row is None:
+            print(f"Error getting candidate {i}")
+            continue
+        candidates.append({
+            'id': row[0],
+            'name': row[1],
+            'voteCount': row[2]
+        })
+    return candidates
+
+
+# -- AsyncWeb3 ---------------------------------------------------------------
+
+async def _eth_call_batch_async(web3, to, calldatas, block):
+    if isinstance(block, int):
+        block = hex(block)
+    payload = [{
+        "jsonrpc": "2.0",
+        "id": next(_ids),
+        "method": "eth_call",
+        "params": [{"to": to, "data": data}, block],
+    } for data in calldatas]
+    body = await web3.provider.make_batch_request(payload)
+    if not isinstance(body, list):
+        raise BatchReadError(f"Batch request rejected: {body}")
+    by_id = {item.get('id'): item for item in body}
+    return _call_results([by_id.get(req['id']) for req in payload])
+
+
+async def _sequential_async(web3, to, calldatas, block):
+    async def one(data):
+        try:
+            return bytes(await web3.eth.call({"to": to, "data": data}, block))
+        except Exception as e:
+            print(f"Error in eth_call: {str(e)}")
+            return None
+    return list(await asyncio.gather(*(one(data) for data in calldatas)))
+
+
+async def call_many_async(web3, contract, calls, block='latest'):
+    """``call_many`` for ``AsyncWeb3``.
+
+    Batches through ``web3.provider.make_batch_request`` when the provider
+    has it (see ``rpc_provider.AsyncMultiEndpointProvider``); otherwise the
+    calls are issued concurrently.
+    """
+    to = contract.address
+    decoded = []
+
+    for start in range(0, len(calls), BATCH_SIZE):
+        chunk = calls[start:start + BATCH_SIZE]
+        calldatas = [contract.encodeABI(fn_name=name, args=list(args)) for name, args in chunk]
+
+        try:
+            if MULTICALL_ADDRESS:
+                raw = _aggregate3_results(await web3.eth.call(_aggregate3_call(to, calldatas), block))
+            elif hasattr(web3.provider, 'make_batch_request'):
+                raw = await _eth_call_batch_async(web3, to, calldatas, block)
+            else:
+                raw = await _sequential_async(web3, to, calldatas, block)
+        except Exception as e:
+            print(f"Batched read failed, falling back to concurrent calls: {str(e)}")
+            raw = await _sequential_async(web3, to, calldatas, block)
+
+        decoded.extend(_decode_outputs(contract, chunk, raw))
+
+    return decoded
+
+
+async def read_candidates_async(web3, contract, block='latest'):
+    """``read_candidates`` for ``AsyncWeb3``."""
+    header = await call_many_async(web3, contract, [('candidatesCount', ()), ('votingOpen', ())], block=block)
+    if header[0] is None or header[1] is None:
+        raise BatchReadError("Failed to read candidatesCount/votingOpen")
+
+    rows = await call_many_async(web3, contract,
+                                 [('candidates', (i,)) for i in range(1, header[0][0] + 1)],
+                                 block=block)
+    return _candidate_rows(rows), header[1][0]
@@ -0,0 +1,335 @@
+"""Bulk voter registration jobs.
+
+An upload (CSV or JSONL) is parsed as a stream, validated and checksummed
+in chunks, and stored as a job before anything is sent to the chain. A
+background worker (one elected gunicorn worker) then walks the job chunk
+by chunk, drops voters that are already registered or have already voted,
+and pushes ``registerVoter`` calls through the transaction pipeline with
+sequential nonces, without waiting for receipts in between.
+
+Job items live in the same SQLite database as the pipeline's
+``transactions`` table, so progress is a join and a restarted worker
+resumes where it stopped: each item records its tx id *before* it is
+submitted, and ``TxPipeline.submit(tx_id=...)`` is idempotent, so no voter
+is ever registered twice.
+"""
+import csv
+import io
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from eth_utils import to_checksum_address
+
+from backend import tx_pipeline
+from backend.batch_reads import call_many
+from backend.storage import acquire_process_lock, get_connection
+
+CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 200))
+# Cap on registerVoter transactions waiting for a receipt at any time
+MAX_IN_FLIGHT = int(os.environ.get('BULK_MAX_IN_FLIGHT', 64))
+WORKER_INTERVAL = float(os.environ.get('BULK_WORKER_INTERVAL', 2))
+PARSE_BATCH = 5000
+
+ADDRESS_RE = re.compile(r'^0x[0-9a-fA-F]{40}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    invalid INTEGER NOT NULL DEFAULT 0,
+    duplicates INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bulk_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    chunk INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tx_id TEXT,
+    reason TEXT,
+    PRIMARY KEY (job_id, address)
+);
+CREATE INDEX IF NOT EXISTS bulk_items_queue ON bulk_items (job_id, status, seq);
+CREATE INDEX IF NOT EXISTS bulk_items_address ON bulk_items (address);
+"""
+
+
+class BulkRegistrationError(Exception):
+    pass
+
+
+def _conn():
+    conn = get_connection(tx_pipeline.TX_DB_PATH)
+    if not getattr(_conn, 'ready', False):
+        conn.executescript(tx_pipeline.SCHEMA)
+        conn.executescript(SCHEMA)
+        _conn.ready = True
+    return conn
+
+
+# -- parsing ---------------------------------------------------------------
+
+def _iter_csv(text):
+    reader = csv.reader(text)
+    column = 0
+    for i, row in enumerate(reader):
+        if not row:
+            continue
+        if i == 0:
+            header = [c.strip().lower() for c in row]
+            for name in ('walletaddress', 'address', 'wallet'):
+                if name in header:
+                    column = header.index(name)
+                    break
+            if not ADDRESS_RE.match(row[column].strip()):
+                continue  # header row
+        if column < len(row):
+            yield row[column].strip()
+
+
+def _iter_jsonl(text):
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            yield line
+            continue
+        if isinstance(value, dict):
+            value = value.get('walletAddress') or value.get('address') or ''
+        yield str(value).strip()
+
+
+def iter_addresses(stream, fmt):
+    """Yield raw address strings from a binary upload stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='')
+    if fmt == 'csv':
+        return _iter_csv(text)
+    if fmt == 'jsonl':
+        return _iter_jsonl(text)
+    raise BulkRegistrationError(f"Unsupported format: {fmt}")
+
+
+def detect_format(content_type, filename=None):
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'jsonl'
+    if name.endswith('.csv') or 'csv' in content_type or 'text/plain' in content_type:
+        return 'csv'
+    raise BulkRegistrationError("Upload a .csv or .jsonl file (or send text/csv / application/x-ndjson)")
+
+
+def normalize_batch(raw_addresses, seen):
+    """Validate and checksum one batch of addresses.
+
+    The cheap checks (regex, lower-case dedupe against everything seen so
+    far in the upload) run over the whole batch first so the keccak-based
+    checksum is only computed for addresses that survive them. Returns
+    ``(checksummed, invalid_count, duplicate_count)``.
+    """
+    candidates = [a for a in raw_addresses if ADDRESS_RE.match(a)]
+    invalid = len(raw_addresses) - len(candidates)
+
+    fresh = []
+    for address in candidates:
+        key = address.lower()
+        if key not in seen:
+            seen.add(key)
+            fresh.append(key)
+    duplicates = len(candidates) - len(fresh)
+
+    return [to_checksum_address(a) for a in fresh], invalid, duplicates
+
+
+# -- jobs --------------------------------------------------------------------
+
+def create_job(stream, fmt):
+    """Ingest an upload into a new job; returns the job summary."""
+    conn = _conn()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn.execute("INSERT INTO bulk_jobs (id, status, created_at, updated_at) VALUES (?, 'ingesting', ?, ?)",
+                 (job_id, now, now))
+
+    seen = set()
+    seq = total = invalid = duplicates = 0
+    batch = []
+
+    def flush():
+        nonlocal seq, total, invalid, duplicates
+        addresses, bad, dupes = normalize_batch(batch, seen)
+        invalid += bad
+        duplicates += dupes
+        rows = []
+        for address in addresses:
+            rows.append((job_id, seq, seq // CHUNK_SIZE, address))
+            seq += 1
+        total += len(rows)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR IGNORE INTO bulk_items (job_id, seq, chunk, address, status) VALUES (?, ?, ?, ?, 'queued')",
+            rows)
+        # Local index: anything already registered (or in flight) by an earlier job
+        conn.execute(
+            "UPDATE bulk_items SET status = 'skipped', reason = 'already registered' "
+            "WHERE job_id = ? AND status = 'queued' AND seq >= ? AND EXISTS ("
+            "  SELECT 1 FROM bulk_items i JOIN transactions t ON t.id = i.tx_id "
+            "  WHERE i.address = bulk_items.address AND i.job_id != ? "
+            "  AND t.status IN ('signed', 'pending', 'confirmed'))",
+            (job_id, seq - len(rows), job_id))
+        conn.execute("COMMIT")
+        batch.clear()
+
+    for address in iter_addresses(stream, fmt):
+        batch.append(address)
+        if len(batch) >= PARSE_BATCH:
+            flush()
+    flush()
+
+    conn.execute(
+        "UPDATE bulk_jobs SET status = 'running', total = ?, invalid = ?, duplicates = ?, updated_at = ? "
+        "WHERE id = ?", (total, invalid, duplicates, time.time(), job_id))
+    return get_job(job_id)
+
+
+def get_job(job_id, with_chunks=False):
+    conn = _conn()
+    row = conn.execute(
+        "SELECT id, status, total, invalid, duplicates, created_at, updated_at FROM bulk_jobs WHERE id = ?",
+        (job_id,)).fetchone()
+    if row is None:
+        return None
+
+    # Item status, refined by the transaction outcome once submitted
+    counts = conn.execute(
+        "SELECT i.chunk, CASE WHEN i.status = 'submitted' THEN COALESCE(t.status, 'submitted') "
+        "ELSE i.status END AS s, COUNT(*) "
+        "FROM bulk_items i LEFT JOIN transactions t ON t.id = i.tx_id "
+        "WHERE i.job_id = ? GROUP BY i.chunk, s ORDER BY i.chunk", (job_id,)).fetchall()
+
+    totals = {}
+    chunks = {}
+    for chunk, status, count in counts:
+        totals[status] = totals.get(status, 0) + count
+        chunks.setdefault(chunk, {"chunk": chunk})[status] = count
+
+    status = row[1]
+    if status == 'submitted' and not any(totals.get(s) for s in ('queued', 'submitting', 'submitted',
+                                                                   'signed', 'pending')):
+        status = 'completed'
+
+    job = {
+        "jobId": row[0],
+        "status": status,
+        "total": row[2],
+        "invalid": row[3],
+        "duplicates": row[4],
+        "createdAt": row[5],
+        "updatedAt": row[6],
+        "progress": totals,
+    }
+    if with_chunks:
+        job["chunks"] = list(chunks.values())
+    return job
+
+
+# -- worker ------------------------------------------------------------------
+
+def _in_flight(conn):
+    return conn.execute(
+        "SELECT COUNT(*) FROM transactions WHERE fn_name = 'registerVoter' AND status IN ('signed', 'pending')"
+    ).fetchone()[0]
+
+
+def _resume_chunk(pipeline, conn, job_id, chunk):
+    """Make sure every item of ``chunk`` that recorded a tx id was submitted."""
+    for address, tx_id in conn.execute(
+            "SELECT address, tx_id FROM bulk_items WHERE job_id = ? AND chunk = ? AND status = 'submitting'",
+            (job_id, chunk)).fetchall():
+        pipeline.submit('registerVoter', address, tx_id=tx_id)
+        conn.execute("UPDATE bulk_items SET status = 'submitted' WHERE job_id = ? AND address = ?",
+                     (job_id, address))
+
+
+def process_chunk(pipeline, job_id, chunk):
+    conn = _conn()
+    _resume_chunk(pipeline, conn, job_id, chunk)
+
+    queued = [r[0] for r in conn.execute(
+        "SELECT address FROM bulk_items WHERE job_id = ? AND chunk = ? AND status = 'queued' ORDER BY seq",
+        (job_id, chunk)).fetchall()]
+    if not queued:
+        return
+
+    # registerVoter reverts for voters who already voted; check them all in one batched read
+    voters = call_many(pipeline.web3, pipeline.contract, [('voters', (a,)) for a in queued])
+    for address, voter in zip(queued, voters):
+        if voter is not None and voter[0]:
+            conn.execute("UPDATE bulk_items SET status = 'skipped', reason = 'already voted' "
+                         "WHERE job_id = ? AND address = ?", (job_id, address))
+            continue
+
+        while _in_flight(conn) >= MAX_IN_FLIGHT:
+            time.sleep(WORKER_INTERVAL)
+
+        # Record the tx id first so a crash can never lead to a second submission
+        tx_id = uuid.uuid4().hex
+        conn.execute("UPDATE bulk_items SET status = 'submitting', tx_id = ? WHERE job_id = ? AND address = ?",
+                     (tx_id, job_id, address))
+        pipeline.submit('registerVoter', address, tx_id=tx_id)
+        conn.execute("UPDATE bulk_items SET status = 'submitted' WHERE job_id = ? AND address = ?",
+                     (job_id, address))
+
+    conn.execute("UPDATE bulk_jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+
+def run_pending_jobs(pipeline):
+    conn = _conn()
+    for (job_id,) in conn.execute("SELECT id FROM bulk_jobs WHERE status = 'running' ORDER BY created_at").fetchall():
+        chunks = [r[0] for r in conn.execute(
+            "SELECT DISTINCT chunk FROM bulk_items WHERE job_id = ? AND status IN ('queued', 'submitting') "
+            "ORDER BY chunk", (job_id,)).fetchall()]
+        for chunk in chunks:
+            process_chunk(pipeline, job_id, chunk)
+            print(f"Bulk job {job_id}: chunk {chunk} submitted")
+        conn.execute("UPDATE bulk_jobs SET status = 'submitted', updated_at = ? WHERE id = ?",
+                     (time.time(), job_id))
+
+
+def _work_when_elected(pipeline):
+    while not acquire_process_lock(tx_pipeline.TX_DB_PATH + '.bulk.lock'):
+        time.sleep(WORKER_INTERVAL * 5)
+    print(f"Bulk registration worker started in process {os.getpid()}")
+    while True:
+        try:
+            run_pending_jobs(pipeline)
+        except Exception as e:
+            print(f"Bulk registration worker failed: {str(e)}")
+        time.sleep(WORKER_INTERVAL)
+
+
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def ensure_worker_started(web3, contract):
+    """Start the job worker once per process; it resumes unfinished jobs."""
+    global _worker_pid
+    if not contract or not os.getenv('PRIVATE_KEY') or _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    threading.Thread(target=_work_when_elected, args=(tx_pipeline.get_pipeline(web3, contract),),
+                     name='bulk-register', daemon=True).start()
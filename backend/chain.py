@@ -0,0 +1,161 @@
+"""Chain clients, created on first use.
+
+Importing web3 and eth_account takes about a second, and building the
+provider or contract from a broken env var used to fail the import of
+``backend.app`` itself. The provider, contract and signer are now created
+(and their packages imported) the first time something needs them, once per
+process, under a lock:
+
+* ``get_web3()`` - ``Web3`` on the ``RPC_URLS`` (or Infura) endpoints;
+* ``get_contract()`` - ``Voting`` at ``CONTRACT_ADDRESS``, with the ABI read
+  from the Hardhat artifact (``CONTRACT_ARTIFACT``); None if it can't be
+  built, with the reason in ``status()``;
+* ``get_signer()`` - the ``PRIVATE_KEY`` account, or None;
+* ``get_async_web3()`` / ``get_async_contract()`` - the same for
+  ``backend.async_app``, sharing the sync provider's endpoints.
+
+``web3``, ``contract``, ``async_web3`` and ``async_contract`` are proxies for
+these, so module-level code can hold on to them before anything is built.
+With ``--preload`` nothing is created in the gunicorn master; ``warm_up()``
+builds everything in each worker after the fork.
+"""
+import json
+import os
+import threading
+
+from werkzeug.local import LocalProxy
+
+DEFAULT_CONTRACT_ADDRESS = "0x8912ED01D24cba70A535598Af18C38C48e44c585"
+DEFAULT_CONTRACT_ARTIFACT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'artifacts', 'contracts', 'Voting.sol', 'Voting.json')
+
+_lock = threading.RLock()
+_web3 = None
+_contract = None
+_contract_error = None
+_contract_loaded = False
+_signer = None
+_signer_loaded = False
+_async_web3 = None
+_async_contract = None
+_artifact = None
+
+
+def rpc_urls():
+    """``RPC_URLS`` (comma-separated, for failover/hedging), else Infura."""
+    infura_url = f"https://sepolia.infura.io/v3/{os.environ.get('INFURA_PROJECT_ID')}"
+    return os.environ.get('RPC_URLS') or infura_url
+
+
+def contract_address():
+    from eth_utils import to_checksum_address
+    return to_checksum_address(os.environ.get('CONTRACT_ADDRESS', DEFAULT_CONTRACT_ADDRESS))
+
+
+def _read_artifact():
+    global _artifact
+    if _artifact is None:
+        with open(os.environ.get('CONTRACT_ARTIFACT') or DEFAULT_CONTRACT_ARTIFACT) as f:
+            _artifact = json.load(f)
+    return _artifact
+
+
+def contract_abi():
+    """The ``Voting`` ABI from the Hardhat artifact, read once."""
+    return _read_artifact()['abi']
+
+
+def deployed_bytecode():
+    """Runtime code of ``Voting`` as built, to recognise its deployments."""
+    return bytes.fromhex(_read_artifact()['deployedBytecode'][2:])
+
+
+def get_web3():
+    global _web3
+    if _web3 is None:
+        with _lock:
+            if _web3 is None:
+                from web3 import Web3
+                from backend.rpc_provider import build_provider
+                _web3 = Web3(build_provider(rpc_urls()))
+    return _web3
+
+
+def get_contract():
+    global _contract, _contract_error, _contract_loaded
+    if not _contract_loaded:
+        with _lock:
+            if not _contract_loaded:
+                try:
+                    address = contract_address()
+                    _contract = get_web3().eth.contract(address=address, abi=contract_abi())
+                    print(f"Contract loaded successfully at {address}")
+                except Exception as e:
+                    print(f"Error loading contract: {e}")
+                    _contract_error = str(e)
+                _contract_loaded = True
+    return _contract
+
+
+def get_signer():
+    """``eth_account`` account for ``PRIVATE_KEY`` (None when unset)."""
+    global _signer, _signer_loaded
+    if not _signer_loaded:
+        with _lock:
+            if not _signer_loaded:
+                private_key = os.getenv('PRIVATE_KEY')
+                if private_key:
+                    from eth_account import Account
+                    _signer = Account.from_key(private_key)
+                _signer_loaded = True
+    return _signer
+
+
+def get_async_web3():
+    global _async_web3
+    if _async_web3 is None:
+        with _lock:
+            if _async_web3 is None:
+                from web3 import AsyncWeb3
+                from backend.rpc_provider import AsyncMultiEndpointProvider
+                _async_web3 = AsyncWeb3(AsyncMultiEndpointProvider.from_sync(get_web3().provider))
+    return _async_web3
+
+
+def get_async_contract():
+    global _async_contract
+    if _async_contract is None:
+        with _lock:
+            if _async_contract is None:
+                sync_contract = get_contract()
+                if sync_contract is None:
+                    return None
+                _async_contract = get_async_web3().eth.contract(address=sync_contract.address,
+                                                                abi=contract_abi())
+    return _async_contract
+
+
+def warm_up():
+    """Build every client now (e.g. right after a worker forks)."""
+    get_contract()
+    try:
+        get_signer()
+    except Exception as e:
+        print(f"Error loading signer: {e}")
+
+
+def status():
+    """What has been built so far, for readiness checks."""
+    return {
+        "web3": _web3 is not None,
+        "contract": _contract is not None,
+        "contractError": _contract_error,
+        "signer": _signer is not None,
+    }
+
+
+web3 = LocalProxy(get_web3)
+contract = LocalProxy(get_contract)
+async_web3 = LocalProxy(get_async_web3)
+async_contract = LocalProxy(get_async_contract)
@@ -0,0 +1,371 @@
+"""Several Voting deployments ("elections") served by one process.
+
+Each election is a separate deployment of the same ``Voting`` contract,
+addressed as ``/elections/<id>/...``. ``default`` is the ``CONTRACT_ADDRESS``
+deployment behind the original routes (with its event index, if enabled).
+The others come from ``ELECTIONS`` (JSON ``{"id": "0x..."}``) and from
+``POST /admin/elections`` (only deployments of this build's ``Voting``
+whose admin is the API's signing account), which stores them in a SQLite table shared by
+all gunicorn workers (each worker re-reads it every
+``ELECTION_RELOAD_INTERVAL`` seconds, or at once on an unknown id).
+
+Elections share everything that does not depend on the contract:
+
+* the web3 provider (connection pool, failover, hedging) and ABI;
+* the block clock: every election's ``ViewCache`` reads the block number
+  from the default cache, so one ``eth_blockNumber`` per interval serves
+  them all;
+* the admin signer and transaction pipeline (one nonce sequence; each
+  transaction records the deployment it calls);
+* one watcher per worker that asks for every election's logs with a single
+  multi-address ``eth_getLogs`` per new block range and only invalidates
+  the elections that had events.
+
+The watcher also makes reads per election proportional to its activity
+rather than to the block rate: while the watcher is caught up (within
+``ELECTION_MAX_LAG`` blocks of the head), an election's views are read
+and cached at the last scanned block where it had events, so an idle
+election is not re-read on every new block. It is re-read at least every
+``ELECTION_REREAD_BLOCKS`` blocks, which keeps reads within the state
+window of non-archive nodes. If the watcher falls behind, reads go back
+to the head block like the default election. A range the node refuses as
+holding too many logs is retried in halves, and a head that goes back
+(a reorg) invalidates every election. Events are seen at most
+``ELECTION_WATCH_INTERVAL`` seconds late.
+
+What is per election is bounded: a view cache capped at
+``ELECTION_CACHE_BUDGET`` bytes, a results snapshot and the pending-vote
+set used by the eligibility checks.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from eth_utils import is_address, to_checksum_address
+
+from backend import chain
+from backend.batch_reads import read_candidates
+from backend.eligibility import VoteEligibility
+from backend.indexer import FINALITY_DEPTH, MAX_BLOCK_RANGE
+from backend.results_snapshot import SnapshotEngine, results_payload, voting_ended_final
+from backend.storage import db_path, get_connection
+from backend.view_cache import ViewCache
+
+ELECTIONS_DB_PATH = os.environ.get('ELECTIONS_DB_PATH') or db_path('elections.sqlite3')
+# Per-election cap on cached view results, in bytes
+ELECTION_CACHE_BUDGET = int(os.environ.get('ELECTION_CACHE_BUDGET', 256 * 1024))
+ELECTION_WATCH_INTERVAL = float(os.environ.get('ELECTION_WATCH_INTERVAL', 2))
+# Past this many blocks behind the head the watcher is not trusted to spot changes
+ELECTION_MAX_LAG = int(os.environ.get('ELECTION_MAX_LAG', 10))
+ELECTION_REREAD_BLOCKS = int(os.environ.get('ELECTION_REREAD_BLOCKS', 64))
+# How often a worker picks up elections registered by another worker
+ELECTION_RELOAD_INTERVAL = float(os.environ.get('ELECTION_RELOAD_INTERVAL', 5))
+
+DEFAULT_ELECTION = 'default'
+ELECTION_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS elections (
+    id TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def configured_elections():
+    """``ELECTIONS`` as ``{id: address}``; raises ValueError if it is malformed."""
+    value = os.environ.get('ELECTIONS')
+    if not value:
+        return {}
+    try:
+        configured = json.loads(value)
+    except ValueError as e:
+        raise ValueError(f"ELECTIONS is not valid JSON: {e}")
+    if not isinstance(configured, dict):
+        raise ValueError('ELECTIONS must be a JSON object like {"id": "0x..."}')
+    for election_id, address in configured.items():
+        if not ELECTION_ID.match(election_id) or election_id == DEFAULT_ELECTION:
+            raise ValueError(f"ELECTIONS: invalid election id {election_id!r}")
+        if not isinstance(address, str) or not is_address(address):
+            raise ValueError(f"ELECTIONS: {election_id} has an invalid contract address {address!r}")
+    return configured
+
+
+class _NoIndex:
+    """Index store stand-in: only the default election is indexed."""
+
+    def is_ready(self):
+        return False
+
+
+class Election:
+    def __init__(self, election_id, contract, view_cache, index_store=None, snapshots=None, eligibility=None):
+        self.id = election_id
+        self.contract = contract
+        self.view_cache = view_cache
+        self.index_store = index_store or _NoIndex()
+        self.snapshots = snapshots or SnapshotEngine()
+        self.eligibility = eligibility or VoteEligibility(view_cache, self.index_store)
+        self.events = 0
+        # Block the views are read at while the watcher is caught up
+        self.read_block = None
+
+    @property
+    def address(self):
+        return self.contract.address
+
+    def read_candidates(self):
+        """Candidate table + votingOpen, read at most once per block."""
+        return self.view_cache.get_or_load(
+            ('read_candidates',), lambda block: read_candidates(self.view_cache.web3, self.contract, block=block))
+
+    def candidates(self):
+        if self.index_store.is_ready():
+            return self.index_store.candidates()
+        return self.read_candidates()[0]
+
+    def results_snapshot(self):
+        """The /results snapshot, rebuilt only when it is stale and the data changed."""
+        snapshot = self.snapshots.current()
+        if snapshot is not None:
+            return snapshot
+
+        store = self.index_store
+        if store.is_ready():
+            candidates, voting_open = store.candidates(), store.voting_open()
+            ended_block = store.voting_ended_block()
+            final = ended_block is not None and ended_block <= store.checkpoint() - FINALITY_DEPTH
+        else:
+            candidates, voting_open = self.read_candidates()
+            final = False
+            if not voting_open and self.snapshots.should_check_final():
+                try:
+                    final = voting_ended_final(self.view_cache.web3, self.contract)
+                except Exception as e:
+                    print(f"VotingEnded lookup failed for election {self.id}: {str(e)}")
+        return self.snapshots.publish(results_payload(candidates, voting_open), final=final)
+
+    def on_change(self):
+        self.view_cache.invalidate()
+        self.snapshots.invalidate()
+
+    def stats(self):
+        return {
+            "address": self.address,
+            "events": self.events,
+            "cache": self.view_cache.stats(),
+            "resultsSnapshot": self.snapshots.stats(),
+        }
+
+
+class ElectionRegistry:
+    def __init__(self, web3, clock, path=ELECTIONS_DB_PATH, cache_budget=ELECTION_CACHE_BUDGET,
+                 configured=None):
+        self.web3 = web3
+        # Shared block clock (the default election's view cache)
+        self.clock = clock
+        self.path = path
+        self.cache_budget = cache_budget
+        self.configured = configured_elections() if configured is None else configured
+        self.default = None
+        self._elections = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._last_block = None
+        # Blocks per eth_getLogs; halved when the node says the range holds too many logs
+        self._span = MAX_BLOCK_RANGE
+        self.log_queries = 0
+        self.logs_routed = 0
+        get_connection(self.path).executescript(SCHEMA)
+
+    def set_default(self, election):
+        self.default = election
+
+    def _build(self, election_id, address):
+        contract = self.web3.eth.contract(address=to_checksum_address(address), abi=chain.contract_abi())
+        view_cache = ViewCache(self.web3, max_bytes=self.cache_budget)
+        election = Election(election_id, contract, view_cache)
+        view_cache.block_source = lambda: self.block_for(election)
+        return election
+
+    def block_for(self, election):
+        """Block ``election``'s views are read and cached at."""
+        head = self.clock.current_block()
+        scanned = self._last_block
+        if scanned is None or head - scanned > ELECTION_MAX_LAG:
+            return head
+        if election.read_block is None or scanned - election.read_block >= ELECTION_REREAD_BLOCKS:
+            election.read_block = scanned
+        return election.read_block
+
+    def reload(self):
+        """Pick up elections from ``ELECTIONS`` and the shared table."""
+        rows = get_connection(self.path).execute("SELECT id, address FROM elections").fetchall()
+        wanted = {**dict(rows), **self.configured}
+        with self._lock:
+            # Swapped in whole: readers iterate it without the lock
+            elections = dict(self._elections)
+            for election_id, address in wanted.items():
+                current = elections.get(election_id)
+                if election_id == DEFAULT_ELECTION or (current and current.address.lower() == address.lower()):
+                    continue
+                try:
+                    elections[election_id] = self._build(election_id, address)
+                except Exception as e:
+                    print(f"Error loading election {election_id} at {address}: {str(e)}")
+            self._elections = elections
+            self._loaded_at = time.time()
+
+    def _maybe_reload(self, force=False):
+        if force or time.time() - self._loaded_at >= ELECTION_RELOAD_INTERVAL:
+            self.reload()
+
+    def get(self, election_id):
+        """The election with that id, or None."""
+        if election_id == DEFAULT_ELECTION:
+            return self.default if self.default is not None and self.default.contract else None
+        election = self._elections.get(election_id)
+        if election is None:
+            # Maybe registered by another worker since the last reload
+            self._maybe_reload(force=time.time() - self._loaded_at >= 1)
+            election = self._elections.get(election_id)
+        return election
+
+    def all(self):
+        self._maybe_reload()
+        elections = [self.default] if self.default is not None and self.default.contract else []
+        return elections + sorted(self._elections.values(), key=lambda e: e.id)
+
+    def register(self, election_id, address):
+        """Add an election for the deployment at ``address``; raises ValueError."""
+        if not election_id or not ELECTION_ID.match(election_id):
+            raise ValueError("electionId must be 1-64 letters, digits, '-' or '_'")
+        if election_id == DEFAULT_ELECTION or election_id in self.configured:
+            raise ValueError(f"Election {election_id} is configured and cannot be replaced")
+        if not address or not is_address(address):
+            raise ValueError("contractAddress is not a valid address")
+        address = to_checksum_address(address)
+        # The admin key signs whatever is sent to a registered election:
+        # only accept this build's Voting contract, administered by that key
+        code = bytes(self.web3.eth.get_code(address))
+        if not code:
+            raise ValueError(f"No contract deployed at {address}")
+        if code != chain.deployed_bytecode():
+            raise ValueError(f"The contract at {address} is not a Voting deployment")
+        signer = chain.get_signer()
+        admin = self.web3.eth.contract(address=address, abi=chain.contract_abi()).functions.admin().call()
+        if signer is not None and admin.lower() != signer.address.lower():
+            raise ValueError(f"The contract at {address} is administered by {admin}, not {signer.address}")
+
+        conn = get_connection(self.path)
+        conn.execute("INSERT OR IGNORE INTO elections (id, address, created_at) VALUES (?, ?, ?)",
+                     (election_id, address, time.time()))
+        stored = conn.execute("SELECT address FROM elections WHERE id = ?", (election_id,)).fetchone()[0]
+        if stored != address:
+            raise ValueError(f"Election {election_id} already exists at {stored}")
+        self.reload()
+        print(f"Election {election_id} registered at {address}")
+        return self._elections[election_id]
+
+    # -- shared log watcher -----------------------------------------------
+
+    def _get_logs(self, elections, from_block, to_block):
+        """Logs of every election over the range, or None if the node
+        refused it as too large (the next call asks for half as many blocks)."""
+        # Imported here: rpc_provider pulls in web3, which import backend.app must not load
+        from backend.rpc_provider import is_log_range_error
+        self.log_queries += 1
+        try:
+            response = self.web3.provider.make_request('eth_getLogs', [{
+                'address': [election.address for election in elections],
+                'fromBlock': hex(from_block),
+                'toBlock': hex(to_block),
+            }])
+        except Exception as e:
+            if not is_log_range_error(e) or to_block == from_block:
+                raise
+            response = {'error': {'message': str(e)}}
+        if 'error' not in response:
+            # Grow back towards the full range once results fit again
+            self._span = min(MAX_BLOCK_RANGE, self._span * 2)
+            return response['result']
+        if is_log_range_error(response['error'].get('message')) and to_block > from_block:
+            self._span = max(1, (to_block - from_block + 1) // 2)
+            return None
+        raise ValueError(f"eth_getLogs failed: {response['error']}")
+
+    def _on_reorg(self, elections, head):
+        """The head went back: every cached view may be from orphaned blocks."""
+        print(f"Election watcher: head went back from {self._last_block} to {head}, invalidating all elections")
+        for election in elections:
+            election.read_block = None
+            election.on_change()
+        self._last_block = head
+
+    def poll_once(self):
+        """One multi-address eth_getLogs over the blocks since the last poll;
+        invalidates the elections that emitted events. Returns the logs seen."""
+        elections = self.all()
+        head = self.clock.current_block()
+        if self._last_block is None:
+            self._last_block = head
+            return 0
+        if head < self._last_block:
+            self._on_reorg(elections, head)
+            return 0
+        if head == self._last_block or not elections:
+            return 0
+
+        by_address = {election.address.lower(): election for election in elections}
+        to_block = min(head, self._last_block + self._span)
+        logs = self._get_logs(elections, self._last_block + 1, to_block)
+        while logs is None:
+            to_block = self._last_block + self._span
+            logs = self._get_logs(elections, self._last_block + 1, to_block)
+
+        changed = {}
+        for log in logs:
+            election = by_address.get(log['address'].lower())
+            if election is not None:
+                changed[election.id] = election
+                election.events += 1
+        for election in changed.values():
+            election.read_block = to_block
+            election.on_change()
+        self.logs_routed += len(logs)
+        self._last_block = to_block
+        return len(logs)
+
+    def run(self):
+        while True:
+            try:
+                self._maybe_reload()
+                # Until a second election shows up, the default one is served as before
+                if self._elections:
+                    self.poll_once()
+            except Exception as e:
+                print(f"Election watcher failed: {str(e)}")
+            time.sleep(ELECTION_WATCH_INTERVAL)
+
+    def ensure_started(self):
+        """Start the log watcher thread once per process (after gunicorn forks)."""
+        if self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        threading.Thread(target=self.run, name='election-watcher', daemon=True).start()
+
+    def stats(self):
+        return {
+            "block": self._last_block,
+            "logQueries": self.log_queries,
+            "logsRouted": self.logs_routed,
+            "cacheBudget": self.cache_budget,
+            "elections": {election.id: election.stats() for election in self.all()},
+        }
@@ -0,0 +1,187 @@
+"""Pre-flight checks for ``/vote``.
+
+A vote that the contract would reject still costs a signed transaction, a
+nonce and a wait for a failed receipt. ``VoteEligibility.check`` replays the
+contract's ``require``s against cached state before anything is signed:
+
+* ``VOTE_PENDING``     - a vote for this wallet was submitted and its
+  transaction is still in flight (at most ``VOTE_PENDING_TTL`` seconds);
+* ``INVALID_CANDIDATE`` - not an integer in ``1..candidatesCount``;
+* ``VOTING_CLOSED``    - ``votingOpen`` is false;
+* ``ALREADY_VOTED``    - ``voters(signer).hasVoted`` is true.
+
+Pending votes are keyed by wallet only: votes from different wallets all
+go through the shared signer, whose nonce pipeline orders them. An entry
+records the vote's transaction id and is dropped as soon as the receipt
+tracker has recorded an outcome for it (confirmed, failed or cancelled);
+the status is read from the pipeline's shared database, so this works
+whichever worker runs the tracker.
+
+State comes from the event index when it is caught up, otherwise from the
+per-block view cache, so a check costs at most one batched read per block.
+``vote()`` records ``msg.sender``, which is the admin account that signs
+every API vote, so ``hasVoted`` is looked up for the signer, not the
+session wallet.
+
+Cached state can be behind the chain: the view cache by a block (an
+election other than the default one by up to ``ELECTION_REREAD_BLOCKS``),
+the index by up to ``INDEXER_STALE_AFTER`` seconds. A vote accepted on it
+may still revert; the pending set covers the window between a submission
+and its block. ``votingOpen`` and ``candidatesCount`` can also go from
+blocking a vote to allowing it (``startVoting``, ``addCandidate``), so
+before a ``VOTING_CLOSED`` or out-of-range ``INVALID_CANDIDATE`` rejection
+they are read again from the chain head, bypassing both caches.
+"""
+import os
+import threading
+import time
+
+from backend import chain, tx_pipeline
+
+VOTE_PENDING_TTL = float(os.environ.get('VOTE_PENDING_TTL', 60))
+
+# code -> (HTTP status, message); messages match the contract's revert reasons
+REJECTIONS = {
+    'VOTE_PENDING': (409, "A vote from this wallet is already being processed"),
+    'INVALID_CANDIDATE': (400, "Invalid candidate ID"),
+    'VOTING_CLOSED': (409, "Voting is not open"),
+    'ALREADY_VOTED': (409, "You have already voted"),
+}
+
+
+class Ineligible(Exception):
+    def __init__(self, code):
+        self.code = code
+        self.status, self.message = REJECTIONS[code]
+        super().__init__(self.message)
+
+    def to_dict(self):
+        return {"error": self.message, "code": self.code}
+
+
+def tx_in_flight(tx_id):
+    """True while the admin pipeline has no outcome for ``tx_id`` yet."""
+    tx = tx_pipeline.get_pipeline(chain.web3, chain.contract).get(tx_id)
+    return tx is not None and tx['status'] in tx_pipeline.IN_FLIGHT
+
+
+class VoteEligibility:
+    def __init__(self, view_cache, index_store, pending_ttl=VOTE_PENDING_TTL, in_flight=tx_in_flight):
+        self.view_cache = view_cache
+        self.index_store = index_store
+        self.pending_ttl = pending_ttl
+        self.in_flight = in_flight
+        self._pending = {}  # wallet -> [deadline, tx id or None until submitted]
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = {code: 0 for code in REJECTIONS}
+
+    def _is_pending(self, wallet, now):
+        """Call with ``_lock`` held; forgets entries that expired or whose
+        transaction has an outcome."""
+        entry = self._pending.get(wallet)
+        if entry is None:
+            return False
+        deadline, tx_id = entry
+        if deadline > now and (tx_id is None or self.in_flight(tx_id)):
+            return True
+        del self._pending[wallet]
+        return False
+
+    def _state(self, contract, signer):
+        """(votingOpen, candidatesCount, signer hasVoted) from the index or the view cache."""
+        if self.index_store.is_ready():
+            store = self.index_store
+            return store.voting_open(), store.candidates_count(), store.has_voted(signer)
+        return (self.view_cache.call(contract, 'votingOpen'),
+                self.view_cache.call(contract, 'candidatesCount'),
+                self.view_cache.call(contract, 'voters', signer)[0])
+
+    @staticmethod
+    def _fresh(contract, fn_name):
+        """``fn_name()`` at the chain head, bypassing the index and the view cache."""
+        return getattr(contract.functions, fn_name)().call()
+
+    def check(self, contract, wallet, signer, candidate_id, dry_run=False):
+        """Raise ``Ineligible`` if ``vote(candidate_id)`` from ``signer`` would revert.
+
+        Returns the candidate id as an int. ``dry_run`` checks are left out
+        of the counters, since no transaction was about to be sent.
+        """
+        try:
+            return self._check(contract, wallet, signer, candidate_id)
+        except Ineligible as e:
+            if not dry_run:
+                with self._lock:
+                    self.rejected[e.code] += 1
+            raise
+        finally:
+            if not dry_run:
+                with self._lock:
+                    self.checked += 1
+
+    def _check(self, contract, wallet, signer, candidate_id):
+        with self._lock:
+            pending = self._is_pending(wallet.lower(), time.time())
+        if pending:
+            raise Ineligible('VOTE_PENDING')
+        if isinstance(candidate_id, bool):
+            raise Ineligible('INVALID_CANDIDATE')
+        try:
+            candidate_id = int(candidate_id)
+        except (TypeError, ValueError):
+            raise Ineligible('INVALID_CANDIDATE')
+
+        voting_open, candidates_count, has_voted = self._state(contract, signer)
+        # Only rejections are confirmed: accepting on stale state costs no more than before
+        if not voting_open and not self._fresh(contract, 'votingOpen'):
+            raise Ineligible('VOTING_CLOSED')
+        if candidate_id > candidates_count:
+            candidates_count = self._fresh(contract, 'candidatesCount')
+        if not 0 < candidate_id <= candidates_count:
+            raise Ineligible('INVALID_CANDIDATE')
+        if has_voted:
+            raise Ineligible('ALREADY_VOTED')
+        return candidate_id
+
+    def claim(self, wallet):
+        """Mark a vote from ``wallet`` as pending; raises ``Ineligible`` if one already is.
+
+        The check-and-set is atomic, so of two concurrent requests only one
+        gets through.
+        """
+        wallet = wallet.lower()
+        now = time.time()
+        with self._lock:
+            if self._is_pending(wallet, now):
+                self.rejected['VOTE_PENDING'] += 1
+                raise Ineligible('VOTE_PENDING')
+            if len(self._pending) > 10000:
+                self._pending = {a: e for a, e in self._pending.items() if e[0] > now}
+            self._pending[wallet] = [now + self.pending_ttl, None]
+
+    def submitted(self, wallet, tx_id):
+        """Tie ``wallet``'s pending vote to its transaction: it stops blocking
+        once the tracker records an outcome for ``tx_id``."""
+        with self._lock:
+            entry = self._pending.get(wallet.lower())
+            if entry is not None:
+                entry[1] = tx_id
+
+    def release(self, wallet):
+        """Forget a pending vote (e.g. when the submission itself failed)."""
+        with self._lock:
+            self._pending.pop(wallet.lower(), None)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            rejected = dict(self.rejected)
+            # Unexpired entries; one whose transaction has an outcome goes on its wallet's next check
+            pending = sum(1 for deadline, _ in self._pending.values() if deadline > now)
+        return {
+            "checked": self.checked,
+            "avoidedTransactions": sum(rejected.values()),
+            "rejected": rejected,
+            "pending": pending,
+        }
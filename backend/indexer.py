@@ -0,0 +1,304 @@
+"""Event-indexed local read model of the Voting contract.
+
+A background thread replays ``CandidateAdded``, ``VoteCasted``,
+``VotingStarted`` and ``VotingEnded`` logs from a checkpointed block into a
+SQLite store (WAL mode), so ``/candidates``, ``/results`` and
+``/api/check-contract`` can be served without chain calls.
+
+Only one gunicorn worker runs the indexer at a time (guarded by a file
+lock); every worker reads the same database. Blocks newer than
+``INDEXER_FINALITY_DEPTH`` are tracked by hash, and if the chain reorganises
+the events of orphaned blocks are undone before indexing resumes.
+"""
+import os
+import threading
+import time
+
+from backend.storage import acquire_process_lock, db_path, get_connection
+
+# Indexing only starts when the contract's deployment block is known
+INDEXER_START_BLOCK = os.environ.get('INDEXER_START_BLOCK')
+INDEXER_DB_PATH = os.environ.get('INDEXER_DB_PATH') or db_path('indexer.sqlite3')
+POLL_INTERVAL = float(os.environ.get('INDEXER_POLL_INTERVAL', 4))
+MAX_BLOCK_RANGE = int(os.environ.get('INDEXER_MAX_BLOCK_RANGE', 2000))
+FINALITY_DEPTH = int(os.environ.get('INDEXER_FINALITY_DEPTH', 64))
+# The store is only trusted while the indexer keeps it fresh
+STALE_AFTER = float(os.environ.get('INDEXER_STALE_AFTER', 30))
+
+EVENT_NAMES = ('CandidateAdded', 'VoteCasted', 'VotingStarted', 'VotingEnded')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT,
+    kind TEXT NOT NULL,
+    candidate_id INTEGER,
+    voter TEXT,
+    name TEXT,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY, name TEXT NOT NULL, vote_count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS voters (address TEXT PRIMARY KEY, candidate_id INTEGER NOT NULL);
+"""
+
+
+class IndexStore:
+    """Read side of the index; safe to use from any thread or worker."""
+
+    def __init__(self, path=INDEXER_DB_PATH):
+        self.path = path
+        self._schema_ready = False
+
+    @property
+    def conn(self):
+        conn = get_connection(self.path)
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def is_ready(self):
+        """True when the indexer has caught up with the chain head recently."""
+        try:
+            return (self.get_meta('caught_up') == '1'
+                    and time.time() - float(self.get_meta('updated_at', 0)) < STALE_AFTER)
+        except Exception as e:
+            print(f"Index store unavailable: {str(e)}")
+            return False
+
+    def checkpoint(self):
+        value = self.get_meta('checkpoint')
+        return int(value) if value is not None else None
+
+    def candidates(self):
+        rows = self.conn.execute("SELECT id, name, vote_count FROM candidates ORDER BY id").fetchall()
+        return [{'id': r[0], 'name': r[1], 'voteCount': r[2]} for r in rows]
+
+    def candidates_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    def voting_open(self):
+        return self.get_meta('voting_open') == '1'
+
+    def voting_ended_block(self):
+        """Block of the last VotingEnded, or None if voting was (re)started after it."""
+        row = self.conn.execute(
+            "SELECT kind, block_number FROM events WHERE kind IN ('VotingStarted', 'VotingEnded') "
+            "ORDER BY block_number DESC, log_index DESC LIMIT 1").fetchone()
+        return row[1] if row and row[0] == 'VotingEnded' else None
+
+    def has_voted(self, address):
+        row = self.conn.execute("SELECT 1 FROM voters WHERE address = ?", (address.lower(),)).fetchone()
+        return row is not None
+
+
+class EventIndexer:
+    """Write side: polls logs and keeps the store in sync with the chain."""
+
+    def __init__(self, web3, contract, start_block, store=None, on_change=None):
+        self.web3 = web3
+        self.contract = contract
+        self.start_block = int(start_block)
+        self.store = store or IndexStore()
+        # Called after new events are committed (e.g. to invalidate caches)
+        self.on_change = on_change
+        self._stop = threading.Event()
+        self._events_by_topic = {}
+        for name in EVENT_NAMES:
+            event = getattr(contract.events, name)()
+            topic = self.web3.keccak(text=self._signature(event.abi)).hex()
+            self._events_by_topic[topic.lower()] = event
+
+    @staticmethod
+    def _signature(event_abi):
+        types = ','.join(i['type'] for i in event_abi['inputs'])
+        return f"{event_abi['name']}({types})"
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _init_checkpoint(self):
+        conn = self.store.conn
+        address = self.store.get_meta('contract_address')
+        if address is not None and address != self.contract.address:
+            # Contract was redeployed: start from scratch
+            print(f"Indexer contract changed from {address} to {self.contract.address}, resetting")
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ('meta', 'blocks', 'events', 'candidates', 'voters'):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        if self.store.checkpoint() is None:
+            conn.execute("BEGIN IMMEDIATE")
+            self._set_meta(conn, 'contract_address', self.contract.address)
+            self._set_meta(conn, 'checkpoint', self.start_block - 1)
+            self._set_meta(conn, 'voting_open', 0)
+            conn.execute("COMMIT")
+
+    # -- reorg handling ---------------------------------------------------
+
+    def _find_common_ancestor(self):
+        """Return the newest stored block still on the canonical chain, or
+        ``None`` if the stored tip is still canonical."""
+        rows = self.store.conn.execute("SELECT number, hash FROM blocks ORDER BY number DESC").fetchall()
+        for i, (number, stored_hash) in enumerate(rows):
+            block = self.web3.eth.get_block(number)
+            if block['hash'].hex().lower() == stored_hash:
+                return None if i == 0 else number
+        # Nothing in the unfinalized window matches: roll the window back entirely
+        return rows[-1][0] - 1 if rows else None
+
+    def _rollback_to(self, ancestor):
+        conn = self.store.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            orphaned = conn.execute(
+                "SELECT kind, candidate_id, voter FROM events WHERE block_number > ? "
+                "ORDER BY block_number DESC, log_index DESC", (ancestor,)).fetchall()
+            for kind, candidate_id, voter in orphaned:
+                if kind == 'CandidateAdded':
+                    conn.execute("DELETE FROM candidates WHERE id = ?", (candidate_id,))
+                elif kind == 'VoteCasted':
+                    conn.execute("UPDATE candidates SET vote_count = vote_count - 1 WHERE id = ?", (candidate_id,))
+                    conn.execute("DELETE FROM voters WHERE address = ?", (voter,))
+                elif kind == 'VotingStarted':
+                    self._set_meta(conn, 'voting_open', 0)
+                elif kind == 'VotingEnded':
+                    self._set_meta(conn, 'voting_open', 1)
+            conn.execute("DELETE FROM events WHERE block_number > ?", (ancestor,))
+            conn.execute("DELETE FROM blocks WHERE number > ?", (ancestor,))
+            self._set_meta(conn, 'checkpoint', ancestor)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        print(f"Indexer rolled back {len(orphaned)} events to block {ancestor} after a reorg")
+
+    # -- indexing ---------------------------------------------------------
+
+    def _apply(self, conn, log):
+        event = self._events_by_topic.get(log['topics'][0].hex().lower())
+        if event is None:
+            return
+        decoded = event.process_log(log)
+        kind = decoded['event']
+        args = decoded['args']
+        candidate_id = args.get('candidateId')
+        voter = args['voter'].lower() if 'voter' in args else None
+
+        conn.execute(
+            "INSERT OR IGNORE INTO events (block_number, log_index, tx_hash, kind, candidate_id, voter, name) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (log['blockNumber'], log['logIndex'], log['transactionHash'].hex(), kind,
+             candidate_id, voter, args.get('name')))
+
+        if kind == 'CandidateAdded':
+            conn.execute("INSERT OR REPLACE INTO candidates (id, name, vote_count) VALUES (?, ?, 0)",
+                         (candidate_id, args['name']))
+        elif kind == 'VoteCasted':
+            conn.execute("UPDATE candidates SET vote_count = vote_count + 1 WHERE id = ?", (candidate_id,))
+            conn.execute("INSERT OR REPLACE INTO voters (address, candidate_id) VALUES (?, ?)",
+                         (voter, candidate_id))
+        elif kind == 'VotingStarted':
+            self._set_meta(conn, 'voting_open', 1)
+        elif kind == 'VotingEnded':
+            self._set_meta(conn, 'voting_open', 0)
+
+    def poll_once(self):
+        """Index up to ``MAX_BLOCK_RANGE`` new blocks; returns True once caught up."""
+        head = self.web3.eth.block_number
+
+        ancestor = self._find_common_ancestor()
+        if ancestor is not None:
+            self._rollback_to(ancestor)
+
+        checkpoint = self.store.checkpoint()
+        from_block = checkpoint + 1
+        to_block = min(head, checkpoint + MAX_BLOCK_RANGE)
+
+        if from_block <= to_block:
+            logs = self.web3.eth.get_logs({
+                'address': self.contract.address,
+                'fromBlock': from_block,
+                'toBlock': to_block,
+            })
+            tip_hash = self.web3.eth.get_block(to_block)['hash'].hex().lower()
+
+            conn = self.store.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for log in sorted(logs, key=lambda l: (l['blockNumber'], l['logIndex'])):
+                    if log.get('removed'):
+                        continue
+                    self._apply(conn, log)
+                    if log['blockNumber'] > head - FINALITY_DEPTH:
+                        conn.execute("INSERT OR REPLACE INTO blocks (number, hash) VALUES (?, ?)",
+                                     (log['blockNumber'], log['blockHash'].hex().lower()))
+                if to_block > head - FINALITY_DEPTH:
+                    conn.execute("INSERT OR REPLACE INTO blocks (number, hash) VALUES (?, ?)",
+                                 (to_block, tip_hash))
+                conn.execute("DELETE FROM blocks WHERE number <= ?", (head - FINALITY_DEPTH,))
+                self._set_meta(conn, 'checkpoint', to_block)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if logs and self.on_change is not None:
+                self.on_change()
+
+        caught_up = to_block >= head
+        conn = self.store.conn
+        conn.execute("BEGIN IMMEDIATE")
+        self._set_meta(conn, 'caught_up', 1 if caught_up else 0)
+        self._set_meta(conn, 'updated_at', time.time())
+        conn.execute("COMMIT")
+        return caught_up
+
+    def run(self):
+        self._init_checkpoint()
+        while not self._stop.is_set():
+            try:
+                caught_up = self.poll_once()
+            except Exception as e:
+                print(f"Indexer poll failed: {str(e)}")
+                caught_up = True
+            if caught_up:
+                self._stop.wait(POLL_INTERVAL)
+
+    def stop(self):
+        self._stop.set()
+
+
+_started_pid = None
+_start_lock = threading.Lock()
+_store = IndexStore()
+
+
+def get_store():
+    return _store
+
+
+def _run_when_elected(web3, contract, on_change):
+    while not acquire_process_lock(INDEXER_DB_PATH + '.lock'):
+        time.sleep(POLL_INTERVAL * 5)
+    print(f"Indexer started in process {os.getpid()} from block {INDEXER_START_BLOCK}")
+    EventIndexer(web3, contract, INDEXER_START_BLOCK, store=_store, on_change=on_change).run()
+
+
+def ensure_started(web3, contract, on_change=None):
+    """Start the indexer thread once per process (after gunicorn forks)."""
+    global _started_pid
+    if not INDEXER_START_BLOCK or not contract or _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+        threading.Thread(target=_run_when_elected, args=(web3, contract, on_change),
+                         name='event-indexer', daemon=True).start()
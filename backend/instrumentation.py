@@ -0,0 +1,309 @@
+"""Request metrics and sampled tracing.
+
+Replaces the old per-request debug prints. Every request costs two
+``perf_counter`` calls and a few bucket increments:
+
+* ``http_request_duration_seconds{method,route,status}`` - per-route latency;
+* ``http_request_rpc_seconds{route}`` / ``http_request_rpc_calls_total`` -
+  how much of that was spent waiting on the RPC provider;
+* ``rpc_request_duration_seconds{method}`` / ``rpc_errors_total{method}`` -
+  every upstream JSON-RPC call, reported by ``rpc_provider``;
+* ``votes_rejected_total{code}`` - votes refused by the eligibility
+  pre-flight instead of being sent as transactions that would revert;
+* ``rate_limited_total{route,key}`` - requests answered 429 by the rate
+  limiter, per route and bucket key (``ip`` or ``wallet``).
+
+A ``TRACE_SAMPLE_RATE`` fraction of requests (0 by default) is also logged as
+one JSON line with its RPC spans, path, arguments, headers and body, after
+``TRACE_REDACT_FIELDS`` (tokens, signatures, cookies...) are masked.
+
+Each process flushes its counters to ``DATA_DIR/metrics/<pid>.json`` every
+``METRICS_FLUSH_INTERVAL`` seconds, and ``render_metrics()`` merges the live
+workers' files into one Prometheus text exposition, so ``/metrics`` answers
+the same whichever gunicorn worker serves the scrape.
+"""
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from backend import storage
+
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+TRACE_REDACT_FIELDS = frozenset(f.strip().lower() for f in os.environ.get(
+    'TRACE_REDACT_FIELDS',
+    'authorization,cookie,set-cookie,sessiontoken,token,signature,auth_token,nonce,private_key').split(',')
+    if f.strip())
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_DIR = os.path.join(storage.DATA_DIR, 'metrics')
+
+# Upper bounds (seconds); +Inf is implied
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REDACTED = '[redacted]'
+
+# name -> (type, help, label names)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route', ('method', 'route', 'status')),
+    'http_request_rpc_seconds': ('histogram', 'Time each request spent waiting on the RPC provider', ('route',)),
+    'http_request_rpc_calls_total': ('counter', 'Upstream RPC calls made while serving requests', ('route',)),
+    'rpc_request_duration_seconds': ('histogram', 'Upstream JSON-RPC call latency by method', ('method',)),
+    'rpc_errors_total': ('counter', 'Upstream JSON-RPC calls that failed', ('method',)),
+    'traces_sampled_total': ('counter', 'Requests logged as sampled traces', ()),
+    'votes_rejected_total': ('counter', 'Votes rejected before signing (doomed transactions avoided)', ('code',)),
+    'rate_limited_total': ('counter', 'Requests refused by the rate limiter', ('route', 'key')),
+}
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        # Updates are not locked: a rare lost increment is cheaper than a lock per request
+        self.counts[bisect_left(DURATION_BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+
+class _RequestTimer:
+    __slots__ = ('start', 'rpc_seconds', 'rpc_calls', 'spans')
+
+    def __init__(self, sampled):
+        self.start = time.perf_counter()
+        self.rpc_seconds = 0.0
+        self.rpc_calls = 0
+        self.spans = [] if sampled else None
+
+
+# metric name -> {label values tuple: _Histogram or count}
+_metrics = {name: {} for name in METRICS}
+_request_durations = _metrics['http_request_duration_seconds']
+_request_rpc_seconds = _metrics['http_request_rpc_seconds']
+_request_rpc_calls = _metrics['http_request_rpc_calls_total']
+_rpc_durations = _metrics['rpc_request_duration_seconds']
+_rpc_errors = _metrics['rpc_errors_total']
+_traces_sampled = _metrics['traces_sampled_total']
+_votes_rejected = _metrics['votes_rejected_total']
+_rate_limited = _metrics['rate_limited_total']
+
+_current = ContextVar('request_timer', default=None)
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def _observe(series, key, seconds):
+    histogram = series.get(key)
+    if histogram is None:
+        histogram = series.setdefault(key, _Histogram())
+    histogram.observe(seconds)
+
+
+def _reset_after_fork():
+    # The flusher thread does not survive a fork; counters start over per worker
+    global _flusher_started
+    _flusher_started = False
+    for series in _metrics.values():
+        series.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# -- recording --------------------------------------------------------------
+
+def start_request():
+    """Start timing the current request (call from before_request/middleware)."""
+    if not _flusher_started:
+        _start_flusher()
+    _current.set(_RequestTimer(TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE))
+
+
+def finish_request(method, route, status, details=None):
+    """Record the current request. ``details()`` is only called for sampled ones."""
+    timer = _current.get()
+    if timer is None:
+        return
+    _current.set(None)
+    elapsed = time.perf_counter() - timer.start
+    _observe(_request_durations, (method, route, status), elapsed)
+    if timer.rpc_calls:
+        _observe(_request_rpc_seconds, (route,), timer.rpc_seconds)
+        _request_rpc_calls[(route,)] = _request_rpc_calls.get((route,), 0) + timer.rpc_calls
+
+    if timer.spans is not None:
+        _traces_sampled[()] = _traces_sampled.get((), 0) + 1
+        trace = {
+            "ts": time.time(),
+            "method": method,
+            "route": route,
+            "status": status,
+            "durationMs": round(elapsed * 1000, 3),
+            "rpcMs": round(timer.rpc_seconds * 1000, 3),
+            "rpcCalls": timer.rpc_calls,
+            "rpc": timer.spans,
+        }
+        if details is not None:
+            trace.update(redact(details()))
+        print(json.dumps({"trace": trace}, default=str))
+
+
+def record_rpc(method, seconds, ok=True):
+    """Called by the RPC provider for every upstream call (``method`` None for mixed batches)."""
+    method = method or 'batch'
+    _observe(_rpc_durations, (method,), seconds)
+    if not ok:
+        _rpc_errors[(method,)] = _rpc_errors.get((method,), 0) + 1
+    timer = _current.get()
+    if timer is not None:
+        timer.rpc_seconds += seconds
+        timer.rpc_calls += 1
+        if timer.spans is not None:
+            timer.spans.append({"method": method, "ms": round(seconds * 1000, 3), "ok": ok})
+
+
+def record_vote_rejected(code):
+    """A vote refused by the eligibility pre-flight instead of being sent."""
+    _votes_rejected[(code,)] = _votes_rejected.get((code,), 0) + 1
+
+
+def record_rate_limited(route, key):
+    """A request refused with 429 by the rate limiter."""
+    _rate_limited[(route, key)] = _rate_limited.get((route, key), 0) + 1
+
+
+def redact(value):
+    """Copy of ``value`` with every ``TRACE_REDACT_FIELDS`` key masked."""
+    if isinstance(value, dict):
+        return {k: (REDACTED if str(k).lower() in TRACE_REDACT_FIELDS else redact(v)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+# -- exposition -------------------------------------------------------------
+
+def snapshot():
+    """This process's series as JSON-friendly ``[name, label values, value]`` rows."""
+    rows = []
+    for name, series in _metrics.items():
+        for labels, value in list(series.items()):
+            if isinstance(value, _Histogram):
+                value = [list(value.counts), value.sum]
+            rows.append([name, list(labels), value])
+    return rows
+
+
+def _flush():
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _run_flusher():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            _flush()
+        except Exception as e:
+            print(f"Metrics flush failed: {str(e)}")
+
+
+def _start_flusher():
+    global _flusher_started
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+        threading.Thread(target=_run_flusher, name='metrics-flush', daemon=True).start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _worker_snapshots():
+    """Own live counters plus the last flush of every other live worker."""
+    snapshots = [snapshot()]
+    if not os.path.isdir(METRICS_DIR):
+        return snapshots
+    for name in os.listdir(METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            pid = int(name[:-5])
+        except ValueError:
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        if pid == os.getpid():
+            continue
+        if not _alive(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _format_labels(names, values, extra=''):
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_metrics():
+    """Prometheus text exposition (format 0.0.4) for all live workers."""
+    merged = {name: {} for name in METRICS}
+    for rows in _worker_snapshots():
+        for name, labels, value in rows:
+            if name not in merged:
+                continue
+            series = merged[name]
+            key = tuple(labels)
+            if METRICS[name][0] == 'histogram':
+                counts, total = series.get(key, ([0] * len(value[0]), 0.0))
+                series[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+            else:
+                series[key] = series.get(key, 0) + value
+
+    lines = []
+    bounds = [f'le="{b!r}"' for b in DURATION_BUCKETS] + ['le="+Inf"']
+    for name, (kind, help_text, label_names) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(merged[name].items(), key=lambda item: [str(v) for v in item[0]]):
+            if kind == 'counter':
+                lines.append(f"{name}{_format_labels(label_names, labels)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for le, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(label_names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(label_names, labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(label_names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
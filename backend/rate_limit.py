@@ -0,0 +1,248 @@
+"""Per-IP and per-wallet rate limits for the routes that write.
+
+Without limits every ``/api/nonce`` call stores a new one-hour session, and
+every ``/vote`` or ``/register-voter`` call can send a chain transaction.
+Each route gets a list of token-bucket policies (``DEFAULT_RATE_LIMITS``,
+overridable with ``RATE_LIMITS``), keyed either by client IP or by the
+wallet in the body / session. A request that finds an empty bucket gets a
+``429`` with ``Retry-After`` (whole seconds until a token is back) and
+never reaches the handler.
+
+Buckets live in ``BucketTable``: a fixed-size file (``RATE_LIMIT_SLOTS``
+slots of 24 bytes: key hash, tokens, last update) memory-mapped by every
+gunicorn worker, so all workers share the same counts. The table is
+8-way set-associative: a key can only sit in the 8 slots of its set, and a
+new key replaces the least recently updated one. Lookup is a fixed amount
+of work and memory never grows, whatever the number of distinct clients.
+Evicting a key resets its bucket to full, so a flood of many distinct keys
+can only make limits more lenient for some keys, never stricter. Each set
+is guarded by a byte-range ``fcntl`` lock (plus a thread lock, since
+``fcntl`` locks are per process) for the few microseconds of the update.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from hashlib import blake2b
+
+from backend.storage import db_path, fcntl
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+RATE_LIMIT_SLOTS = int(os.environ.get('RATE_LIMIT_SLOTS', 65536))
+RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH') or db_path('ratelimit.bin')
+# Reverse proxies in front of the app; the client IP is that many entries
+# from the end of X-Forwarded-For (0 = use the socket address)
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))
+
+# route -> {key kind: "requests/seconds"}; key kind is "ip" or "wallet"
+DEFAULT_RATE_LIMITS = {
+    '/api/nonce': {'ip': '30/60', 'wallet': '10/60'},
+    '/api/verify': {'ip': '30/60'},
+    '/api/verify-batch': {'ip': '10/60'},
+    '/vote': {'ip': '20/60', 'wallet': '5/60'},
+    '/api/vote/eligibility': {'ip': '60/60'},
+    '/register-voter': {'ip': '10/60', 'wallet': '3/600'},
+    '/admin/add_candidate': {'ip': '10/60'},
+    '/admin/start_voting': {'ip': '10/60'},
+    '/admin/end_voting': {'ip': '10/60'},
+    '/admin/register-voters/bulk': {'ip': '5/60'},
+    '/audit/votes': {'ip': '5/60'},
+    # Shared by every election: keyed by the route pattern, not the id
+    '/admin/elections': {'ip': '5/60'},
+    '/elections/<election_id>/vote': {'ip': '20/60', 'wallet': '5/60'},
+    '/elections/<election_id>/register-voter': {'ip': '10/60', 'wallet': '3/600'},
+    '/elections/<election_id>/admin/add_candidate': {'ip': '10/60'},
+    '/elections/<election_id>/admin/start_voting': {'ip': '10/60'},
+    '/elections/<election_id>/admin/end_voting': {'ip': '10/60'},
+    '/elections/<election_id>/audit/votes': {'ip': '5/60'},
+}
+
+WAYS = 8
+_SLOT = struct.Struct('<Qdd')  # key hash (0 = empty), tokens, last update (unix time)
+_SET = struct.Struct('<' + 'Qdd' * WAYS)
+_LOCK_STRIPES = 64
+
+
+class Policy:
+    __slots__ = ('name', 'key', 'limit', 'period', 'rate')
+
+    def __init__(self, route, key, spec):
+        if key not in ('ip', 'wallet'):
+            raise ValueError(f"Unknown rate limit key {key!r} for {route}")
+        try:
+            limit, period = (float(part) for part in spec.split('/'))
+        except (AttributeError, ValueError):
+            limit = period = 0
+        if limit <= 0 or period <= 0:
+            raise ValueError(f"Rate limit {key!r} for {route} must be \"requests/seconds\", got {spec!r}")
+        self.name = f"{route}:{key}"
+        self.key = key
+        self.limit = limit
+        self.period = period
+        self.rate = self.limit / self.period
+
+
+def load_policies(overrides=None):
+    """``DEFAULT_RATE_LIMITS`` with ``RATE_LIMITS`` (JSON, same shape) on top;
+    a route mapped to ``{}`` is not limited."""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    if overrides is None and os.environ.get('RATE_LIMITS'):
+        try:
+            overrides = json.loads(os.environ['RATE_LIMITS'])
+        except ValueError as e:
+            raise ValueError(f"RATE_LIMITS is not valid JSON: {e}")
+    limits.update(overrides or {})
+    for route, keys in limits.items():
+        if not isinstance(keys, dict):
+            raise ValueError(f"RATE_LIMITS: {route} must map to {{\"ip\"|\"wallet\": \"requests/seconds\"}}")
+    return {route: [Policy(route, key, spec) for key, spec in keys.items()]
+            for route, keys in limits.items() if keys}
+
+
+class RateLimited(Exception):
+    def __init__(self, policy, wait):
+        self.policy = policy
+        self.retry_after = max(1, math.ceil(wait))
+        super().__init__(f"Rate limit {policy.name} exceeded")
+
+    def to_dict(self):
+        return {"error": "Too many requests", "code": "RATE_LIMITED",
+                "policy": self.policy.key, "retryAfter": self.retry_after}
+
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
+
+
+class BucketTable:
+    """Fixed-size token-bucket table shared through a memory-mapped file."""
+
+    def __init__(self, path=RATE_LIMIT_PATH, slots=RATE_LIMIT_SLOTS):
+        self.sets = max(1, slots // WAYS)
+        self.size = self.sets * _SET.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # Only ever grow: another worker may have mapped the current size
+        if os.fstat(self._fd).st_size < self.size:
+            os.ftruncate(self._fd, self.size)
+        self._map = mmap.mmap(self._fd, self.size)
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self.evictions = 0
+
+    @staticmethod
+    def key_hash(key):
+        # Stable across processes (unlike hash()); 0 marks an empty slot
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def take(self, key, capacity, rate, cost=1.0):
+        """Take ``cost`` tokens from ``key``'s bucket; returns 0.0 if allowed,
+        else the seconds until enough tokens are back (nothing is taken)."""
+        h = self.key_hash(key)
+        index = h % self.sets
+        offset = index * _SET.size
+        with self._locks[index % _LOCK_STRIPES]:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, _SET.size, offset)
+            try:
+                row = _SET.unpack_from(self._map, offset)
+                now = time.time()
+                slot, oldest = None, math.inf
+                for way in range(WAYS):
+                    if row[3 * way] == h:
+                        slot = way
+                        tokens = min(capacity, row[3 * way + 1] + max(0.0, now - row[3 * way + 2]) * rate)
+                        break
+                    if row[3 * way + 2] < oldest:
+                        victim, oldest = way, row[3 * way + 2]
+                else:
+                    slot, tokens = victim, capacity
+                    if row[3 * victim]:
+                        self.evictions += 1
+
+                if tokens >= cost:
+                    tokens, wait = tokens - cost, 0.0
+                else:
+                    wait = (cost - tokens) / rate
+                _SLOT.pack_into(self._map, offset + slot * _SLOT.size, h, tokens, now)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, _SET.size, offset)
+        return wait
+
+    def occupancy(self):
+        """Share of slots in use (a full scan; for stats only)."""
+        used = sum(1 for i in range(self.sets * WAYS)
+                   if _SLOT.unpack_from(self._map, i * _SLOT.size)[0])
+        return used / (self.sets * WAYS)
+
+
+class RateLimiter:
+    def __init__(self, policies=None, path=RATE_LIMIT_PATH, slots=RATE_LIMIT_SLOTS,
+                 enabled=RATE_LIMIT_ENABLED):
+        self.policies = load_policies() if policies is None else policies
+        self.path = path
+        self.slots = slots
+        self.enabled = enabled
+        self._table = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = {}
+
+    @property
+    def table(self):
+        # Opened per process: thread locks must not be inherited across a fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._table = BucketTable(self.path, self.slots)
+                    self._pid = os.getpid()
+        return self._table
+
+    def limits(self, route):
+        return self.policies.get(route) if self.enabled else None
+
+    def check(self, route, ip=None, wallet=None):
+        """Take a token from each of ``route``'s buckets, IP first; raises
+        ``RateLimited`` on the first empty one. ``wallet`` may be a callable,
+        only called when the route has a wallet policy. Keys that are None
+        are not limited."""
+        policies = self.limits(route)
+        if not policies:
+            return
+        for policy in policies:
+            if policy.key == 'ip':
+                key = ip
+            else:
+                key = wallet() if callable(wallet) else wallet
+                # Checksumming costs a keccak; the lowercase form is the same wallet
+                key = key.lower()[:42] if isinstance(key, str) else None
+            if key is None:
+                continue
+            wait = self.table.take(f"{policy.name}:{key}", policy.limit, policy.rate)
+            if wait:
+                self.limited[policy.name] = self.limited.get(policy.name, 0) + 1
+                raise RateLimited(policy, wait)
+        self.allowed += 1
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "slots": self.table.sets * WAYS,
+            "tableBytes": self.table.size,
+            "occupancy": self.table.occupancy(),
+            "evictions": self.table.evictions,
+            "allowed": self.allowed,
+            "limited": dict(self.limited),
+            "policies": {policy.name: f"{policy.limit:g}/{policy.period:g}"
+                         for policies in self.policies.values() for policy in policies},
+        }
+
+
+def client_ip(remote_addr, forwarded_for=None, proxy_hops=RATE_LIMIT_PROXY_HOPS):
+    """The client address, trusting only the last ``proxy_hops`` proxies."""
+    if proxy_hops and forwarded_for:
+        hops = [part.strip() for part in forwarded_for.split(',')]
+        return hops[-proxy_hops] if len(hops) >= proxy_hops else hops[0]
+    return remote_addr
@@ -0,0 +1,200 @@
+"""Pre-encoded ``/results`` responses.
+
+The results payload only changes when a contract event lands, so it is
+materialised once per change as ready-to-send bytes: the JSON body exactly
+as ``jsonify`` would write it, plus gzip and (when the optional ``brotli``
+package is installed) brotli encodings, each with a strong ETag derived
+from the body hash. Requests are answered by picking the encoding the
+client accepts, or a 304 when its ``If-None-Match`` already names it.
+
+A snapshot is re-checked at most every ``RESULTS_REFRESH_INTERVAL`` seconds
+(or right away after ``invalidate()``). If the source is unchanged, the
+same snapshot object and ETag are kept.
+
+Once a ``VotingEnded`` event is ``FINALITY_DEPTH`` blocks deep (and voting
+was not restarted after it) the snapshot is frozen for the life of the
+process: serving final results no longer touches the chain, the index or
+the JSON encoder. Set ``RESULTS_FREEZE_ON_END=0`` if an election may be
+reopened on the same contract.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from backend.indexer import FINALITY_DEPTH, INDEXER_START_BLOCK
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESULTS_REFRESH_INTERVAL = float(os.environ.get('RESULTS_REFRESH_INTERVAL', 1))
+RESULTS_FREEZE_ON_END = os.environ.get('RESULTS_FREEZE_ON_END', '1') not in ('0', 'false')
+# Without the indexer, VotingEnded is looked up with eth_getLogs this often at most
+FREEZE_CHECK_INTERVAL = float(os.environ.get('RESULTS_FREEZE_CHECK_INTERVAL', 30))
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+
+def encode_body(payload):
+    """The bytes ``flask.jsonify(payload)`` produces with default settings."""
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':')) + "\n").encode()
+
+
+def _accepts(accept_encoding, coding):
+    """True if ``Accept-Encoding`` allows ``coding`` with a non-zero q."""
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.partition(';')
+        if name.strip() not in (coding, '*'):
+            continue
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class ResultsSnapshot:
+    __slots__ = ('body', 'digest', 'encodings', 'frozen', 'built_at')
+
+    def __init__(self, body, frozen=False):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.frozen = frozen
+        self.built_at = time.time()
+        # Preference order: brotli, gzip, identity
+        self.encodings = []
+        if len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                self.encodings.append(('br', brotli.compress(body, quality=11)))
+            self.encodings.append(('gzip', gzip.compress(body, compresslevel=9, mtime=0)))
+        self.encodings = [(coding, data) for coding, data in self.encodings if len(data) < len(body)]
+
+    def freeze(self):
+        frozen = ResultsSnapshot.__new__(ResultsSnapshot)
+        frozen.body, frozen.digest, frozen.encodings = self.body, self.digest, self.encodings
+        frozen.frozen, frozen.built_at = True, self.built_at
+        return frozen
+
+    def etag(self, coding=None):
+        return f'"{self.digest}-{coding}"' if coding else f'"{self.digest}"'
+
+    def respond(self, accept_encoding=None, if_none_match=None):
+        """``(status, body, headers)`` for a request with the given headers."""
+        coding, body = None, self.body
+        for candidate, data in self.encodings:
+            if _accepts(accept_encoding, candidate):
+                coding, body = candidate, data
+                break
+
+        etag = self.etag(coding)
+        headers = {
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "public, max-age=60" if self.frozen else "no-cache",
+        }
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            if '*' in tags or etag in tags:
+                return 304, b'', headers
+        if coding:
+            headers["Content-Encoding"] = coding
+        return 200, body, headers
+
+
+class SnapshotEngine:
+    def __init__(self, refresh_interval=RESULTS_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._final_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.refreshes = 0
+        self.served = 0
+
+    def current(self):
+        """The snapshot if it is frozen or fresh enough to serve, else None."""
+        snapshot = self._snapshot
+        if snapshot is not None and (snapshot.frozen or time.time() - self._checked_at < self.refresh_interval):
+            self.served += 1
+            return snapshot
+        return None
+
+    def publish(self, payload, final=False):
+        """Install the snapshot for ``payload``; reuses the current one if unchanged."""
+        body = encode_body(payload)
+        with self._lock:
+            self.refreshes += 1
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.body != body:
+                snapshot = ResultsSnapshot(body)
+                self.builds += 1
+            if final and RESULTS_FREEZE_ON_END and not snapshot.frozen:
+                snapshot = snapshot.freeze()
+                print(f"Results frozen after VotingEnded (etag {snapshot.etag()})")
+            self._snapshot = snapshot
+            self._checked_at = time.time()
+            self.served += 1
+            return snapshot
+
+    def should_check_final(self):
+        """Rate-limits the chain-side VotingEnded lookup."""
+        if not RESULTS_FREEZE_ON_END:
+            return False
+        now = time.time()
+        if now - self._final_checked_at < FREEZE_CHECK_INTERVAL:
+            return False
+        self._final_checked_at = now
+        return True
+
+    def invalidate(self):
+        self._checked_at = 0.0
+
+    @property
+    def frozen(self):
+        return self._snapshot is not None and self._snapshot.frozen
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "etag": snapshot.etag() if snapshot else None,
+            "frozen": self.frozen,
+            "bytes": len(snapshot.body) if snapshot else None,
+            "encodings": {coding: len(data) for coding, data in snapshot.encodings} if snapshot else {},
+            "builds": self.builds,
+            "refreshes": self.refreshes,
+            "served": self.served,
+        }
+
+
+def results_payload(candidates, voting_open):
+    return {
+        "votingOpen": voting_open,
+        "votingEnded": not voting_open,  # Derive ended from open status
+        "candidates": candidates
+    }
+
+
+def voting_ended_final(web3, contract):
+    """True if the latest voting phase event is a VotingEnded at least
+    ``FINALITY_DEPTH`` blocks deep (one eth_getLogs)."""
+    started = web3.keccak(text='VotingStarted()').hex()
+    ended = web3.keccak(text='VotingEnded()').hex()
+    head = web3.eth.block_number
+    logs = web3.eth.get_logs({
+        'address': contract.address,
+        'topics': [[started, ended]],
+        'fromBlock': int(INDEXER_START_BLOCK or 0),
+        'toBlock': head,
+    })
+    if not logs:
+        return False
+    last = max(logs, key=lambda l: (l['blockNumber'], l['logIndex']))
+    return last['topics'][0].hex().lower() == ended.lower() and last['blockNumber'] <= head - FINALITY_DEPTH
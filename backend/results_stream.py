@@ -0,0 +1,282 @@
+"""Live results over Server-Sent Events.
+
+Each process runs a single upstream poller, no matter how many clients are
+connected. It polls the chain head and pulls the contract's logs for new
+blocks; every ``VoteCasted`` becomes a ``delta`` event carrying
+``candidateId``, the new ``voteCount`` and ``blockNumber``. Other contract
+events (candidates added, voting opened/closed), reconnecting clients and a
+periodic timer get a full ``snapshot`` so clients can resync after a missed
+delta or a reorg.
+
+Events are encoded once and the same bytes are fanned out to every
+subscriber queue. A client that falls too far behind has its backlog
+replaced by a fresh snapshot instead of growing without bound.
+
+Flask clients wait on a ``queue.Queue`` in their request thread.
+``backend.async_app`` subscribes with an ``AsyncSubscription`` instead,
+which its handler awaits on the event loop, so an idle client there holds
+no thread at all.
+
+Only the poller thread reads the chain and owns the tallies; ``_lock``
+guards the subscriber set, the current snapshot and whether a poller is
+running, and is never held across an RPC.
+"""
+import asyncio
+import collections
+import json
+import os
+import queue
+import threading
+import time
+
+from backend.batch_reads import read_candidates
+
+POLL_INTERVAL = float(os.environ.get('STREAM_POLL_INTERVAL', 2))
+SNAPSHOT_INTERVAL = float(os.environ.get('STREAM_SNAPSHOT_INTERVAL', 30))
+KEEPALIVE_INTERVAL = float(os.environ.get('STREAM_KEEPALIVE_INTERVAL', 15))
+# Per-client backlog; beyond this the client is resynced with a snapshot
+CLIENT_QUEUE_SIZE = int(os.environ.get('STREAM_CLIENT_QUEUE_SIZE', 256))
+MAX_BLOCK_RANGE = 1000
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def _drain(q):
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+
+class AsyncSubscription:
+    """Subscriber queue for an event-loop client.
+
+    Filled by the poller thread with the same ``put_nowait``/``get_nowait``
+    (and ``queue.Full``) as ``queue.Queue``; ``get`` is awaited on ``loop``.
+    """
+
+    def __init__(self, loop, maxsize=None):
+        self._loop = loop
+        self._maxsize = CLIENT_QUEUE_SIZE if maxsize is None else maxsize
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    def put_nowait(self, item):
+        with self._lock:
+            if len(self._items) >= self._maxsize:
+                raise queue.Full
+            self._items.append(item)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # Loop closed: the client is gone and about to unsubscribe
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._items:
+                raise queue.Empty
+            return self._items.popleft()
+
+    async def get(self, timeout):
+        """Next frame; raises ``asyncio.TimeoutError`` after ``timeout`` seconds without one."""
+        while True:
+            self._ready.clear()
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            # Cleared before checking, so a put in between still wakes us
+            await asyncio.wait_for(self._ready.wait(), timeout)
+
+
+class ResultsBroadcaster:
+    def __init__(self, web3, contract, index_store=None, on_change=None):
+        self.web3 = web3
+        self.contract = contract
+        self.index_store = index_store
+        # Called whenever contract events are seen (e.g. to invalidate caches)
+        self.on_change = on_change
+        self.pid = os.getpid()
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._tallies = {}
+        self._last_block = None
+        self._snapshot = None
+        self._last_snapshot_at = 0.0
+        self._vote_topic = self.web3.keccak(text='VoteCasted(address,uint256)').hex().lower()
+
+    # -- subscribers --------------------------------------------------------
+
+    def subscribe(self, q=None):
+        """Register a client; returns its queue (a ``queue.Queue`` unless ``q``
+        is given), pre-loaded with the current snapshot (or sent one as soon
+        as a newly started poller reads it)."""
+        if q is None:
+            q = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._snapshot is not None:
+                q.put_nowait(self._snapshot)
+            # Decided under the lock the poller stops under, so a client
+            # joining while it winds down always gets a new one
+            start = not self._running
+            self._running = True
+        if start:
+            threading.Thread(target=self._run, name='results-stream', daemon=True).start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _publish(self, payloads):
+        """Fan ``payloads`` out; returns the clients whose backlog overflowed
+        (now emptied, waiting for a snapshot)."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        lagging = []
+        for q in subscribers:
+            for payload in payloads:
+                try:
+                    q.put_nowait(payload)
+                except queue.Full:
+                    _drain(q)
+                    lagging.append(q)
+                    break
+        return lagging
+
+    def _resync(self, snapshot, subscribers=None):
+        """Replace the current snapshot and send it to ``subscribers`` (all of them by default)."""
+        with self._lock:
+            self._snapshot = snapshot
+            if subscribers is None:
+                subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(snapshot)
+            except queue.Full:
+                _drain(q)
+                q.put_nowait(snapshot)
+
+    # -- upstream (poller thread only) ---------------------------------------
+
+    def _refresh_snapshot(self):
+        """Read a snapshot and reset the tallies to it; the RPC runs without the lock."""
+        if self.index_store is not None and self.index_store.is_ready():
+            block = self.index_store.checkpoint()
+            candidates = self.index_store.candidates()
+            voting_open = self.index_store.voting_open()
+        else:
+            # Pin the reads to one block so deltas resume exactly after it
+            block = self.web3.eth.block_number
+            candidates, voting_open = read_candidates(self.web3, self.contract, block=block)
+        self._tallies = {c['id']: c['voteCount'] for c in candidates}
+        self._last_block = block
+        self._last_snapshot_at = time.time()
+        return format_event('snapshot', {
+            "votingOpen": voting_open,
+            "votingEnded": not voting_open,
+            "candidates": candidates,
+            "blockNumber": block,
+        }, event_id=block)
+
+    def poll_once(self):
+        if self._last_block is None:
+            self._resync(self._refresh_snapshot())
+            return
+        head = self.web3.eth.block_number
+        if head <= self._last_block:
+            return
+        from_block = self._last_block + 1
+        to_block = min(head, from_block + MAX_BLOCK_RANGE - 1)
+        logs = self.web3.eth.get_logs({
+            'address': self.contract.address,
+            'fromBlock': from_block,
+            'toBlock': to_block,
+        })
+
+        deltas = []
+        resync = False
+        for log in sorted(logs, key=lambda l: (l['blockNumber'], l['logIndex'])):
+            if log.get('removed'):
+                resync = True
+            elif log['topics'][0].hex().lower() == self._vote_topic:
+                args = self.contract.events.VoteCasted().process_log(log)['args']
+                candidate_id = args['candidateId']
+                self._tallies[candidate_id] = self._tallies.get(candidate_id, 0) + 1
+                deltas.append(format_event('delta', {
+                    "candidateId": candidate_id,
+                    "voteCount": self._tallies[candidate_id],
+                    "blockNumber": log['blockNumber'],
+                }, event_id=log['blockNumber']))
+            else:
+                # CandidateAdded / VotingStarted / VotingEnded change the shape of the results
+                resync = True
+
+        self._last_block = to_block
+        if logs and self.on_change is not None:
+            self.on_change()
+        lagging = self._publish(deltas) if deltas else []
+        if resync or time.time() - self._last_snapshot_at > SNAPSHOT_INTERVAL:
+            self._resync(self._refresh_snapshot())
+        elif lagging:
+            # Slow clients resync from a snapshot that includes the deltas they lost
+            self._resync(self._refresh_snapshot(), lagging)
+
+    def _run(self):
+        print(f"Results stream poller started in process {os.getpid()}")
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Stopped under the lock subscribe() checks; a later
+                    # poller starts from a fresh snapshot
+                    self._running = False
+                    self._snapshot = None
+                    self._last_block = None
+                    break
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Results stream poll failed: {str(e)}")
+            time.sleep(POLL_INTERVAL)
+        print("Results stream poller idle, stopping")
+
+    def events(self, q):
+        """Generator of SSE frames for one client; unsubscribes on disconnect."""
+        try:
+            while True:
+                try:
+                    yield q.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield KEEPALIVE
+        finally:
+            self.unsubscribe(q)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster(web3, contract, index_store=None, on_change=None):
+    global _broadcaster
+    if _broadcaster is None or _broadcaster.pid != os.getpid():
+        with _broadcaster_lock:
+            if _broadcaster is None or _broadcaster.pid != os.getpid():
+                _broadcaster = ResultsBroadcaster(web3, contract, index_store=index_store,
+                                                  on_change=on_change)
+    return _broadcaster
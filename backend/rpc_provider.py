@@ -0,0 +1,437 @@
+"""Pooled, multi-endpoint JSON-RPC provider.
+
+A drop-in replacement for ``Web3.HTTPProvider`` that talks to every URL in
+``RPC_URLS`` through keep-alive connection pools:
+
+* per-call timeouts (``RPC_TIMEOUT``, longer for ``eth_getLogs``);
+* a health score per endpoint (recent latency and error rate); requests go
+  to the healthiest endpoint and endpoints that keep failing are benched
+  with exponential back-off;
+* automatic failover on connection errors, timeouts, HTTP 429/5xx and
+  provider rate-limit errors;
+* hedged reads: if a read-only call has not answered within the primary's
+  recent p95 latency, the same request goes to a second endpoint and the
+  first good answer wins;
+* per-endpoint latency histograms for monitoring; every logical call is
+  also reported to ``instrumentation`` (per-method and per-request timing).
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+
+from backend import instrumentation
+
+RPC_TIMEOUT = float(os.environ.get('RPC_TIMEOUT', 10))
+RPC_CONNECT_TIMEOUT = float(os.environ.get('RPC_CONNECT_TIMEOUT', 3))
+RPC_POOL_SIZE = int(os.environ.get('RPC_POOL_SIZE', 32))
+RPC_HEDGE = os.environ.get('RPC_HEDGE', '1') not in ('0', 'false')
+# Never hedge sooner than this, even if the endpoint is usually faster
+RPC_HEDGE_MIN_DELAY = float(os.environ.get('RPC_HEDGE_MIN_DELAY', 0.05))
+FAILURES_BEFORE_BENCH = 3
+MAX_BENCH_SECONDS = 60
+
+METHOD_TIMEOUTS = {
+    'eth_getLogs': 30,
+}
+
+# Safe to send twice; only these are hedged
+READ_METHODS = frozenset([
+    'eth_blockNumber', 'eth_call', 'eth_chainId', 'eth_getBalance', 'eth_getBlockByNumber',
+    'eth_getBlockByHash', 'eth_getCode', 'eth_getLogs', 'eth_getTransactionByHash',
+    'eth_getTransactionCount', 'eth_getTransactionReceipt', 'eth_gasPrice', 'eth_feeHistory',
+    'eth_maxPriorityFeePerGas', 'eth_estimateGas', 'net_version', 'web3_clientVersion',
+])
+
+# JSON-RPC error codes that mean "this endpoint is unhappy", not "your call failed"
+ENDPOINT_ERROR_CODES = frozenset([-32005, -32603, 429])
+
+# Hardhat (and some other nodes) report a reverted eth_call / eth_estimateGas
+# as -32603 too: that is the call failing, on every endpoint alike
+REVERT_ERROR_MARKERS = ('revert', 'vm exception')
+
+# eth_getLogs refusals (Infura uses -32005 for these too) that mean "ask for
+# fewer blocks": every endpoint would refuse, so no failover or benching
+LOG_RANGE_ERROR_MARKERS = ('results', 'response size', 'range', 'too large', 'too many logs')
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class EndpointError(Exception):
+    pass
+
+
+def is_log_range_error(message):
+    """True if an eth_getLogs error says the block range holds too many logs."""
+    message = str(message or '').lower()
+    return any(marker in message for marker in LOG_RANGE_ERROR_MARKERS)
+
+
+def is_revert_error(message):
+    """True if a JSON-RPC error says the call itself reverted."""
+    message = str(message or '').lower()
+    return any(marker in message for marker in REVERT_ERROR_MARKERS)
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a window of recent samples for quantiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=256):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        return {
+            "buckets": {("+Inf" if b == float('inf') else str(b)): c for b, c in zip(self.buckets, self.counts)},
+            "sum": self.sum,
+            "count": self.count,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+        }
+
+
+class Endpoint:
+    def __init__(self, url, pool_size=RPC_POOL_SIZE):
+        self.url = url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.benched_until = 0.0
+        self._error_window = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.requests += 1
+            self._error_window.append(0 if ok else 1)
+            if ok:
+                self.latency.observe(seconds)
+                self.consecutive_failures = 0
+                self.benched_until = 0.0
+            else:
+                self.errors += 1
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= FAILURES_BEFORE_BENCH:
+                    backoff = min(MAX_BENCH_SECONDS, 2 ** (self.consecutive_failures - FAILURES_BEFORE_BENCH))
+                    self.benched_until = time.time() + backoff
+
+    @property
+    def available(self):
+        return time.time() >= self.benched_until
+
+    def score(self):
+        """Lower is better: typical latency, inflated by the recent error rate."""
+        p50 = self.latency.quantile(0.5)
+        error_rate = sum(self._error_window) / len(self._error_window) if self._error_window else 0.0
+        return (p50 if p50 is not None else 0.1) * (1 + 10 * error_rate)
+
+    def hedge_delay(self):
+        p95 = self.latency.quantile(0.95)
+        if p95 is None or len(self.latency.recent) < 20:
+            return None
+        return max(RPC_HEDGE_MIN_DELAY, p95)
+
+    def _check(self, status, decoded):
+        if status == 429 or status >= 500:
+            raise EndpointError(f"{self.url} returned HTTP {status}")
+        error = decoded.get('error') if isinstance(decoded, dict) else None
+        if (error and error.get('code') in ENDPOINT_ERROR_CODES and not is_log_range_error(error.get('message'))
+                and not is_revert_error(error.get('message'))):
+            raise EndpointError(f"{self.url} error: {decoded['error']}")
+
+    def post(self, body, timeout):
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, data=body, timeout=(RPC_CONNECT_TIMEOUT, timeout))
+            self._check(response.status_code, None)
+            response.raise_for_status()
+            decoded = response.json()
+            self._check(response.status_code, decoded)
+        except Exception:
+            self.record(time.perf_counter() - start, ok=False)
+            raise
+        self.record(time.perf_counter() - start, ok=True)
+        return decoded
+
+    async def post_async(self, session, body, timeout):
+        """``post`` over a shared aiohttp ``session`` (see AsyncMultiEndpointProvider)."""
+        start = time.perf_counter()
+        try:
+            client_timeout = aiohttp.ClientTimeout(sock_connect=RPC_CONNECT_TIMEOUT, sock_read=timeout)
+            async with session.post(self.url, data=body, timeout=client_timeout) as response:
+                self._check(response.status, None)
+                response.raise_for_status()
+                decoded = json.loads(await response.read())
+            self._check(response.status, decoded)
+        except Exception:
+            self.record(time.perf_counter() - start, ok=False)
+            raise
+        self.record(time.perf_counter() - start, ok=True)
+        return decoded
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "requests": self.requests,
+            "errors": self.errors,
+            "available": self.available,
+            "score": self.score(),
+            "latency": self.latency.snapshot(),
+        }
+
+
+class MultiEndpointProvider(JSONBaseProvider):
+    def __init__(self, urls, timeout=RPC_TIMEOUT, hedge=RPC_HEDGE):
+        super().__init__()
+        if not urls:
+            raise ValueError("At least one RPC URL is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self._executor = None
+        self._executor_pid = None
+
+    def __str__(self):
+        return f"MultiEndpointProvider({', '.join(e.url for e in self.endpoints)})"
+
+    @property
+    def endpoint_uri(self):
+        return self.ranked()[0].url
+
+    def ranked(self):
+        """Endpoints by health: available ones first, best score first."""
+        return sorted(self.endpoints, key=lambda e: (not e.available, e.score()))
+
+    def _failover(self, body, timeout, endpoints):
+        last_error = None
+        for i, endpoint in enumerate(endpoints):
+            try:
+                result = endpoint.post(body, timeout)
+                if i:
+                    self.failovers += 1
+                return result
+            except Exception as e:
+                print(f"RPC endpoint {endpoint.url} failed: {str(e)}")
+                last_error = e
+        raise EndpointError(f"All RPC endpoints failed: {last_error}")
+
+    def _get_executor(self):
+        # Threads do not survive gunicorn's fork; give each worker its own pool
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.endpoints)),
+                                                thread_name_prefix='rpc-hedge')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _hedged(self, body, timeout, endpoints):
+        primary, backup = endpoints[0], endpoints[1]
+        delay = primary.hedge_delay()
+        if delay is None:
+            return self._failover(body, timeout, endpoints)
+
+        executor = self._get_executor()
+        futures = {executor.submit(primary.post, body, timeout): primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            self.hedged += 1
+            futures[executor.submit(backup.post, body, timeout)] = backup
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if futures[future] is backup:
+                        self.hedge_wins += 1
+                    return future.result()
+        # Every attempt failed: fall back to the endpoints not tried yet
+        remaining = [e for e in endpoints if e not in futures.values()]
+        if not remaining:
+            raise EndpointError(f"All RPC endpoints failed: {future.exception()}")
+        return self._failover(body, timeout, remaining)
+
+    def _send(self, body, method):
+        timeout = METHOD_TIMEOUTS.get(method, self.timeout)
+        endpoints = self.ranked()
+        start = time.perf_counter()
+        try:
+            if self.hedge and method in READ_METHODS and len(endpoints) > 1 and endpoints[1].available:
+                result = self._hedged(body, timeout, endpoints)
+            else:
+                result = self._failover(body, timeout, endpoints)
+        except Exception:
+            instrumentation.record_rpc(method, time.perf_counter() - start, ok=False)
+            raise
+        instrumentation.record_rpc(method, time.perf_counter() - start)
+        return result
+
+    def make_request(self, method, params):
+        return self._send(self.encode_rpc_request(method, params), method)
+
+    def make_batch_request(self, payload):
+        """Send a raw JSON-RPC batch (list of request dicts) with failover."""
+        methods = {item['method'] for item in payload}
+        method = methods.pop() if len(methods) == 1 else None
+        return self._send(json.dumps(payload).encode(), method)
+
+    def stats(self):
+        return {
+            "hedged": self.hedged,
+            "hedgeWins": self.hedge_wins,
+            "failovers": self.failovers,
+            "endpoints": [e.stats() for e in self.endpoints],
+        }
+
+
+class AsyncMultiEndpointProvider(AsyncJSONBaseProvider):
+    """Async twin of ``MultiEndpointProvider`` for ``AsyncWeb3``.
+
+    Built from a sync provider it shares its ``Endpoint`` objects, so both
+    see the same health scores, benching and latency histograms. Requests go
+    through one aiohttp connection pool per event loop; a hedge that loses
+    the race is cancelled.
+    """
+
+    def __init__(self, endpoints, timeout=RPC_TIMEOUT, hedge=RPC_HEDGE):
+        super().__init__()
+        if not endpoints:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self._session = None
+
+    @classmethod
+    def from_sync(cls, provider):
+        return cls(provider.endpoints, timeout=provider.timeout, hedge=provider.hedge)
+
+    def ranked(self):
+        return sorted(self.endpoints, key=lambda e: (not e.available, e.score()))
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=RPC_POOL_SIZE * len(self.endpoints))
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  headers={'Content-Type': 'application/json'})
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _failover(self, body, timeout, endpoints):
+        session = await self._get_session()
+        last_error = None
+        for i, endpoint in enumerate(endpoints):
+            try:
+                result = await endpoint.post_async(session, body, timeout)
+                if i:
+                    self.failovers += 1
+                return result
+            except Exception as e:
+                print(f"RPC endpoint {endpoint.url} failed: {str(e)}")
+                last_error = e
+        raise EndpointError(f"All RPC endpoints failed: {last_error}")
+
+    async def _hedged(self, body, timeout, endpoints):
+        primary, backup = endpoints[0], endpoints[1]
+        delay = primary.hedge_delay()
+        if delay is None:
+            return await self._failover(body, timeout, endpoints)
+
+        session = await self._get_session()
+        tasks = {asyncio.ensure_future(primary.post_async(session, body, timeout)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            self.hedged += 1
+            tasks[asyncio.ensure_future(backup.post_async(session, body, timeout))] = backup
+
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        remaining = [e for e in endpoints if e not in tasks.values()]
+        if not remaining:
+            raise EndpointError(f"All RPC endpoints failed: {error}")
+        return await self._failover(body, timeout, remaining)
+
+    async def _send(self, body, method):
+        timeout = METHOD_TIMEOUTS.get(method, self.timeout)
+        endpoints = self.ranked()
+        start = time.perf_counter()
+        try:
+            if self.hedge and method in READ_METHODS and len(endpoints) > 1 and endpoints[1].available:
+                result = await self._hedged(body, timeout, endpoints)
+            else:
+                result = await self._failover(body, timeout, endpoints)
+        except Exception:
+            instrumentation.record_rpc(method, time.perf_counter() - start, ok=False)
+            raise
+        instrumentation.record_rpc(method, time.perf_counter() - start)
+        return result
+
+    async def make_request(self, method, params):
+        return await self._send(self.encode_rpc_request(method, params), method)
+
+    async def make_batch_request(self, payload):
+        methods = {item['method'] for item in payload}
+        method = methods.pop() if len(methods) == 1 else None
+        return await self._send(json.dumps(payload).encode(), method)
+
+
+def build_provider(urls):
+    """``MultiEndpointProvider`` over ``urls`` (a list or comma-separated string)."""
+    if isinstance(urls, str):
+        urls = [u.strip() for u in urls.split(',') if u.strip()]
+    return MultiEndpointProvider(urls)
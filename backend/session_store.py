@@ -0,0 +1,271 @@
+"""Pluggable session storage for the nonce/auth flow.
+
+Every backend implements ``get``, ``set``, ``touch`` and ``expire``:
+
+* ``sqlite`` (default) - one WAL-mode database shared by all gunicorn
+  workers on the host, so a nonce issued by one worker verifies in another.
+* ``redis`` - any Redis-protocol server (Redis, KeyDB, a local
+  ``redis-server``) for deployments spanning several hosts.
+* ``memory`` - single-process dict, for development only.
+
+Expiry is indexed by deadline (a heap in memory, a B-tree index in SQLite,
+native TTLs in Redis) so cleanup costs O(log n) per expired session instead
+of a full scan. ``SESSION_MAX_ENTRIES`` bounds the store; once full, the
+least recently used sessions are evicted. Reads count as use, so an active
+login is not evicted ahead of the nonce-only sessions created after it; in
+SQLite ``last_used`` is rewritten at most every ``SESSION_LAST_USED_RESOLUTION``
+seconds per session to keep reads from turning into a write each.
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from backend.storage import db_path, get_connection
+
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'sqlite')
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 3600))
+SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', 100000))
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH') or db_path('sessions.sqlite3')
+SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL', 'redis://127.0.0.1:6379/0')
+# Expired rows are purged at most this often per process (reads already skip them)
+CLEANUP_INTERVAL = float(os.environ.get('SESSION_CLEANUP_INTERVAL', 5))
+# A read refreshes a SQLite session's last_used only if it is older than this
+SESSION_LAST_USED_RESOLUTION = float(os.environ.get('SESSION_LAST_USED_RESOLUTION', 60))
+
+
+class SessionBackend:
+    """Interface shared by all session backends."""
+
+    def get(self, token):
+        """Return the session dict, or ``None`` if unknown or expired."""
+        raise NotImplementedError
+
+    def set(self, token, data, ttl=SESSION_TTL):
+        """Create or replace a session that expires ``ttl`` seconds from now."""
+        raise NotImplementedError
+
+    def touch(self, token, ttl=SESSION_TTL):
+        """Push the deadline of an existing session; returns False if it is gone."""
+        raise NotImplementedError
+
+    def expire(self, token):
+        """Drop a session immediately."""
+        raise NotImplementedError
+
+    def cleanup(self):
+        """Purge expired sessions; returns how many were removed."""
+        return 0
+
+    def __contains__(self, token):
+        return token is not None and self.get(token) is not None
+
+
+class MemorySessionBackend(SessionBackend):
+    """Process-local store: LRU-ordered dict plus a min-heap of deadlines."""
+
+    def __init__(self, max_entries=SESSION_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (deadline, data), oldest use first
+        self._deadlines = []  # (deadline, token); stale pairs are skipped lazily
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return dict(entry[1])
+
+    def set(self, token, data, ttl=SESSION_TTL):
+        deadline = time.time() + ttl
+        with self._lock:
+            self._entries[token] = (deadline, dict(data))
+            self._entries.move_to_end(token)
+            heapq.heappush(self._deadlines, (deadline, token))
+            self._cleanup_locked()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, token, ttl=SESSION_TTL):
+        deadline = time.time() + ttl
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] < time.time():
+                return False
+            entry[1]['expires_at'] = deadline
+            self._entries[token] = (deadline, entry[1])
+            self._entries.move_to_end(token)
+            heapq.heappush(self._deadlines, (deadline, token))
+            return True
+
+    def expire(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def _cleanup_locked(self):
+        now = time.time()
+        removed = 0
+        while self._deadlines and self._deadlines[0][0] < now:
+            deadline, token = heapq.heappop(self._deadlines)
+            entry = self._entries.get(token)
+            # Only drop the entry if this heap item is its current deadline
+            if entry is not None and entry[0] == deadline:
+                del self._entries[token]
+                removed += 1
+        # Touched/evicted sessions leave stale heap items behind; compact occasionally
+        if len(self._deadlines) > 2 * len(self._entries) + 64:
+            self._deadlines = [(d, t) for t, (d, _) in self._entries.items()]
+            heapq.heapify(self._deadlines)
+        return removed
+
+    def cleanup(self):
+        with self._lock:
+            return self._cleanup_locked()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Cross-process store shared by every worker on the host."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+    CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used);
+    CREATE TABLE IF NOT EXISTS session_count (id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER NOT NULL);
+    INSERT OR IGNORE INTO session_count (id, n) VALUES (0, 0);
+    CREATE TRIGGER IF NOT EXISTS sessions_count_insert AFTER INSERT ON sessions
+        BEGIN UPDATE session_count SET n = n + 1; END;
+    CREATE TRIGGER IF NOT EXISTS sessions_count_delete AFTER DELETE ON sessions
+        BEGIN UPDATE session_count SET n = n - 1; END;
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, max_entries=SESSION_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._last_cleanup = 0.0
+        get_connection(self.path).executescript(self.SCHEMA)
+
+    @property
+    def conn(self):
+        return get_connection(self.path)
+
+    def get(self, token):
+        now = time.time()
+        row = self.conn.execute(
+            "SELECT data, last_used FROM sessions WHERE token = ? AND expires_at >= ?", (token, now)).fetchone()
+        if row is None:
+            return None
+        if now - row[1] > SESSION_LAST_USED_RESOLUTION:
+            self.conn.execute("UPDATE sessions SET last_used = ? WHERE token = ? AND last_used < ?",
+                              (now, token, now))
+        return json.loads(row[0])
+
+    def set(self, token, data, ttl=SESSION_TTL):
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Upsert rather than REPLACE so the count triggers stay exact
+            conn.execute(
+                "INSERT INTO sessions (token, data, expires_at, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (token) DO UPDATE SET data = excluded.data, "
+                "expires_at = excluded.expires_at, last_used = excluded.last_used",
+                (token, json.dumps(data), now + ttl, now))
+            excess = conn.execute("SELECT n FROM session_count").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._purge_expired(conn, now)
+                excess = conn.execute("SELECT n FROM session_count").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM sessions WHERE token IN "
+                    "(SELECT token FROM sessions ORDER BY last_used LIMIT ?)", (excess,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if now - self._last_cleanup > CLEANUP_INTERVAL:
+            self.cleanup()
+
+    def touch(self, token, ttl=SESSION_TTL):
+        now = time.time()
+        row = self.conn.execute("SELECT data FROM sessions WHERE token = ? AND expires_at >= ?",
+                                (token, now)).fetchone()
+        if row is None:
+            return False
+        data = json.loads(row[0])
+        data['expires_at'] = now + ttl
+        cur = self.conn.execute(
+            "UPDATE sessions SET data = ?, expires_at = ?, last_used = ? WHERE token = ?",
+            (json.dumps(data), now + ttl, now, token))
+        return cur.rowcount > 0
+
+    def expire(self, token):
+        self.conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    @staticmethod
+    def _purge_expired(conn, now):
+        # Range delete on the expires_at index: O(k log n) for k expired rows
+        return conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,)).rowcount
+
+    def cleanup(self):
+        self._last_cleanup = time.time()
+        return self._purge_expired(self.conn, self._last_cleanup)
+
+    def __len__(self):
+        return self.conn.execute("SELECT n FROM session_count").fetchone()[0]
+
+
+class RedisSessionBackend(SessionBackend):
+    """Redis-protocol store; the server enforces TTLs.
+
+    Bound memory on the server side with ``maxmemory`` and
+    ``maxmemory-policy allkeys-lru``.
+    """
+
+    PREFIX = 'session:'
+
+    def __init__(self, url=SESSION_REDIS_URL):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, token):
+        raw = self.client.get(self.PREFIX + token)
+        return json.loads(raw) if raw else None
+
+    def set(self, token, data, ttl=SESSION_TTL):
+        self.client.set(self.PREFIX + token, json.dumps(data), ex=int(ttl))
+
+    def touch(self, token, ttl=SESSION_TTL):
+        data = self.get(token)
+        if data is None:
+            return False
+        data['expires_at'] = time.time() + ttl
+        self.client.set(self.PREFIX + token, json.dumps(data), ex=int(ttl), xx=True)
+        return True
+
+    def expire(self, token):
+        self.client.delete(self.PREFIX + token)
+
+
+def create_backend(name=SESSION_BACKEND):
+    if name == 'memory':
+        return MemorySessionBackend()
+    if name == 'redis':
+        return RedisSessionBackend()
+    if name == 'sqlite':
+        return SQLiteSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {name}")
@@ -0,0 +1,181 @@
+"""Signing for the admin-signed write endpoints.
+
+Every write used to derive the account from ``PRIVATE_KEY`` (EC point
+multiplication), run ``build_transaction`` (ABI lookup and encoding,
+transaction validation) and ``sign_transaction`` (which derives the key
+again and re-validates the dict), with a hard-coded chain id and a fixed
+10 gwei gas price. ``SignerService`` keeps only the work that actually
+varies per transaction:
+
+* the key object is built once;
+* the 4-byte selectors and argument types of ``vote``, ``registerVoter``,
+  ``addCandidate``, ``startVoting`` and ``endVoting`` are taken from the
+  ABI once, so calldata is ``selector + encode(args)``;
+* the chain id is read once (``CHAIN_ID`` skips even that);
+* the EIP-1559 transaction is RLP-encoded and signed directly - the bytes
+  are identical to ``eth_account``'s.
+
+Fees come from ``FeeOracle``: base fee of the latest block and
+``eth_maxPriorityFeePerGas`` in one batched request, refreshed at most every
+``TX_FEE_REFRESH_INTERVAL`` seconds. ``maxFeePerGas`` is
+``base fee * TX_BASE_FEE_MULTIPLIER + priority fee``, so a transaction stays
+includable while the base fee rises for several full blocks. Chains
+without a base fee get legacy ``gasPrice`` transactions.
+"""
+import os
+import threading
+import time
+
+from eth_abi import encode
+from eth_keys import keys
+from eth_utils import function_abi_to_4byte_selector, keccak, to_bytes
+
+from backend.batch_reads import rpc_batch
+
+FEE_REFRESH_INTERVAL = float(os.environ.get('TX_FEE_REFRESH_INTERVAL', 12))
+BASE_FEE_MULTIPLIER = float(os.environ.get('TX_BASE_FEE_MULTIPLIER', 2))
+# Used when the node has no eth_maxPriorityFeePerGas
+DEFAULT_PRIORITY_FEE_GWEI = float(os.environ.get('TX_DEFAULT_PRIORITY_FEE_GWEI', 1.5))
+# Used until the first successful fee lookup (the old fixed price)
+DEFAULT_GAS_PRICE_GWEI = 10
+
+TEMPLATE_FUNCTIONS = ('vote', 'registerVoter', 'addCandidate', 'startVoting', 'endVoting')
+
+GWEI = 10 ** 9
+# Intrinsic gas of a plain transfer
+CANCEL_GAS = 21000
+
+
+def _to_int(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def _rlp_length(payload, offset):
+    if len(payload) < 56:
+        return bytes([offset + len(payload)]) + payload
+    length = len(payload).to_bytes((len(payload).bit_length() + 7) // 8, 'big')
+    return bytes([offset + 55 + len(length)]) + length + payload
+
+
+def _rlp(item):
+    """RLP of an int, bytes or list of those (what a transaction needs);
+    the generic ``rlp`` codec costs more than the signature itself."""
+    if isinstance(item, list):
+        return _rlp_length(b''.join(_rlp(i) for i in item), 0xc0)
+    if isinstance(item, int):
+        item = item.to_bytes((item.bit_length() + 7) // 8, 'big')
+    if len(item) == 1 and item[0] < 0x80:
+        return item
+    return _rlp_length(item, 0x80)
+
+
+class FeeOracle:
+    def __init__(self, web3, refresh_interval=FEE_REFRESH_INTERVAL):
+        self.web3 = web3
+        self.refresh_interval = refresh_interval
+        self._fees = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.errors = 0
+
+    def _fetch(self):
+        block, priority = rpc_batch(self.web3, [
+            ("eth_getBlockByNumber", ['latest', False]),
+            ("eth_maxPriorityFeePerGas", []),
+        ])
+        base_fee = ((block or {}).get('result') or {}).get('baseFeePerGas')
+        if base_fee is None:
+            # Pre-London chain: legacy gasPrice
+            return self.web3.eth.gas_price, None
+        if priority and priority.get('result') is not None:
+            priority_fee = _to_int(priority['result'])
+        else:
+            priority_fee = int(DEFAULT_PRIORITY_FEE_GWEI * GWEI)
+        return int(_to_int(base_fee) * BASE_FEE_MULTIPLIER) + priority_fee, priority_fee
+
+    def fees(self):
+        """``(maxFeePerGas, maxPriorityFeePerGas)``; the priority fee is None
+        when the chain only takes legacy ``gasPrice`` (= the first value)."""
+        if self._fees is not None and time.time() - self._fetched_at < self.refresh_interval:
+            return self._fees
+        with self._lock:
+            if self._fees is not None and time.time() - self._fetched_at < self.refresh_interval:
+                return self._fees
+            try:
+                self._fees = self._fetch()
+                self.refreshes += 1
+            except Exception as e:
+                print(f"Fee lookup failed: {str(e)}")
+                self.errors += 1
+                if self._fees is None:
+                    self._fees = (DEFAULT_GAS_PRICE_GWEI * GWEI, None)
+            self._fetched_at = time.time()
+            return self._fees
+
+    def stats(self):
+        max_fee, priority_fee = self._fees or (None, None)
+        return {
+            "maxFeePerGas": max_fee,
+            "maxPriorityFeePerGas": priority_fee,
+            "age": time.time() - self._fetched_at if self._fees else None,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+        }
+
+
+class SignerService:
+    def __init__(self, web3, contract, account, chain_id=None):
+        self.web3 = web3
+        self.contract = contract
+        self.address = account.address
+        self._key = keys.PrivateKey(bytes(account.key))
+        self._to = to_bytes(hexstr=contract.address)
+        self._chain_id = chain_id or (int(os.environ['CHAIN_ID']) if os.environ.get('CHAIN_ID') else None)
+        self.fees = FeeOracle(web3)
+
+        # fn_name -> (selector, argument types)
+        self._templates = {}
+        for abi in contract.abi:
+            if abi.get('type') == 'function' and abi['name'] in TEMPLATE_FUNCTIONS:
+                self._templates[abi['name']] = (function_abi_to_4byte_selector(abi),
+                                                [i['type'] for i in abi['inputs']])
+
+    @property
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.web3.eth.chain_id
+        return self._chain_id
+
+    def calldata(self, fn_name, args):
+        template = self._templates.get(fn_name)
+        if template is None:
+            return to_bytes(hexstr=self.contract.encodeABI(fn_name=fn_name, args=list(args)))
+        selector, types = template
+        return selector + encode(types, list(args)) if types else selector
+
+    def sign(self, fn_name, args, nonce, gas, max_fee, priority_fee=None, to=None):
+        """Sign ``fn_name(*args)``; returns ``(raw tx, tx hash)`` as 0x-hex.
+
+        EIP-1559 when ``priority_fee`` is given, otherwise a legacy
+        (EIP-155) transaction with ``gasPrice = max_fee``. ``to`` sends the
+        call to another deployment of the same contract (default: ours).
+        """
+        return self.sign_data(self.calldata(fn_name, args), nonce, gas, max_fee, priority_fee, to=to)
+
+    def sign_cancel(self, nonce, max_fee, priority_fee=None):
+        """Zero-value transfer to ourselves, to use up ``nonce``."""
+        return self.sign_data(b'', nonce, CANCEL_GAS, max_fee, priority_fee, to=self.address)
+
+    def sign_data(self, data, nonce, gas, max_fee, priority_fee=None, to=None):
+        chain_id = self.chain_id
+        to = self._to if to is None else to_bytes(hexstr=to)
+        if priority_fee is None:
+            fields = [nonce, max_fee, gas, to, 0, data]
+            signature = self._key.sign_msg_hash(keccak(_rlp(fields + [chain_id, 0, 0])))
+            raw = _rlp(fields + [signature.v + 35 + 2 * chain_id, signature.r, signature.s])
+        else:
+            fields = [chain_id, nonce, priority_fee, max_fee, gas, to, 0, data, []]
+            signature = self._key.sign_msg_hash(keccak(b'\x02' + _rlp(fields)))
+            raw = b'\x02' + _rlp(fields + [signature.v, signature.r, signature.s])
+        return '0x' + raw.hex(), '0x' + keccak(raw).hex()
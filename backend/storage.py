@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+# Directory for the embedded SQLite stores shared by all gunicorn workers
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(tempfile.gettempdir(), 'voting-backend'))
+
+_local = threading.local()
+_held_locks = {}
+
+
+def db_path(name):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, name)
+
+
+def connect(path):
+    """Open a SQLite connection in WAL mode so readers never block the writer."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def get_connection(path):
+    """Return a connection to ``path`` cached per thread (and per process, so
+    connections are never shared across a fork)."""
+    conns = getattr(_local, 'conns', None)
+    if conns is None or getattr(_local, 'pid', None) != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = connect(path)
+    return conn
+
+
+def acquire_process_lock(path):
+    """Take a non-blocking exclusive file lock, held for the life of the process.
+
+    Used to elect a single gunicorn worker to run a background loop.
+    Returns True if this process holds the lock.
+    """
+    if fcntl is None or path in _held_locks:
+        return True
+    handle = open(path, 'w')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _held_locks[path] = handle
+    return True
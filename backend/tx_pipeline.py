@@ -0,0 +1,438 @@
+"""Non-blocking transaction submission for the admin-signed write endpoints.
+
+``submit`` allocates the next nonce for the signing account, signs and
+broadcasts right away and returns a tx id; it never waits for a receipt.
+State lives in a SQLite database shared by all gunicorn workers:
+
+* ``nonces`` - one row per signing account. Allocation happens inside a
+  ``BEGIN IMMEDIATE`` transaction, so two workers can never hand out the
+  same nonce.
+* ``transactions`` - every submitted transaction. The signed payload is
+  stored *before* it is broadcast, so a crash between signing and sending
+  is recovered by re-broadcasting the same bytes instead of signing a
+  second transaction.
+
+A background tracker (one elected worker) batches receipt lookups,
+marks transactions confirmed/failed, and re-sends transactions stuck in
+the mempool with bumped fees under the same nonce. A transaction the node
+keeps refusing (``MAX_BROADCAST_ATTEMPTS``) is not simply dropped: every
+later nonce would wait behind the gap forever. Its nonce is filled with a
+zero-value transfer to ourselves (``cancelled``), and it is marked failed
+once that transfer is mined.
+
+Transactions are signed by ``backend.signer`` (EIP-1559 fees from its fee
+oracle). ``gas_price`` holds ``maxFeePerGas`` and ``priority_fee`` the
+``maxPriorityFeePerGas``; a NULL ``priority_fee`` means a legacy
+``gasPrice`` transaction. ``to_address`` is the contract a transaction
+calls (another election's deployment, see ``backend.elections``); NULL
+means the pipeline's own contract. Re-signs always keep the original
+recipient.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from backend import chain
+from backend.batch_reads import rpc_batch
+from backend.signer import CANCEL_GAS, SignerService
+from backend.storage import acquire_process_lock, db_path, get_connection
+
+TX_DB_PATH = os.environ.get('TX_DB_PATH') or db_path('transactions.sqlite3')
+TRACKER_INTERVAL = float(os.environ.get('TX_TRACKER_INTERVAL', 3))
+# Re-send with higher fees when no receipt shows up within this many seconds
+STUCK_AFTER = float(os.environ.get('TX_STUCK_AFTER', 90))
+MAX_RESENDS = int(os.environ.get('TX_MAX_RESENDS', 5))
+# Nodes reject replacements that bump the price by less than 10%
+GAS_BUMP = float(os.environ.get('TX_GAS_BUMP', 1.25))
+MAX_BROADCAST_ATTEMPTS = int(os.environ.get('TX_MAX_BROADCAST_ATTEMPTS', 10))
+
+DEFAULT_GAS = 300000
+
+IN_FLIGHT = ('signed', 'pending')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nonces (account TEXT PRIMARY KEY, next_nonce INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    fn_name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    gas INTEGER NOT NULL,
+    gas_price INTEGER NOT NULL,
+    priority_fee INTEGER,
+    to_address TEXT,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    raw_tx TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    tx_hashes TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    resends INTEGER NOT NULL DEFAULT 0,
+    block_number INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_status ON transactions (status);
+"""
+
+
+class TxPipeline:
+    def __init__(self, web3, contract, signer, path=TX_DB_PATH):
+        self.web3 = web3
+        self.contract = contract
+        self.path = path
+        self.signer = SignerService(web3, contract, signer)
+        self.account = signer.address
+        self._stop = threading.Event()
+        conn = get_connection(self.path)
+        conn.executescript(SCHEMA)
+        # Databases created before EIP-1559 signing / multiple elections
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+        for column, column_type in (('priority_fee', 'INTEGER'), ('to_address', 'TEXT'),
+                                    ('cancelled', 'INTEGER NOT NULL DEFAULT 0')):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE transactions ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    pass  # Another worker added it first
+
+    @property
+    def conn(self):
+        return get_connection(self.path)
+
+    # -- nonce allocation -------------------------------------------------
+
+    def _allocate_nonce(self):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next_nonce FROM nonces WHERE account = ?", (self.account,)).fetchone()
+            if row is None:
+                nonce = self.web3.eth.get_transaction_count(self.account, 'pending')
+            else:
+                nonce = row[0]
+            conn.execute("INSERT OR REPLACE INTO nonces (account, next_nonce) VALUES (?, ?)",
+                         (self.account, nonce + 1))
+            conn.execute("COMMIT")
+            return nonce
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def resync_nonce(self):
+        """Realign the local counter with the chain (e.g. after transactions
+        were sent from the same key elsewhere). Moving forward is always safe;
+        moving back only happens when nothing is in flight."""
+        chain_nonce = self.web3.eth.get_transaction_count(self.account, 'pending')
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT next_nonce FROM nonces WHERE account = ?", (self.account,)).fetchone()
+            in_flight = conn.execute(
+                "SELECT COUNT(*) FROM transactions WHERE account = ? AND status IN ('signed', 'pending')",
+                (self.account,)).fetchone()[0]
+            if row is None or chain_nonce > row[0] or not in_flight:
+                conn.execute("INSERT OR REPLACE INTO nonces (account, next_nonce) VALUES (?, ?)",
+                             (self.account, chain_nonce))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -- submission -------------------------------------------------------
+
+    def _sign(self, fn_name, args, nonce, gas, gas_price, priority_fee, to=None):
+        return self.signer.sign(fn_name, args, nonce, gas, gas_price, priority_fee, to=to)
+
+    def _release_nonce(self, nonce):
+        """Undo ``_allocate_nonce`` for a transaction that was never stored.
+
+        The nonce goes back if nothing was allocated after it; otherwise it
+        is filled with a cancel row, like a transaction the node refused.
+        """
+        try:
+            max_fee, priority_fee = self.signer.fees.fees()
+            cancel = self.signer.sign_cancel(nonce, max_fee, priority_fee)
+        except Exception as e:
+            print(f"Could not sign a cancel for nonce {nonce}: {str(e)}")
+            cancel = None
+        tx_id = uuid.uuid4().hex
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            returned = conn.execute("UPDATE nonces SET next_nonce = ? WHERE account = ? AND next_nonce = ?",
+                                    (nonce, self.account, nonce + 1)).rowcount
+            if not returned and cancel is not None:
+                now = time.time()
+                conn.execute(
+                    "INSERT INTO transactions (id, account, nonce, fn_name, args, gas, gas_price, priority_fee, "
+                    "cancelled, raw_tx, tx_hash, tx_hashes, status, error, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'cancel', '[]', ?, ?, ?, 1, ?, ?, ?, 'signed', ?, ?, ?)",
+                    (tx_id, self.account, nonce, CANCEL_GAS, max_fee, priority_fee, cancel[0], cancel[1],
+                     json.dumps([cancel[1]]), f"Signing failed; releasing nonce {nonce}", now, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if returned:
+            return
+        if cancel is None:
+            print(f"Nonce {nonce} was allocated but never signed; resync_nonce() once nothing is in flight")
+            return
+        print(f"Filling unsigned nonce {nonce} with a zero-value transfer ({tx_id})")
+        self._broadcast(tx_id, cancel[0])
+
+    def _broadcast(self, tx_id, raw_tx):
+        try:
+            self.web3.eth.send_raw_transaction(raw_tx)
+        except Exception as e:
+            message = str(e)
+            # The node already has it (e.g. re-broadcast after a restart)
+            if 'already known' not in message.lower():
+                self.conn.execute(
+                    "UPDATE transactions SET attempts = attempts + 1, error = ?, updated_at = ? WHERE id = ?",
+                    (message, time.time(), tx_id))
+                return False
+        now = time.time()
+        self.conn.execute(
+            "UPDATE transactions SET status = 'pending', attempts = attempts + 1, error = NULL, "
+            "sent_at = COALESCE(sent_at, ?), updated_at = ? WHERE id = ? AND status = 'signed'",
+            (now, now, tx_id))
+        return True
+
+    def submit(self, fn_name, *args, gas=DEFAULT_GAS, tx_id=None, to=None):
+        """Sign and broadcast ``fn_name(*args)``; returns the tx row as a dict.
+
+        Passing a ``tx_id`` makes the call idempotent: if that id was already
+        submitted, the existing transaction is returned instead of a new one.
+        ``to`` calls the same function on another deployment of the contract.
+        """
+        if tx_id is not None:
+            existing = self.get(tx_id)
+            if existing is not None:
+                return existing
+        tx_id = tx_id or uuid.uuid4().hex
+
+        # Encode first: bad arguments must fail before a nonce is taken
+        data = self.signer.calldata(fn_name, args)
+        gas_price, priority_fee = self.signer.fees.fees()
+        nonce = self._allocate_nonce()
+        try:
+            raw_tx, tx_hash = self.signer.sign_data(data, nonce, gas, gas_price, priority_fee, to=to)
+        except Exception:
+            self._release_nonce(nonce)
+            raise
+
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO transactions (id, account, nonce, fn_name, args, gas, gas_price, priority_fee, to_address, "
+            "raw_tx, tx_hash, tx_hashes, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'signed', ?, ?)",
+            (tx_id, self.account, nonce, fn_name, json.dumps(list(args)), gas, gas_price, priority_fee, to,
+             raw_tx, tx_hash, json.dumps([tx_hash]), now, now))
+
+        for _ in range(3):
+            if self._broadcast(tx_id, raw_tx):
+                break
+            error = self.get(tx_id)['error'] or ''
+            if 'nonce too low' not in error.lower():
+                # Left as 'signed'; the tracker keeps re-broadcasting it
+                break
+            # Someone else used this nonce: re-sign the same tx on a fresh one
+            self.resync_nonce()
+            nonce = self._allocate_nonce()
+            raw_tx, tx_hash = self.signer.sign_data(data, nonce, gas, gas_price, priority_fee, to=to)
+            self.conn.execute(
+                "UPDATE transactions SET nonce = ?, raw_tx = ?, tx_hash = ?, tx_hashes = ?, updated_at = ? "
+                "WHERE id = ?", (nonce, raw_tx, tx_hash, json.dumps([tx_hash]), time.time(), tx_id))
+        return self.get(tx_id)
+
+    def get(self, tx_id):
+        row = self.conn.execute(
+            "SELECT id, status, tx_hash, nonce, fn_name, block_number, resends, error, created_at, to_address "
+            "FROM transactions WHERE id = ?", (tx_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "txId": row[0],
+            "status": row[1],
+            "txHash": row[2],
+            "nonce": row[3],
+            "function": row[4],
+            "blockNumber": row[5],
+            "resends": row[6],
+            "error": row[7],
+            "createdAt": row[8],
+            "to": row[9] or self.contract.address,
+        }
+
+    def wait(self, tx_id, timeout=120, poll=1.0):
+        """Block until the transaction leaves the in-flight states (legacy callers)."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            tx = self.get(tx_id)
+            if tx is None or tx['status'] not in IN_FLIGHT:
+                return tx
+            # Don't rely on the tracker running in this process
+            self.track_once()
+            time.sleep(poll)
+        return self.get(tx_id)
+
+    # -- receipt tracking -------------------------------------------------
+
+    def _cancel(self, tx_id, nonce, tx_hashes):
+        """Fill ``nonce`` with a no-op instead of the call the node refused."""
+        max_fee, priority_fee = self.signer.fees.fees()
+        raw_tx, tx_hash = self.signer.sign_cancel(nonce, max_fee, priority_fee)
+        self.conn.execute(
+            "UPDATE transactions SET cancelled = 1, raw_tx = ?, tx_hash = ?, tx_hashes = ?, gas_price = ?, "
+            "priority_fee = ?, attempts = 0, error = ?, updated_at = ? WHERE id = ?",
+            (raw_tx, tx_hash, json.dumps(json.loads(tx_hashes) + [tx_hash]), max_fee, priority_fee,
+             f"Not accepted after {MAX_BROADCAST_ATTEMPTS} broadcasts; releasing nonce {nonce}", time.time(), tx_id))
+        print(f"Cancelling {tx_id}: filling nonce {nonce} with a zero-value transfer")
+        self._broadcast(tx_id, raw_tx)
+
+    def _bump(self, tx_id, fn_name, args, nonce, gas, gas_price, priority_fee, to, tx_hashes, resends,
+              cancelled=False):
+        # Both fees must rise for the node to accept the replacement; follow
+        # the oracle if the market moved further than the bump
+        max_fee, oracle_priority = self.signer.fees.fees()
+        new_price = max(int(gas_price * GAS_BUMP) + 1, max_fee)
+        new_priority = None
+        if priority_fee is not None:
+            new_priority = max(int(priority_fee * GAS_BUMP) + 1, oracle_priority or 0)
+            new_price = max(new_price, new_priority)
+        if cancelled:
+            raw_tx, tx_hash = self.signer.sign_cancel(nonce, new_price, new_priority)
+        else:
+            raw_tx, tx_hash = self._sign(fn_name, json.loads(args), nonce, gas, new_price, new_priority, to)
+        try:
+            self.web3.eth.send_raw_transaction(raw_tx)
+        except Exception as e:
+            print(f"Re-send of {tx_id} failed: {str(e)}")
+            return
+        hashes = json.loads(tx_hashes) + [tx_hash]
+        now = time.time()
+        self.conn.execute(
+            "UPDATE transactions SET raw_tx = ?, tx_hash = ?, tx_hashes = ?, gas_price = ?, priority_fee = ?, "
+            "resends = ?, sent_at = ?, updated_at = ? WHERE id = ?",
+            (raw_tx, tx_hash, json.dumps(hashes), new_price, new_priority, resends + 1, now, now, tx_id))
+        print(f"Re-sent {tx_id} (nonce {nonce}) at {new_price} wei max fee")
+
+    def track_once(self):
+        rows = self.conn.execute(
+            "SELECT id, status, raw_tx, tx_hashes, fn_name, args, nonce, gas, gas_price, priority_fee, to_address, "
+            "cancelled, resends, attempts, sent_at FROM transactions WHERE status IN ('signed', 'pending') ORDER BY nonce").fetchall()
+        if not rows:
+            return
+
+        # Any hash (original or a gas-bumped replacement) may be the one that got
+        # mined, including a 'signed' one whose broadcast errored after all
+        lookups = [(row[0], h) for row in rows for h in json.loads(row[3])]
+        try:
+            responses = rpc_batch(self.web3, [("eth_getTransactionReceipt", [h]) for _, h in lookups])
+        except Exception:
+            responses = []
+            for _, h in lookups:
+                try:
+                    responses.append({"result": self.web3.eth.get_transaction_receipt(h)})
+                except Exception:
+                    responses.append(None)
+
+        receipts = {}
+        for (tx_id, tx_hash), response in zip(lookups, responses):
+            receipt = response.get('result') if response else None
+            if receipt:
+                receipts[tx_id] = (tx_hash, receipt)
+
+        confirmed_nonce = None
+        now = time.time()
+        for (tx_id, status, raw_tx, tx_hashes, fn_name, args, nonce, gas, gas_price, priority_fee, to,
+             cancelled, resends, attempts, sent_at) in rows:
+            if tx_id in receipts:
+                tx_hash, receipt = receipts[tx_id]
+                ok = int(receipt['status'], 16) if isinstance(receipt['status'], str) else receipt['status']
+                block = receipt['blockNumber']
+                block = int(block, 16) if isinstance(block, str) else block
+                # The cancel (or a bump of it) is the only transaction sent to ourselves
+                if cancelled and (receipt.get('to') or '').lower() == self.account.lower():
+                    status, error = 'failed', f"Not broadcast; nonce {nonce} released by a cancel transaction"
+                elif ok:
+                    status, error = 'confirmed', None
+                else:
+                    status, error = 'failed', 'Transaction reverted'
+                self.conn.execute(
+                    "UPDATE transactions SET status = ?, tx_hash = ?, block_number = ?, error = ?, updated_at = ? "
+                    "WHERE id = ?", (status, tx_hash, block, error, now, tx_id))
+            elif status == 'signed':
+                if attempts >= MAX_BROADCAST_ATTEMPTS and not cancelled:
+                    self._cancel(tx_id, nonce, tx_hashes)
+                else:
+                    # A refused cancel keeps being re-sent: the nonce must be filled
+                    self._broadcast(tx_id, raw_tx)
+            else:
+                if confirmed_nonce is None:
+                    confirmed_nonce = self.web3.eth.get_transaction_count(self.account, 'latest')
+                if nonce < confirmed_nonce:
+                    # Nonce consumed by a transaction we have no receipt for
+                    self.conn.execute(
+                        "UPDATE transactions SET status = 'dropped', error = 'Replaced by another transaction', "
+                        "updated_at = ? WHERE id = ?", (now, tx_id))
+                elif sent_at and now - sent_at > STUCK_AFTER and resends < MAX_RESENDS:
+                    self._bump(tx_id, fn_name, args, nonce, gas, gas_price, priority_fee, to, tx_hashes, resends,
+                               cancelled=cancelled)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.track_once()
+            except Exception as e:
+                print(f"Receipt tracker failed: {str(e)}")
+            self._stop.wait(TRACKER_INTERVAL)
+
+    def stop(self):
+        self._stop.set()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+_tracker_pid = None
+
+
+def get_pipeline(web3, contract):
+    """Process-wide pipeline for the PRIVATE_KEY admin account."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                signer = chain.get_signer()
+                if signer is None:
+                    raise RuntimeError("PRIVATE_KEY is not set")
+                _pipeline = TxPipeline(web3, contract, signer)
+    return _pipeline
+
+
+def _track_when_elected(pipeline):
+    while not acquire_process_lock(pipeline.path + '.lock'):
+        time.sleep(TRACKER_INTERVAL * 5)
+    print(f"Receipt tracker started in process {os.getpid()}")
+    pipeline.run()
+
+
+def ensure_tracker_started(web3, contract):
+    """Start the receipt tracker thread once per process (after gunicorn forks)."""
+    global _tracker_pid
+    if not contract or not os.getenv('PRIVATE_KEY') or _tracker_pid == os.getpid():
+        return
+    with _pipeline_lock:
+        if _tracker_pid == os.getpid():
+            return
+        _tracker_pid = os.getpid()
+    threading.Thread(target=_track_when_elected, args=(get_pipeline(web3, contract),),
+                     name='receipt-tracker', daemon=True).start()
@@ -0,0 +1,212 @@
+"""Block-aware cache for contract view calls.
+
+View functions return the same value for a whole block, so results are
+cached under ``(block, key)``. The current block number is itself only
+refreshed every ``BLOCK_POLL_INTERVAL`` seconds; when it moves, everything
+cached for the previous block is dropped. Values that can never change
+(``admin`` is set once in the constructor) are cached permanently, and
+``invalidate()`` lets event consumers drop entries as soon as they see a
+relevant log.
+
+Concurrent misses for the same key are coalesced: the first caller loads
+the value and everyone else waits for its result, so a burst of requests
+costs one upstream call.
+
+Several caches can share one block clock (``block_source``, e.g. another
+cache's ``current_block``), so serving many contracts costs one
+``eth_blockNumber`` per interval, not one per contract. ``max_bytes`` caps
+the (approximate) size of the per-block entries; past it the oldest
+entries are evicted and simply reloaded on their next miss.
+"""
+import os
+import sys
+import threading
+import time
+
+BLOCK_POLL_INTERVAL = float(os.environ.get('VIEW_CACHE_BLOCK_POLL_INTERVAL', 1))
+IMMUTABLE_FUNCTIONS = frozenset(['admin'])
+
+
+class _InFlight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def approx_size(value):
+    """Rough deep size in bytes of a cached key or value."""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class ViewCache:
+    def __init__(self, web3, block_poll_interval=BLOCK_POLL_INTERVAL, block_source=None, max_bytes=None):
+        self.web3 = web3
+        self.block_poll_interval = block_poll_interval
+        self.block_source = block_source
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._block = None
+        self._block_checked_at = 0.0
+        self._block_loading = False
+        self._entries = {}
+        self._sizes = {}
+        self._bytes = 0
+        self._permanent = {}
+        self._in_flight = {}
+        self._generation = 0  # bumped by invalidate(); loads started before it are not stored
+        self.evictions = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    def _move_to(self, block):
+        # Caller holds the lock
+        self._block = block
+        self._entries = {k: v for k, v in self._entries.items() if k[0] >= block}
+        self._sizes = {k: self._sizes[k] for k in self._entries}
+        self._bytes = sum(self._sizes.values())
+
+    def _store(self, cache_key, value):
+        # Caller holds the lock
+        size = approx_size(cache_key) + approx_size(value)
+        self._bytes += size - self._sizes.get(cache_key, 0)
+        self._entries[cache_key] = value
+        self._sizes[cache_key] = size
+        if self.max_bytes is None:
+            return
+        # Oldest first (dicts keep insertion order); the new entry always stays
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes or key == cache_key:
+                break
+            del self._entries[key]
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def current_block(self):
+        """Latest block number, refreshed at most every ``block_poll_interval``."""
+        if self.block_source is not None:
+            block = self.block_source()
+            with self._lock:
+                if block != self._block:
+                    self._move_to(block)
+                return block
+
+        now = time.time()
+        with self._lock:
+            fresh = self._block is not None and now - self._block_checked_at < self.block_poll_interval
+            if fresh or (self._block_loading and self._block is not None):
+                return self._block
+            self._block_loading = True
+        try:
+            block = self.web3.eth.block_number
+        finally:
+            with self._lock:
+                self._block_loading = False
+        with self._lock:
+            self._block_checked_at = now
+            if block != self._block:
+                self._move_to(block)
+            return self._block
+
+    def get_or_load(self, key, loader, permanent=False):
+        """Return the cached value for ``key`` or call ``loader(block)`` once.
+
+        ``loader`` receives the block number the value is cached under (or
+        ``'latest'`` for permanent entries) and should read at that block.
+        """
+        if permanent:
+            cache_key, block = key, 'latest'
+        else:
+            block = self.current_block()
+            cache_key = (block, key)
+
+        owner = False
+        with self._lock:
+            # Look the store up under the lock: invalidate() swaps it
+            store = self._permanent if permanent else self._entries
+            generation = self._generation
+            if cache_key in store:
+                self.hits += 1
+                return store[cache_key]
+            pending = self._in_flight.get(cache_key)
+            if pending is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                pending = self._in_flight[cache_key] = _InFlight()
+                owner = True
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = loader(block)
+        except Exception as e:
+            pending.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        else:
+            with self._lock:
+                if permanent:
+                    self._permanent[cache_key] = pending.value
+                elif generation == self._generation and block >= self._block:
+                    # Not if invalidate() ran (or the block moved on) during the load
+                    self._store(cache_key, pending.value)
+        finally:
+            with self._lock:
+                if self._in_flight.get(cache_key) is pending:
+                    del self._in_flight[cache_key]
+            pending.event.set()
+        return pending.value
+
+    def call(self, contract, fn_name, *args):
+        """Cached ``contract.functions.<fn_name>(*args).call()``."""
+        permanent = fn_name in IMMUTABLE_FUNCTIONS
+        key = (contract.address, fn_name, args)
+        return self.get_or_load(
+            key,
+            lambda block: getattr(contract.functions, fn_name)(*args).call(block_identifier=block),
+            permanent=permanent)
+
+    def invalidate(self):
+        """Drop every per-block entry (e.g. when a contract event is seen)."""
+        with self._lock:
+            self._entries = {}
+            self._sizes = {}
+            self._bytes = 0
+            self._block_checked_at = 0.0
+            # Later misses start a fresh load instead of waiting on one from before
+            self._in_flight = {}
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "block": self._block,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+                "evictions": self.evictions,
+                "permanentEntries": len(self._permanent),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "invalidations": self.invalidations,
+                "hitRatio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,131 @@
+"""Throughput and latency of the read/auth routes as concurrent clients grow.
+
+Run the API in one mode, then point the load generator at it:
+
+    API_MODE=sync  gunicorn --config gunicorn.conf.py      # Flask (default)
+    API_MODE=async gunicorn --config gunicorn.conf.py      # aiohttp + AsyncWeb3
+    python -m benchmarks.bench_async_load --url http://127.0.0.1:5000 --label async
+
+For every concurrency level, ``--clients`` coroutines hit ``/candidates``,
+``/results`` and ``/api/check-auth`` back to back for ``--duration``
+seconds. A session for ``/api/check-auth`` is created first through
+``/api/nonce`` and ``/api/verify`` with a throwaway key. Pass ``--json``
+for machine-readable output (one record per route and concurrency level),
+e.g. to compare the sync and async runs.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+ROUTES = ('/candidates', '/results', '/api/check-auth')
+
+
+async def login(session, url):
+    account = Account.create()
+    async with session.post(f"{url}/api/nonce", json={"walletAddress": account.address}) as response:
+        data = await response.json()
+    message = f"Sign this message to authenticate: {data['nonce']}"
+    signature = Account.sign_message(encode_defunct(text=message), account.key).signature.hex()
+    async with session.post(f"{url}/api/verify", json={
+        "walletAddress": account.address,
+        "signature": signature,
+        "sessionToken": data['sessionToken'],
+    }) as response:
+        if response.status != 200:
+            raise SystemExit(f"Login failed: {await response.text()}")
+    return data['sessionToken']
+
+
+async def hit(session, url, route, session_token):
+    if route == '/api/check-auth':
+        request = session.post(f"{url}{route}", json={"sessionToken": session_token})
+    else:
+        request = session.get(f"{url}{route}")
+    async with request as response:
+        await response.read()
+        return response.status
+
+
+async def run_level(url, route, clients, duration, session_token):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    connector = aiohttp.TCPConnector(limit=clients)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await hit(session, url, route, session_token)
+                    if status >= 400:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+
+    return {
+        "route": route,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+async def run(args):
+    async with aiohttp.ClientSession() as session:
+        session_token = await login(session, args.url)
+
+    results = []
+    for route in args.routes:
+        # Warm caches and connection pools before measuring
+        await run_level(args.url, route, 1, 0.5, session_token)
+        for clients in args.clients:
+            results.append(await run_level(args.url, route, clients, args.duration, session_token))
+            if not args.json:
+                row = results[-1]
+                print(f"{args.label:>6} | {route:>15} | {clients:>7} | {row['rps']:>8.0f} | "
+                      f"{row['p50_ms']:>7.1f} | {row['p95_ms']:>7.1f} | {row['p99_ms']:>7.1f} | {row['errors']:>6}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--label', default='api', help="Name of the run in the output (e.g. sync/async)")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 50, 100, 200])
+    parser.add_argument('--routes', nargs='+', default=list(ROUTES))
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds per concurrency level")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    if not args.json:
+        print(f"{'mode':>6} | {'route':>15} | {'clients':>7} | {'req/s':>8} | "
+              f"{'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | {'errors':>6}")
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps({"label": args.label, "url": args.url, "results": results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Audit export throughput and memory against a synthetic eth_getLogs provider.
+
+    python -m benchmarks.bench_audit_export --votes 200000 --latency-ms 50
+
+The provider spreads ``--votes`` VoteCasted logs over ``--blocks`` blocks,
+answers each eth_getLogs after ``--latency-ms`` (plus a little per log) and,
+like Infura, refuses any range holding more than ``--max-results`` logs
+with "query returned more than N results". No node is needed.
+
+``parallelism`` - one export per ``--parallelism`` value: wall time, calls,
+splits (refused ranges) and final chunk size; parallel fetches hide the
+provider latency.
+
+``memory`` - exports of growing elections at the default parallelism,
+with tracemalloc's peak: it should stay flat as the vote count grows,
+since at most ``parallelism + 1`` chunks are held at a time.
+
+Pass ``--format`` to pick the output format and ``--json`` for
+machine-readable output.
+"""
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from backend.audit_export import FORMATS, VoteLogReader, export_votes
+
+CONTRACT = '0x8912ED01D24cba70A535598Af18C38C48e44c585'
+
+
+class SyntheticLogProvider:
+    def __init__(self, votes, blocks, latency, max_results, candidates=5):
+        self.votes = votes
+        self.blocks = blocks
+        self.latency = latency
+        self.max_results = max_results
+        self.candidates = candidates
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _first_vote_at(self, block):
+        # Vote i is in block (i * blocks) // votes
+        return min(self.votes, -(-block * self.votes // self.blocks))
+
+    def make_request(self, method, params):
+        with self._lock:
+            self.calls += 1
+        query = params[0]
+        from_block, to_block = int(query['fromBlock'], 16), int(query['toBlock'], 16)
+        first, last = self._first_vote_at(from_block), self._first_vote_at(to_block + 1)
+        if last - first > self.max_results:
+            time.sleep(self.latency)
+            return {"error": {"code": -32005, "message": f"query returned more than {self.max_results} results"}}
+        time.sleep(self.latency + (last - first) * 2e-7)
+        return {"result": [{
+            "blockNumber": hex(i * self.blocks // self.votes),
+            "logIndex": hex(i % 997),
+            "transactionHash": f"0x{i:064x}",
+            "data": f"0x{i + 1:064x}{i % self.candidates + 1:064x}",
+            "removed": False,
+        } for i in range(first, last)]}
+
+
+def run_export(votes, args, parallelism, trace_memory=False):
+    provider = SyntheticLogProvider(votes, args.blocks, args.latency_ms / 1000, args.max_results)
+    reader = VoteLogReader(SimpleNamespace(provider=provider), CONTRACT, parallelism=parallelism)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    size = 0
+    for chunk in export_votes(reader, args.format, 0, args.blocks - 1):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "votes": votes,
+        "parallelism": parallelism,
+        "seconds": elapsed,
+        "votes_per_second": votes / elapsed,
+        "bytes": size,
+        "peak_bytes": peak,
+        **reader.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--votes', type=int, default=200000)
+    parser.add_argument('--blocks', type=int, default=400000)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--max-results', type=int, default=10000)
+    parser.add_argument('--format', choices=sorted(FORMATS), default='jsonl')
+    parser.add_argument('--parallelism', default='1,2,4,8')
+    parser.add_argument('--memory-votes', default='10000,100000,400000')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    report = {
+        "parallelism": [run_export(args.votes, args, int(p)) for p in args.parallelism.split(',')],
+        "memory": [run_export(int(v), args, VoteLogReader(None, CONTRACT).parallelism, trace_memory=True)
+                   for v in args.memory_votes.split(',')],
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.votes} votes over {args.blocks} blocks, {args.latency_ms:g} ms per call, "
+          f"max {args.max_results} results, {args.format}")
+    print(f"{'parallel':>8} | {'seconds':>7} | {'votes/s':>8} | {'calls':>5} | {'splits':>6} | {'span':>6}")
+    for row in report["parallelism"]:
+        print(f"{row['parallelism']:>8} | {row['seconds']:>7.2f} | {row['votes_per_second']:>8.0f} | "
+              f"{row['calls']:>5} | {row['splits']:>6} | {row['span']:>6}")
+    print(f"\n{'votes':>8} | {'MB out':>7} | {'peak MB':>7} | {'calls':>5}")
+    for row in report["memory"]:
+        print(f"{row['votes']:>8} | {row['bytes'] / 1e6:>7.1f} | {row['peak_bytes'] / 1e6:>7.1f} | {row['calls']:>5}")
+
+
+if __name__ == '__main__':
+    main()
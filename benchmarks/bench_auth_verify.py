@@ -0,0 +1,96 @@
+"""Per-login CPU cost of signature verification, before and after.
+
+    python -m benchmarks.bench_auth_verify --logins 2000
+
+"before" is the original /api/verify path (``Web3.to_checksum_address``
+three times, ``encode_defunct`` + ``Account.recover_message``); "after" is
+``backend.auth_verify``, both single-login and via ``recover_batch``.
+No chain is needed. Pass ``--json`` for machine-readable output.
+"""
+import argparse
+import json
+import time
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from web3 import Web3
+
+from backend import auth_verify
+
+
+def make_logins(count):
+    logins = []
+    for i in range(count):
+        account = Account.create()
+        message = auth_verify.login_message(f"nonce{i:028d}")
+        signature = Account.sign_message(encode_defunct(text=message), account.key).signature.hex()
+        logins.append((account.address.lower(), message, signature))
+    return logins
+
+
+def verify_before(logins):
+    for address, message, signature in logins:
+        wallet = Web3.to_checksum_address(address)
+        stored = Web3.to_checksum_address(address)
+        assert wallet.lower() == Web3.to_checksum_address(stored).lower()
+        recovered = Account.recover_message(encode_defunct(text=message), signature=signature)
+        assert recovered.lower() == wallet.lower()
+
+
+def verify_after(logins):
+    for address, message, signature in logins:
+        wallet = auth_verify.checksum_address(address)
+        assert auth_verify.recover_address(message, signature) == wallet
+
+
+def verify_after_batch(logins):
+    results = auth_verify.recover_batch([(message, signature) for _, message, signature in logins])
+    for (address, _, _), (recovered, error) in zip(logins, results):
+        assert error is None and recovered == auth_verify.checksum_address(address)
+
+
+def measure(fn, logins):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    fn(logins)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return {
+        "wall_us_per_login": wall / len(logins) * 1e6,
+        "cpu_us_per_login": cpu / len(logins) * 1e6,
+        "logins_per_second": len(logins) / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    logins = make_logins(args.logins)
+    # Warm the process pool so its startup is not billed to the batch
+    auth_verify.recover_batch([(m, s) for _, m, s in logins[:auth_verify.BATCH_INLINE_THRESHOLD * 4]])
+
+    results = {
+        "backend": "coincurve" if auth_verify.coincurve is not None else "eth_keys",
+        "before": measure(verify_before, logins),
+        "after": measure(verify_after, logins),
+        "after_batch": measure(verify_after_batch, logins),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"secp256k1 backend: {results['backend']}, {args.logins} logins")
+    print(f"{'path':>12} | {'wall us/login':>13} | {'cpu us/login':>12} | {'logins/s':>9}")
+    for name in ('before', 'after', 'after_batch'):
+        row = results[name]
+        print(f"{name:>12} | {row['wall_us_per_login']:>13.1f} | {row['cpu_us_per_login']:>12.1f} | "
+              f"{row['logins_per_second']:>9.0f}")
+    print("(after_batch cpu is the calling process only; recovery runs in the pool)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare per-candidate view calls against the batched candidate read.
+
+    python -m benchmarks.bench_candidate_reads --sizes 1,10,50,200
+
+For each candidate count the table is read with the original
+``candidatesCount()`` + ``candidates(i)`` loop and with
+``backend.batch_reads.read_candidates``; round-trips and latency are
+reported for both. Pass ``--json`` for machine-readable output.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from backend.batch_reads import read_candidates
+from benchmarks.local_chain import DEFAULT_RPC_URL, CountingSession, add_candidates, connect, deploy_voting
+
+
+def read_sequential(contract):
+    voting_open = contract.functions.votingOpen().call()
+    count = contract.functions.candidatesCount().call()
+    candidates = [contract.functions.candidates(i).call() for i in range(1, count + 1)]
+    return candidates, voting_open
+
+
+def measure(fn, session, repeat):
+    timings = []
+    start_trips = session.round_trips
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "round_trips": (session.round_trips - start_trips) / repeat,
+        "median_ms": statistics.median(timings),
+        "max_ms": max(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rpc-url', default=DEFAULT_RPC_URL)
+    parser.add_argument('--sizes', default='1,10,50,200')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    session = CountingSession()
+    web3 = connect(args.rpc_url, session=session)
+    contract = deploy_voting(web3)
+
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        add_candidates(web3, contract, size - contract.functions.candidatesCount().call())
+        sequential = measure(lambda: read_sequential(contract), session, args.repeat)
+        batched = measure(lambda: read_candidates(web3, contract, session=session), session, args.repeat)
+        results.append({"candidates": size, "sequential": sequential, "batched": batched})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'candidates':>10} | {'seq trips':>9} {'seq ms':>8} | {'batch trips':>11} {'batch ms':>8} | {'speedup':>7}")
+    for row in results:
+        seq, bat = row['sequential'], row['batched']
+        print(f"{row['candidates']:>10} | {seq['round_trips']:>9.0f} {seq['median_ms']:>8.2f} | "
+              f"{bat['round_trips']:>11.0f} {bat['median_ms']:>8.2f} | "
+              f"{seq['median_ms'] / bat['median_ms']:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
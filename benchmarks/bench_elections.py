@@ -0,0 +1,171 @@
+"""Upstream RPC cost of serving many elections from one registry.
+
+    python -m benchmarks.bench_elections --elections 1,5,10 --seconds 10
+
+Needs a local chain (``npx hardhat node`` or ``anvil``). The largest
+``--elections`` count of Voting contracts is deployed, then for each count:
+
+``separate`` - one stack per election, as N single-contract deployments
+of the API would run: its own view cache polling ``eth_blockNumber`` and
+results snapshot, re-read on every new block.
+
+``registry`` - the same elections behind one ``ElectionRegistry``: one
+block clock, one multi-address ``eth_getLogs`` per watch interval, and
+idle elections kept at the block of their last event.
+
+While a run lasts, a block is mined every ``--block-interval`` seconds;
+``--active`` of the elections get an event (a new candidate) in turns,
+the others only see empty blocks. Every ``--poll-interval`` seconds each
+election's results and ``votingOpen`` are read, as a client polling
+``/results`` would. Reported: upstream round trips per second, in total
+and per election.
+
+``budget`` - fills one election's view cache with distinct ``voters``
+entries (no chain calls) and shows it staying under
+``ELECTION_CACHE_BUDGET`` by evicting the oldest entries.
+
+Uses a throw-away ``DATA_DIR``. Pass ``--json`` for machine-readable
+output.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix='bench-elections-')
+os.environ['DATA_DIR'] = DATA_DIR
+
+from web3 import Web3  # noqa: E402
+
+from backend import elections as registry_module  # noqa: E402
+from backend.elections import Election, ElectionRegistry  # noqa: E402
+from backend.rpc_provider import build_provider  # noqa: E402
+from backend.view_cache import ViewCache  # noqa: E402
+from benchmarks.local_chain import DEFAULT_RPC_URL, add_candidates, connect, deploy_voting  # noqa: E402
+
+
+def upstream_requests(web3):
+    return sum(endpoint.requests for endpoint in web3.provider.endpoints)
+
+
+def build_separate(web3, contracts):
+    elections = [Election(f"e{i}", web3.eth.contract(address=c.address, abi=c.abi), ViewCache(web3))
+                 for i, c in enumerate(contracts)]
+    return elections, None
+
+
+def build_registry(web3, contracts):
+    registry = ElectionRegistry(web3, clock=ViewCache(web3),
+                                path=os.path.join(DATA_DIR, f"elections-{len(contracts)}.sqlite3"),
+                                configured={f"e{i}": c.address for i, c in enumerate(contracts)})
+    registry.reload()
+    return registry.all(), registry
+
+
+def run(args, chain, contracts, mode):
+    web3 = Web3(build_provider(args.rpc_url))
+    elections, registry = (build_registry if mode == 'registry' else build_separate)(web3, contracts)
+    stop = threading.Event()
+    blocks = [0]
+
+    def mine():
+        turn = 0
+        while not stop.wait(args.block_interval):
+            if args.active:
+                add_candidates(chain, contracts[turn % min(args.active, len(contracts))], 1, prefix='Bench')
+                turn += 1
+            else:
+                chain.eth.send_transaction({'from': chain.eth.accounts[1], 'to': chain.eth.accounts[2], 'value': 1})
+            blocks[0] += 1
+
+    def watch():
+        while not stop.wait(registry_module.ELECTION_WATCH_INTERVAL):
+            registry.poll_once()
+
+    threads = [threading.Thread(target=mine, daemon=True)]
+    if registry is not None:
+        registry.poll_once()
+        threads.append(threading.Thread(target=watch, daemon=True))
+    for election in elections:
+        election.results_snapshot()
+
+    before = upstream_requests(web3)
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    reads = 0
+    while time.perf_counter() - started < args.seconds:
+        for election in elections:
+            election.results_snapshot()
+            election.view_cache.call(election.contract, 'votingOpen')
+            reads += 1
+        time.sleep(args.poll_interval)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    calls = upstream_requests(web3) - before
+    return {
+        "mode": mode,
+        "elections": len(elections),
+        "seconds": elapsed,
+        "blocks": blocks[0],
+        "client_reads": reads,
+        "rpc_calls": calls,
+        "rpc_per_second": calls / elapsed,
+        "rpc_per_election_second": calls / elapsed / len(elections),
+    }
+
+
+def bench_budget(args):
+    cache = ViewCache(None, block_source=lambda: 1, max_bytes=args.budget)
+    for i in range(args.budget_entries):
+        cache.get_or_load(('voters', f"0x{i:040x}"), lambda block: (False, True, 0))
+    stats = cache.stats()
+    return {"budget": args.budget, "entries_loaded": args.budget_entries, "entries_kept": stats["entries"],
+            "bytes": stats["bytes"], "evictions": stats["evictions"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rpc-url', default=DEFAULT_RPC_URL)
+    parser.add_argument('--elections', default='1,5,10')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--block-interval', type=float, default=1)
+    parser.add_argument('--poll-interval', type=float, default=0.25)
+    parser.add_argument('--active', type=int, default=1, help="Elections that get events (0 = empty blocks only)")
+    parser.add_argument('--budget', type=int, default=registry_module.ELECTION_CACHE_BUDGET)
+    parser.add_argument('--budget-entries', type=int, default=20000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.elections.split(',')]
+    chain = connect(args.rpc_url)
+    contracts = [deploy_voting(chain) for _ in range(max(counts))]
+    for contract in contracts:
+        add_candidates(chain, contract, 3)
+
+    report = {
+        "runs": [run(args, chain, contracts[:n], mode) for n in counts for mode in ('separate', 'registry')],
+        "budget": bench_budget(args),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"block every {args.block_interval:g}s, {args.active} active election(s), "
+          f"reads every {args.poll_interval:g}s, {args.seconds:g}s per run")
+    print(f"{'mode':>9} | {'elections':>9} | {'seconds':>7} | {'blocks':>6} | {'rpc/s':>6} | {'rpc/s/election':>14}")
+    for row in report["runs"]:
+        print(f"{row['mode']:>9} | {row['elections']:>9} | {row['seconds']:>7.1f} | {row['blocks']:>6} | "
+              f"{row['rpc_per_second']:>6.1f} | {row['rpc_per_election_second']:>14.2f}")
+    budget = report["budget"]
+    print(f"\nbudget {budget['budget']} bytes: {budget['entries_loaded']} entries loaded, "
+          f"{budget['entries_kept']} kept ({budget['bytes']} bytes), {budget['evictions']} evicted")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Per-request cost of instrumentation, with tracing off and on.
+
+    python -m benchmarks.bench_instrumentation --requests 200000
+
+Measures ``start_request``/``finish_request`` and ``record_rpc`` on their
+own, then the same Flask route served through the test client with
+no hooks, with the old debug prints (method, path, header dicts; stdout
+sent to /dev/null) and with instrumentation. No chain is needed. Pass
+``--json`` for machine-readable output.
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+
+from flask import Flask, jsonify, request
+
+from backend import instrumentation
+
+
+def per_call_us(fn, count):
+    start = time.perf_counter()
+    fn(count)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def bare_hooks(count):
+    for _ in range(count):
+        instrumentation.start_request()
+        instrumentation.finish_request('GET', '/results', 200)
+
+
+def rpc_hook(count):
+    instrumentation.start_request()
+    for _ in range(count):
+        instrumentation.record_rpc('eth_call', 0.001)
+    instrumentation.finish_request('GET', '/results', 200)
+
+
+def make_app(mode):
+    app = Flask(__name__)
+
+    if mode == 'debug_prints':
+        @app.before_request
+        def before_request():
+            print(f"→ {request.method} {request.path}")
+            print(f"→ Headers: {dict(request.headers)}")
+
+        @app.after_request
+        def after_request(response):
+            print(f"← Status: {response.status}")
+            print(f"← Response Headers: {dict(response.headers)}")
+            return response
+
+    elif mode == 'instrumented':
+        @app.before_request
+        def before_request():
+            instrumentation.start_request()
+
+        @app.after_request
+        def after_request(response):
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            instrumentation.finish_request(request.method, route, response.status_code,
+                                           details=lambda: {"headers": dict(request.headers)})
+            return response
+
+    @app.route('/results')
+    def results():
+        return jsonify({"votingOpen": True, "candidates": []})
+
+    return app
+
+
+def flask_us(modes, count, rounds=5):
+    """Best-of-``rounds`` us/request per mode; modes are interleaved to cancel drift."""
+    headers = {"User-Agent": "bench", "Accept": "application/json", "Origin": "http://localhost:5173"}
+    clients = {mode: make_app(mode).test_client() for mode in modes}
+    best = {}
+
+    for _ in range(rounds):
+        for mode, client in clients.items():
+            def run(n):
+                for _ in range(n):
+                    client.get('/results', headers=headers)
+
+            run(100)
+            us = per_call_us(run, max(1, count // rounds))
+            best[mode] = min(us, best.get(mode, us))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--flask-requests', type=int, default=20000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        instrumentation.TRACE_SAMPLE_RATE = 0
+        results["hooks_us_sampling_off"] = per_call_us(bare_hooks, args.requests)
+        results["rpc_hook_us"] = per_call_us(rpc_hook, args.requests)
+        instrumentation.TRACE_SAMPLE_RATE = 1.0
+        results["hooks_us_sampling_all"] = per_call_us(bare_hooks, args.requests // 10)
+        instrumentation.TRACE_SAMPLE_RATE = 0
+
+        for mode, us in flask_us(('no_hooks', 'debug_prints', 'instrumented'), args.flask_requests).items():
+            results[f"flask_us_{mode}"] = us
+
+    results["flask_overhead_us_instrumented"] = results["flask_us_instrumented"] - results["flask_us_no_hooks"]
+    results["flask_overhead_us_debug_prints"] = results["flask_us_debug_prints"] - results["flask_us_no_hooks"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"instrumentation hooks, sampling off: {results['hooks_us_sampling_off']:.2f} us/request")
+    print(f"instrumentation hooks, every request traced: {results['hooks_us_sampling_all']:.2f} us/request")
+    print(f"per upstream RPC call: {results['rpc_hook_us']:.2f} us")
+    print(f"{'flask route':>14} | {'us/request':>10} | {'overhead us':>11}")
+    for mode in ('no_hooks', 'debug_prints', 'instrumented'):
+        total = results[f"flask_us_{mode}"]
+        print(f"{mode:>14} | {total:>10.1f} | {total - results['flask_us_no_hooks']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
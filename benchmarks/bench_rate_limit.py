@@ -0,0 +1,120 @@
+"""Rate limiter overhead under a flood of distinct clients.
+
+    python -m benchmarks.bench_rate_limit --requests 200000 --processes 4
+
+``table`` - ``RateLimiter.check`` on the ``/vote`` policies (IP + wallet)
+for floods of 100, 10k and 1M distinct clients, from ``--processes``
+processes sharing one table. Time per check (CPU time of each process, so
+it does not depend on how many cores the processes share) should stay flat
+as the number of clients grows past the table size (``--slots``), while
+the table stays the same size and evictions absorb the excess.
+
+``app`` - ``/api/nonce`` through the Flask test client from a single IP,
+with the limiter on and off: once the bucket is empty, a request costs a
+table lookup and a 429 instead of a session write, and the session store
+stops growing.
+
+Uses a throw-away ``DATA_DIR``; no node is needed. Pass ``--json`` for
+machine-readable output.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+DATA_DIR = tempfile.mkdtemp(prefix='bench-rate-limit-')
+os.environ['DATA_DIR'] = DATA_DIR
+os.environ.setdefault('RPC_URLS', 'http://127.0.0.1:9')
+
+from backend.rate_limit import RateLimited, RateLimiter, load_policies  # noqa: E402
+
+CLIENT_COUNTS = (100, 10000, 1000000)
+
+
+def flood(path, slots, clients, requests, seed, results):
+    limiter = RateLimiter(policies=load_policies(), path=path, slots=slots, enabled=True)
+    limited = 0
+    start = time.process_time()
+    for i in range(requests):
+        n = (i * 7919 + seed) % clients
+        try:
+            limiter.check('/vote', ip=f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}", wallet=f"0x{n:040x}")
+        except RateLimited:
+            limited += 1
+    results.put(((time.process_time() - start) / requests * 1e6, limited, limiter.table.evictions))
+
+
+def bench_table(args):
+    rows = []
+    for clients in CLIENT_COUNTS:
+        path = os.path.join(DATA_DIR, f"table-{clients}.bin")
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=flood, args=(path, args.slots, clients,
+                                                               args.requests // args.processes, seed, results))
+                   for seed in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        outcomes = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        rows.append({
+            "clients": clients,
+            "cpu_us_per_check": sum(o[0] for o in outcomes) / len(outcomes),
+            "limited": sum(o[1] for o in outcomes),
+            "evictions": sum(o[2] for o in outcomes),
+            "table_bytes": os.path.getsize(path),
+        })
+    return rows
+
+
+def bench_app(args):
+    from backend import app as api
+    rows = []
+    for enabled in (False, True):
+        api.rate_limiter.enabled = enabled
+        client = api.app.test_client()
+        before = len(api.session_store)
+        statuses = {}
+        start = time.perf_counter()
+        for i in range(args.app_requests):
+            response = client.post('/api/nonce', json={'walletAddress': '0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf'},
+                                   environ_base={'REMOTE_ADDR': '203.0.113.7'})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        rows.append({
+            "limiter": "on" if enabled else "off",
+            "us_per_request": (time.perf_counter() - start) / args.app_requests * 1e6,
+            "statuses": statuses,
+            "sessions_added": len(api.session_store) - before,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000, help="Checks per flood (split across processes)")
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--slots', type=int, default=65536)
+    parser.add_argument('--app-requests', type=int, default=2000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    report = {"table": bench_table(args), "app": bench_app(args)}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"/vote policies, {args.processes} processes, {args.slots} slots")
+    print(f"{'clients':>9} | {'cpu us/check':>12} | {'limited':>8} | {'evictions':>9} | {'table bytes':>11}")
+    for row in report["table"]:
+        print(f"{row['clients']:>9} | {row['cpu_us_per_check']:>12.1f} | {row['limited']:>8} | "
+              f"{row['evictions']:>9} | {row['table_bytes']:>11}")
+    print(f"\n/api/nonce flood from one IP, {args.app_requests} requests")
+    print(f"{'limiter':>7} | {'us/request':>10} | {'sessions added':>14} | statuses")
+    for row in report["app"]:
+        print(f"{row['limiter']:>7} | {row['us_per_request']:>10.0f} | {row['sessions_added']:>14} | {row['statuses']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Cost of serving ``/results`` from a pre-encoded snapshot vs. ``jsonify``.
+
+    python -m benchmarks.bench_results_snapshot --candidates 50 --requests 20000
+
+Both routes serve the same in-memory candidate table through the Flask
+test client, so only encoding/compression/response building is measured
+(no chain or index reads). ``jsonify_gzip`` compresses per request, the way
+a compressing proxy would; ``snapshot_304`` is a revalidation with
+``If-None-Match``. No chain is needed. Pass ``--json`` for machine-readable
+output.
+"""
+import argparse
+import gzip
+import json
+import time
+
+from flask import Flask, Response, jsonify, request
+
+from backend.results_snapshot import SnapshotEngine, results_payload
+
+
+def make_app(candidates):
+    app = Flask(__name__)
+    engine = SnapshotEngine(refresh_interval=3600)
+    engine.publish(results_payload(candidates, False), final=True)
+
+    @app.route('/jsonify')
+    def plain():
+        return jsonify(results_payload(candidates, False))
+
+    @app.route('/jsonify_gzip')
+    def plain_gzip():
+        response = jsonify(results_payload(candidates, False))
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    @app.route('/snapshot')
+    def snapshot():
+        status, body, headers = engine.current().respond(request.headers.get('Accept-Encoding'),
+                                                         request.headers.get('If-None-Match'))
+        return Response(body, status=status, headers=headers, mimetype='application/json')
+
+    return app, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--candidates', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    candidates = [{"id": i, "name": f"Candidate {i}", "voteCount": i * 37} for i in range(1, args.candidates + 1)]
+    app, engine = make_app(candidates)
+    client = app.test_client()
+    etag = engine.current().etag('gzip')
+
+    cases = {
+        "jsonify": ('/jsonify', {}),
+        "jsonify_gzip": ('/jsonify_gzip', {"Accept-Encoding": "gzip"}),
+        "snapshot_identity": ('/snapshot', {}),
+        "snapshot_gzip": ('/snapshot', {"Accept-Encoding": "gzip, br"}),
+        "snapshot_304": ('/snapshot', {"Accept-Encoding": "gzip, br", "If-None-Match": etag}),
+    }
+
+    results = {"candidates": args.candidates, "body_bytes": len(engine.current().body),
+               "encodings": engine.stats()["encodings"]}
+    for name, (path, headers) in cases.items():
+        for _ in range(200):
+            client.get(path, headers=headers)
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client.get(path, headers=headers)
+        results[f"{name}_us"] = (time.perf_counter() - start) / args.requests * 1e6
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.candidates} candidates, body {results['body_bytes']} bytes, encoded {results['encodings']}")
+    for name in cases:
+        print(f"{name:>18} | {results[f'{name}_us']:>8.1f} us/request")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Failover and hedged reads of the RPC layer against stand-in endpoints.
+
+    python -m benchmarks.bench_rpc_failover --calls 300
+
+Starts local JSON-RPC stand-ins that answer ``eth_blockNumber`` (and
+batches of it) with configurable latency: a "flaky" primary whose
+responses now and then take ``--slow-ms``, a steady backup, and a "down"
+endpoint that always returns HTTP 503. The same read sequence is timed
+through a plain ``Web3.HTTPProvider`` on the flaky endpoint ("before") and
+through ``MultiEndpointProvider`` over all three ("after"). No chain is
+needed. Pass ``--json`` for machine-readable output.
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from web3 import Web3
+
+from backend.rpc_provider import MultiEndpointProvider
+
+
+class StandIn:
+    """JSON-RPC stand-in on a random local port."""
+
+    def __init__(self, base_ms=5, slow_ms=0, slow_ratio=0.0, status=200, seed=0):
+        self.base_ms = base_ms
+        self.slow_ms = slow_ms
+        self.slow_ratio = slow_ratio
+        self.status = status
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                payload = stand_in.respond(body)
+                self.send_response(stand_in.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, body):
+        with self._lock:
+            self.requests += 1
+            slow = self._random.random() < self.slow_ratio
+        time.sleep((self.slow_ms if slow else self.base_ms) / 1000)
+        if self.status != 200:
+            return b'{"error": "unavailable"}'
+        items = body if isinstance(body, list) else [body]
+        results = [{"jsonrpc": "2.0", "id": item['id'], "result": hex(1000)} for item in items]
+        return json.dumps(results if isinstance(body, list) else results[0]).encode()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def run(web3, calls):
+    latencies = []
+    errors = 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            web3.eth.block_number
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "calls": calls,
+        "errors": errors,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "total_s": sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--slow-ms', type=int, default=500)
+    parser.add_argument('--slow-ratio', type=float, default=0.03)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    down = StandIn(status=503)
+    flaky = StandIn(base_ms=5, slow_ms=args.slow_ms, slow_ratio=args.slow_ratio, seed=1)
+    backup = StandIn(base_ms=12, seed=2)
+
+    before = run(Web3(Web3.HTTPProvider(flaky.url)), args.calls)
+
+    # The dead endpoint is listed first: it must be benched after a few failures
+    provider = MultiEndpointProvider([down.url, flaky.url, backup.url])
+    after = run(Web3(provider), args.calls)
+    after["down_endpoint_requests"] = down.requests
+    after.update({k: v for k, v in provider.stats().items() if k != 'endpoints'})
+
+    for stand_in in (down, flaky, backup):
+        stand_in.close()
+
+    results = {"before": before, "after": after}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.calls} eth_blockNumber calls; primary stalls {args.slow_ms} ms on "
+          f"{args.slow_ratio:.0%} of requests, one endpoint is down")
+    print(f"{'provider':>8} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | {'max ms':>7} | {'errors':>6}")
+    for name, row in results.items():
+        print(f"{name:>8} | {row['p50_ms']:>7.1f} | {row['p95_ms']:>7.1f} | {row['p99_ms']:>7.1f} | "
+              f"{row['max_ms']:>7.1f} | {row['errors']:>6}")
+    print(f"hedged {after['hedged']} calls ({after['hedgeWins']} won by the backup), "
+          f"{after['failovers']} failovers, down endpoint hit {after['down_endpoint_requests']} times")
+
+
+if __name__ == '__main__':
+    main()
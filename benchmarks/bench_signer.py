@@ -0,0 +1,86 @@
+"""CPU time per signed transaction: old per-request path vs. ``SignerService``.
+
+    python -m benchmarks.bench_signer --transactions 2000
+
+``old`` repeats what each write endpoint used to do: derive the account
+from the private key, ``build_transaction`` with a fixed chain id and gas
+price, then ``sign_transaction``. ``signer`` is ``SignerService.sign`` with
+its cached key, selectors and chain id (EIP-1559 and legacy fees). Every
+function the API writes is measured (``vote``, ``registerVoter``,
+``addCandidate``, ``startVoting``, ``endVoting``). Times are process CPU
+time, so no node is needed (nothing is sent). Pass ``--json`` for
+machine-readable output.
+"""
+import argparse
+import json
+import time
+
+from eth_account import Account
+from web3 import Web3
+
+from backend.chain import DEFAULT_CONTRACT_ADDRESS, contract_abi
+from backend.signer import SignerService
+
+PRIVATE_KEY = '0x' + '11' * 32
+CHAIN_ID = 11155111
+GAS = 300000
+CALLS = {
+    'vote': [3],
+    'registerVoter': ['0x7E5F4552091A69125d5DfCb7b8C2659029395Bdf'],
+    'addCandidate': ['Candidate 42'],
+    'startVoting': [],
+    'endVoting': [],
+}
+
+
+def cpu_us(fn, count):
+    start = time.process_time()
+    for nonce in range(count):
+        fn(nonce)
+    return (time.process_time() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=2000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    # Never contacted: chain id and fees are given
+    web3 = Web3(Web3.HTTPProvider('http://127.0.0.1:9'))
+    contract = web3.eth.contract(address=DEFAULT_CONTRACT_ADDRESS, abi=contract_abi())
+    signer = SignerService(web3, contract, Account.from_key(PRIVATE_KEY), chain_id=CHAIN_ID)
+    max_fee, priority_fee = 30 * 10 ** 9, 15 * 10 ** 8
+
+    results = {}
+    for fn_name, fn_args in CALLS.items():
+        def old(nonce):
+            account = web3.eth.account.from_key(PRIVATE_KEY)
+            tx = getattr(contract.functions, fn_name)(*fn_args).build_transaction({
+                'chainId': CHAIN_ID, 'gas': GAS, 'gasPrice': 10 ** 10, 'nonce': nonce})
+            web3.eth.account.sign_transaction(tx, private_key=account.key)
+
+        def new_1559(nonce):
+            signer.sign(fn_name, fn_args, nonce, GAS, max_fee, priority_fee)
+
+        def new_legacy(nonce):
+            signer.sign(fn_name, fn_args, nonce, GAS, 10 ** 10)
+
+        results[fn_name] = {
+            "old_us": cpu_us(old, args.transactions),
+            "signer_1559_us": cpu_us(new_1559, args.transactions),
+            "signer_legacy_us": cpu_us(new_legacy, args.transactions),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'function':>14} | {'old us':>8} | {'1559 us':>8} | {'legacy us':>9} | {'speedup':>7}")
+    for fn_name, row in results.items():
+        print(f"{fn_name:>14} | {row['old_us']:>8.0f} | {row['signer_1559_us']:>8.0f} | "
+              f"{row['signer_legacy_us']:>9.0f} | {row['old_us'] / row['signer_1559_us']:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Cold-start time of the API: import, app creation and chain client setup.
+
+    python -m benchmarks.bench_startup --runs 10
+    python -m benchmarks.bench_startup --ready --rpc-url http://127.0.0.1:8545
+
+Every run is a fresh interpreter (``sys.executable``) with an empty
+``DATA_DIR``, and times each startup phase separately:
+
+* ``import_ms`` - ``import backend.app`` (what ``--preload`` pays in the
+  gunicorn master);
+* ``create_app_ms`` - one more ``create_app()``;
+* ``warm_up_ms`` - ``chain.warm_up()``: importing web3 and building the
+  provider, contract and signer (what each worker pays after the fork);
+* ``ready_ms`` - with ``--ready``, the first ``/api/health/ready`` through
+  the test client, which needs a reachable node at ``--rpc-url``;
+* ``process_ms`` - wall time of the whole child process, interpreter
+  start-up included.
+
+Reports the median and minimum of each phase plus the heavy packages
+already loaded after the import. Pass ``--module backend.async_app`` to
+time the aiohttp app instead, and ``--json`` for machine-readable output.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('web3', 'eth_account', 'eth_abi', 'aiohttp')
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module} as api
+t1 = time.perf_counter()
+from backend import app as sync_api, chain
+sync_api.create_app()
+t2 = time.perf_counter()
+loaded = [m for m in {heavy!r} if m in sys.modules]
+chain.warm_up()
+t3 = time.perf_counter()
+result = {{"import_ms": (t1 - t0) * 1000, "create_app_ms": (t2 - t1) * 1000,
+          "warm_up_ms": (t3 - t2) * 1000, "loaded_at_import": loaded}}
+if {ready}:
+    response = sync_api.app.test_client().get('/api/health/ready')
+    result["ready_ms"] = (time.perf_counter() - t3) * 1000
+    result["ready_status"] = response.status_code
+print(json.dumps(result))
+"""
+
+
+def run_once(args):
+    env = dict(os.environ, DATA_DIR=tempfile.mkdtemp(prefix='bench-startup-'), RPC_URLS=args.rpc_url)
+    code = CHILD.format(module=args.module, heavy=HEAVY_MODULES, ready=args.ready)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    elapsed = (time.perf_counter() - start) * 1000
+    if output.returncode != 0:
+        raise SystemExit(f"Startup failed:\n{output.stderr}")
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result["process_ms"] = elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--module', default='backend.app')
+    parser.add_argument('--ready', action='store_true', help="Also time the first /api/health/ready")
+    parser.add_argument('--rpc-url', default='http://127.0.0.1:8545')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    runs = [run_once(args) for _ in range(args.runs)]
+    phases = ['import_ms', 'create_app_ms', 'warm_up_ms'] + (['ready_ms'] if args.ready else []) + ['process_ms']
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "loaded_at_import": runs[0]["loaded_at_import"],
+        "phases": {phase: {"median": statistics.median(r[phase] for r in runs),
+                           "min": min(r[phase] for r in runs)} for phase in phases},
+    }
+    if args.ready:
+        report["ready_status"] = runs[-1]["ready_status"]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.module}, {args.runs} cold starts")
+    print(f"{'phase':>14} | {'median ms':>9} | {'min ms':>7}")
+    for phase in phases:
+        print(f"{phase:>14} | {report['phases'][phase]['median']:>9.1f} | {report['phases'][phase]['min']:>7.1f}")
+    print(f"heavy packages loaded by the import: {', '.join(report['loaded_at_import']) or 'none'}")
+    if args.ready:
+        print(f"/api/health/ready: {report['ready_status']}")
+
+
+if __name__ == '__main__':
+    main()
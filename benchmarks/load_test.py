@@ -0,0 +1,344 @@
+"""End-to-end load test of the API against a local chain.
+
+    npx hardhat node                      # or: anvil
+    python -m benchmarks.load_test --candidates 10 --voters 200 --concurrency 1 10 50 --output load.json
+
+Deploys a fresh ``Voting`` with the node's first account, adds
+``--candidates`` candidates, registers ``--voters`` throwaway wallets and
+opens voting. Then it starts the API with ``gunicorn.conf.py`` (pointed at
+the new contract through ``CONTRACT_ADDRESS``, ``CHAIN_ID``, ``PRIVATE_KEY``
+and ``RPC_URLS``; ``--mode async`` for the aiohttp app) unless ``--api-url``
+names a server that is already running.
+
+For each ``--concurrency`` level, that many clients run every voter's flow
+once: ``/api/nonce`` -> ``/api/verify`` -> ``/vote`` -> ``/results``. The
+report gives per-endpoint throughput, p50/p95/p99 latency, errors, rate
+limited requests (429, counted apart from errors) and upstream RPC calls
+per request (from the API's ``/metrics``), plus the
+final status of the submitted vote transactions. Note that the contract
+records every API vote under the admin account, so only the first vote
+of a fresh deployment can confirm; the others are refused by the
+eligibility pre-flight (409, counted as ``/vote`` errors) instead of being
+sent as transactions that fail.
+
+Every client comes from 127.0.0.1, so the started API runs with
+``RATE_LIMIT_ENABLED=0`` unless ``--rate-limits`` is given; otherwise the
+per-IP limits would turn most of the run into 429s.
+
+``--json`` prints the report as JSON and ``--output`` writes it to a file.
+Either one records the commit and settings, so runs can be compared
+across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from benchmarks.local_chain import (DEFAULT_ADMIN_KEY, DEFAULT_RPC_URL, add_candidates, connect, deploy_voting,
+                                    register_voters, start_voting)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ('/api/nonce', '/api/verify', '/vote', '/results')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+
+# -- setup ------------------------------------------------------------------
+
+def seed_chain(args):
+    web3 = connect(args.rpc_url)
+    admin = Account.from_key(args.admin_key).address
+    if admin != web3.eth.accounts[0]:
+        raise SystemExit(f"--admin-key is for {admin}, but the node's first account is {web3.eth.accounts[0]}")
+
+    contract = deploy_voting(web3)
+    add_candidates(web3, contract, args.candidates)
+    voters = [Account.create() for _ in range(args.voters)]
+    register_voters(web3, contract, [voter.address for voter in voters])
+    start_voting(web3, contract)
+    return web3, contract, voters
+
+
+def start_api(args, web3, contract, data_dir):
+    port = args.port
+    env = dict(os.environ,
+               CONTRACT_ADDRESS=contract.address,
+               CHAIN_ID=str(web3.eth.chain_id),
+               PRIVATE_KEY=args.admin_key,
+               RPC_URLS=args.rpc_url,
+               DATA_DIR=data_dir,
+               PORT=str(port),
+               WEB_CONCURRENCY=str(args.workers),
+               METRICS_FLUSH_INTERVAL='1',
+               API_MODE=args.mode,
+               RATE_LIMIT_ENABLED='1' if args.rate_limits else '0',
+               PYTHONPATH=REPO_ROOT)
+    if args.worker_class:
+        env['GUNICORN_WORKER_CLASS'] = args.worker_class
+
+    log = open(os.path.join(data_dir, 'api.log'), 'w')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+                               cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}", log.name
+
+
+async def wait_until_ready(url, process, timeout=60):
+    deadline = time.time() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.time() < deadline:
+            if process is not None and process.poll() is not None:
+                raise SystemExit("API exited during startup")
+            try:
+                async with session.get(f"{url}/api/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"API at {url} not ready after {timeout}s")
+
+
+# -- metrics ----------------------------------------------------------------
+
+async def scrape_route_counters(session, url):
+    """Requests and upstream RPC calls per route, summed over method/status."""
+    requests_by_route = defaultdict(float)
+    rpc_by_route = defaultdict(float)
+    try:
+        async with session.get(f"{url}/metrics") as response:
+            if response.status != 200:
+                return None
+            text = await response.text()
+    except aiohttp.ClientError:
+        return None
+
+    for line in text.splitlines():
+        if line.startswith('#') or '{' not in line:
+            continue
+        name, rest = line.split('{', 1)
+        labels, value = rest.rsplit('} ', 1)
+        route = next((part.split('=', 1)[1].strip('"') for part in labels.split(',')
+                      if part.startswith('route=')), None)
+        if name == 'http_request_duration_seconds_count':
+            requests_by_route[route] += float(value)
+        elif name == 'http_request_rpc_calls_total':
+            rpc_by_route[route] += float(value)
+    return requests_by_route, rpc_by_route
+
+
+# -- load -------------------------------------------------------------------
+
+async def voter_flow(session, url, voter, candidates, samples, errors, limited, tx_ids):
+    async def timed(endpoint, method, **kwargs):
+        start = time.perf_counter()
+        status = None
+        try:
+            async with session.request(method, f"{url}{endpoint}", **kwargs) as response:
+                status = response.status
+                body = await response.json(content_type=None)
+                ok = response.status < 400
+        except Exception:
+            body, ok = None, False
+        samples[endpoint].append(time.perf_counter() - start)
+        if status == 429:
+            limited[endpoint] += 1
+        elif not ok:
+            errors[endpoint] += 1
+        return body if ok else None
+
+    nonce = await timed('/api/nonce', 'POST', json={"walletAddress": voter.address})
+    if nonce is None:
+        return
+    message = f"Sign this message to authenticate: {nonce['nonce']}"
+    signature = Account.sign_message(encode_defunct(text=message), voter.key).signature.hex()
+    verified = await timed('/api/verify', 'POST', json={
+        "walletAddress": voter.address,
+        "signature": signature,
+        "sessionToken": nonce['sessionToken'],
+    })
+    if verified is None:
+        return
+    vote = await timed('/vote', 'POST', json={
+        "sessionToken": nonce['sessionToken'],
+        "candidateId": random.randint(1, candidates),
+    })
+    if vote is not None and vote.get('txId'):
+        tx_ids.append(vote['txId'])
+    await timed('/results', 'GET')
+
+
+async def run_level(url, voters, concurrency, candidates, tx_ids):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    limited = defaultdict(int)
+    queue = asyncio.Queue()
+    for voter in voters:
+        queue.put_nowait(voter)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        before = await scrape_route_counters(session, url)
+
+        async def client():
+            while not queue.empty():
+                await voter_flow(session, url, queue.get_nowait(), candidates, samples, errors, limited, tx_ids)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        # Let every worker flush its counters before the second scrape
+        await asyncio.sleep(1.5)
+        after = await scrape_route_counters(session, url)
+
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        ordered = sorted(samples[endpoint])
+        rpc_per_request = None
+        if before is not None and after is not None:
+            served = after[0][endpoint] - before[0][endpoint]
+            if served:
+                rpc_per_request = (after[1][endpoint] - before[1][endpoint]) / served
+        endpoints[endpoint] = {
+            "requests": len(ordered),
+            "errors": errors[endpoint],
+            "rate_limited": limited[endpoint],
+            "rps": len(ordered) / elapsed if elapsed else None,
+            "p50_ms": percentile(ordered, 0.50),
+            "p95_ms": percentile(ordered, 0.95),
+            "p99_ms": percentile(ordered, 0.99),
+            "rpc_calls_per_request": rpc_per_request,
+        }
+    return {
+        "concurrency": concurrency,
+        "flows": len(voters),
+        "wall_s": elapsed,
+        "flows_per_s": len(voters) / elapsed if elapsed else None,
+        "endpoints": endpoints,
+    }
+
+
+async def tx_statuses(url, tx_ids):
+    statuses = defaultdict(int)
+    async with aiohttp.ClientSession() as session:
+        async def one(tx_id):
+            try:
+                async with session.get(f"{url}/api/tx/{tx_id}") as response:
+                    statuses[(await response.json()).get('status', 'unknown')] += 1
+            except Exception:
+                statuses['unknown'] += 1
+        await asyncio.gather(*(one(tx_id) for tx_id in tx_ids))
+    return dict(statuses)
+
+
+async def run(args, url, process, voters):
+    await wait_until_ready(url, process)
+    levels = []
+    tx_ids = []
+    for concurrency in args.concurrency:
+        level = await run_level(url, voters, concurrency, args.candidates, tx_ids)
+        levels.append(level)
+        if not args.json:
+            print_level(level)
+    await asyncio.sleep(args.settle)
+    return levels, await tx_statuses(url, tx_ids)
+
+
+def print_level(level):
+    print(f"\nconcurrency {level['concurrency']}: {level['flows']} flows in {level['wall_s']:.1f}s "
+          f"({level['flows_per_s']:.1f} flows/s)")
+    print(f"{'endpoint':>12} | {'req/s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | "
+          f"{'errors':>6} | {'429':>5} | {'rpc/req':>7}")
+    for endpoint, row in level['endpoints'].items():
+        rpc = f"{row['rpc_calls_per_request']:.2f}" if row['rpc_calls_per_request'] is not None else '-'
+        fmt = lambda v: f"{v:>7.1f}" if v is not None else f"{'-':>7}"
+        print(f"{endpoint:>12} | {row['rps'] or 0:>7.1f} | {fmt(row['p50_ms'])} | {fmt(row['p95_ms'])} | "
+              f"{fmt(row['p99_ms'])} | {row['errors']:>6} | {row['rate_limited']:>5} | {rpc:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rpc-url', default=DEFAULT_RPC_URL)
+    parser.add_argument('--admin-key', default=DEFAULT_ADMIN_KEY,
+                        help="Private key of the node's first account (deploys and signs as admin)")
+    parser.add_argument('--candidates', type=int, default=10)
+    parser.add_argument('--voters', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--api-url', help="Use an API that is already running instead of starting one")
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--worker-class', help="Override GUNICORN_WORKER_CLASS for the started API")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="Keep the API's rate limits on (all clients share one IP)")
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help="Seconds to wait before reading the final vote transaction statuses")
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    web3, contract, voters = seed_chain(args)
+    process = None
+    log_path = None
+    with tempfile.TemporaryDirectory(prefix='voting-load-') as data_dir:
+        if args.api_url:
+            url = args.api_url.rstrip('/')
+        else:
+            process, url, log_path = start_api(args, web3, contract, data_dir)
+        try:
+            levels, votes = asyncio.run(run(args, url, process, voters))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+                if process.returncode not in (0, -15):
+                    print(f"API log: {open(log_path).read()[-2000:]}", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "settings": {
+            "mode": args.mode if not args.api_url else None,
+            "workers": args.workers if not args.api_url else None,
+            "rate_limits": args.rate_limits if not args.api_url else None,
+            "candidates": args.candidates,
+            "voters": args.voters,
+            "concurrency": args.concurrency,
+            "contract": contract.address,
+        },
+        "levels": levels,
+        "vote_transactions": votes,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"\nvote transactions: {votes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Helpers for running benchmarks against a local development chain.
+
+Start a node first, e.g. ``npx hardhat node`` or ``anvil``, then point the
+benchmarks at it with ``--rpc-url`` (defaults to http://127.0.0.1:8545).
+The node's first unlocked account deploys ``Voting`` and acts as admin.
+"""
+import json
+import os
+
+import requests
+from web3 import Web3
+
+DEFAULT_RPC_URL = os.environ.get('BENCH_RPC_URL', 'http://127.0.0.1:8545')
+
+# Private key of account #0 of the default Hardhat/anvil mnemonic (public test key)
+DEFAULT_ADMIN_KEY = os.environ.get(
+    'BENCH_ADMIN_KEY', '0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80')
+
+ARTIFACT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'artifacts', 'contracts', 'Voting.sol', 'Voting.json')
+
+
+class CountingSession(requests.Session):
+    """``requests.Session`` that counts HTTP round-trips."""
+
+    def __init__(self):
+        super().__init__()
+        self.round_trips = 0
+
+    def request(self, *args, **kwargs):
+        self.round_trips += 1
+        return super().request(*args, **kwargs)
+
+
+def load_artifact():
+    with open(ARTIFACT_PATH) as f:
+        return json.load(f)
+
+
+def connect(rpc_url=DEFAULT_RPC_URL, session=None):
+    web3 = Web3(Web3.HTTPProvider(rpc_url, session=session))
+    if not web3.is_connected():
+        raise SystemExit(f"No local chain reachable at {rpc_url} (start `npx hardhat node` or `anvil`)")
+    return web3
+
+
+def deploy_voting(web3, admin=None):
+    """Deploy a fresh ``Voting`` contract and return the contract object."""
+    artifact = load_artifact()
+    admin = admin or web3.eth.accounts[0]
+    factory = web3.eth.contract(abi=artifact['abi'], bytecode=artifact['bytecode'])
+    tx_hash = factory.constructor().transact({'from': admin})
+    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    return web3.eth.contract(address=receipt.contractAddress, abi=artifact['abi'])
+
+
+def add_candidates(web3, contract, count, admin=None, prefix='Candidate'):
+    """Add ``count`` candidates, continuing from the current candidatesCount."""
+    admin = admin or web3.eth.accounts[0]
+    start = contract.functions.candidatesCount().call()
+    tx_hash = None
+    for i in range(start + 1, start + count + 1):
+        tx_hash = contract.functions.addCandidate(f"{prefix} {i}").transact({'from': admin})
+    if tx_hash is not None:
+        web3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+def register_voters(web3, contract, addresses, admin=None):
+    """Register ``addresses`` as voters from the admin account."""
+    admin = admin or web3.eth.accounts[0]
+    tx_hash = None
+    for address in addresses:
+        tx_hash = contract.functions.registerVoter(address).transact({'from': admin})
+    if tx_hash is not None:
+        web3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+def start_voting(web3, contract, admin=None):
+    admin = admin or web3.eth.accounts[0]
+    web3.eth.wait_for_transaction_receipt(contract.functions.startVoting().transact({'from': admin}))
@@ -0,0 +1,46 @@
+import os
+
+# Streaming endpoints (/results/stream) hold a connection, and so a thread,
+# open for minutes: gthread workers run GUNICORN_THREADS of them each.
+# API_MODE=async serves the stream on the event loop, with no thread per client.
+# GUNICORN_WORKER_CLASS=gevent serves far more idle streams per worker, but
+# the SQLite stores then block the hub on every query (and busy_timeout can
+# stall a worker's greenlets for up to 30s), and backend.storage's
+# per-thread connections become per-greenlet, i.e. one per request.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+wsgi_app = 'backend.app:app'
+
+# API_MODE=async serves backend.async_app (aiohttp + AsyncWeb3) instead; the
+# Flask app above stays the default and the fallback
+if os.environ.get('API_MODE') == 'async':
+    worker_class = 'aiohttp.GunicornWebWorker'
+    wsgi_app = 'backend.async_app:app'
+
+if worker_class == 'gevent':
+    # Patch before the app (and requests/ssl) is imported by --preload
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+timeout = 120
+preload_app = True
+
+
+def on_starting(server):
+    # A malformed RATE_LIMITS / ELECTIONS stops the master with a message
+    # instead of failing requests in every worker
+    from backend.app import check_config
+    try:
+        check_config()
+    except ValueError as e:
+        raise RuntimeError(f"Invalid configuration: {e}")
+
+
+def post_worker_init(worker):
+    # The app is preloaded without web3: build the provider, contract and
+    # signer in each worker, after the fork, before it takes requests
+    from backend import chain
+    chain.warm_up()